@@ -0,0 +1,20 @@
+// Tailwind build for core.assets (manage.py build_assets). Keep the theme in
+// step with the runtime config in core/templates/core/frontend_assets.html.
+module.exports = {
+  content: [
+    './core/templates/**/*.html',
+  ],
+  theme: {
+    extend: {
+      colors: {
+        primary: '#32CD32',
+        dark: '#121212',
+      },
+      fontFamily: {
+        'sans': ['Sanchez', 'sans-serif'],
+        'serif': ['Lora', 'serif'],
+        'slab': ['Hepta Slab', 'serif'],
+      },
+    },
+  },
+}
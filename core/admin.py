@@ -1,13 +1,24 @@
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.http import StreamingHttpResponse
+from django.urls import reverse
 from django.utils import timezone
-from .models import Task, UserProfile, TaskCompletion, Transaction, EmailVerification, InfluencerProfile
+from django.utils.html import format_html
+from .models import Task, UserProfile, TaskCompletion, Transaction, EmailVerification, InfluencerProfile, TaskStats, OutboundEmail, ProofBlob, LedgerEntry, PayoutBatch, TransactionArchive
 
 
 @admin.register(UserProfile)
 class UserProfileAdmin(admin.ModelAdmin):
     list_display = ['user', 'total_points', 'available_balance_usd', 'phone_number', 'is_email_verified', 'is_withdrawal_verified']
+    readonly_fields = ['available_balance_usd', 'total_earned_usd']
     search_fields = ['user__username', 'user__email', 'phone_number']
     list_filter = ['is_email_verified', 'is_withdrawal_verified', 'created_at']
+    
+    def get_changelist_instance(self, request):
+        from .ledger import prime_user_balances
+        
+        changelist = super().get_changelist_instance(request)
+        prime_user_balances(changelist.result_list)
+        return changelist
 
 
 @admin.register(EmailVerification)
@@ -19,16 +30,63 @@ class EmailVerificationAdmin(admin.ModelAdmin):
 
 @admin.register(Task)
 class TaskAdmin(admin.ModelAdmin):
-    list_display = ['title', 'task_type', 'points', 'usd_value', 'status', 'current_completions', 'max_completions']
-    list_filter = ['task_type', 'status', 'created_at']
-    search_fields = ['title', 'video_url']
+    list_display = ['title', 'task_type', 'points', 'usd_value', 'status', 'current_completions', 'max_completions', 'same_video']
+    list_filter = ['task_type', 'status', 'created_at', 'platform']
+    search_fields = ['title', 'video_url', '=video_id', '=channel_key']
+    readonly_fields = ['platform', 'video_id', 'channel_key']
+    
+    def same_video(self, obj):
+        if not obj.video_id:
+            return '-'
+        url = reverse('admin:core_task_changelist')
+        return format_html('<a href="{}?platform={}&video_id={}">{}</a>', url, obj.platform, obj.video_id, obj.video_id)
+    same_video.short_description = "Video"
+    
+    def save_model(self, request, obj, form, change):
+        from .services import update_task
+        if change:
+            update_task(obj)
+        else:
+            super().save_model(request, obj, form, change)
+    
+    def delete_model(self, request, obj):
+        from .services import delete_task
+        delete_task(obj)
+    
+    def delete_queryset(self, request, queryset):
+        from .services import delete_task
+        for task in queryset:
+            delete_task(task)
+
+
+@admin.register(TaskStats)
+class TaskStatsAdmin(admin.ModelAdmin):
+    list_display = ['task', 'completion_count', 'verified_count', 'pending_count', 'usd_paid_out']
+    search_fields = ['task__title']
+    readonly_fields = ['task', 'completion_count', 'verified_count', 'pending_count', 'usd_paid_out']
 
 
 @admin.register(TaskCompletion)
 class TaskCompletionAdmin(admin.ModelAdmin):
-    list_display = ['user', 'task', 'points_earned', 'usd_earned', 'is_verified', 'completed_at']
-    list_filter = ['is_verified', 'completed_at']
-    search_fields = ['user__username', 'task__title']
+    list_display = ['user', 'task', 'points_earned', 'usd_earned', 'is_verified', 'is_duplicate_proof', 'completed_at']
+    list_filter = ['is_verified', 'is_duplicate_proof', 'completed_at']
+    search_fields = ['user__username', 'task__title', 'proof_sha256']
+    
+    def delete_model(self, request, obj):
+        from .services import reject_completion
+        reject_completion(obj)
+    
+    def delete_queryset(self, request, queryset):
+        from .services import reject_completion
+        for completion in queryset.select_related('task'):
+            reject_completion(completion)
+
+
+@admin.register(ProofBlob)
+class ProofBlobAdmin(admin.ModelAdmin):
+    list_display = ['sha256', 'ref_count', 'size', 'created_at']
+    search_fields = ['sha256']
+    readonly_fields = ['sha256', 'file', 'size', 'ref_count', 'created_at']
 
 
 @admin.register(Transaction)
@@ -36,15 +94,91 @@ class TransactionAdmin(admin.ModelAdmin):
     list_display = ['user', 'transaction_type', 'amount_usd', 'status', 'created_at']
     list_filter = ['transaction_type', 'status', 'created_at']
     search_fields = ['user__username', 'reference']
-    actions = ['approve_transactions', 'reject_transactions']
+    actions = ['approve_transactions', 'reject_transactions', 'batch_withdrawals']
     
     def approve_transactions(self, request, queryset):
-        queryset.update(status='approved', processed_by=request.user)
+        from .services import settle_withdrawals
+        settle_withdrawals(list(queryset.values_list('id', flat=True)), 'approved', request.user)
+        queryset.exclude(transaction_type='withdrawal').update(status='approved', processed_by=request.user)
     approve_transactions.short_description = "Approve selected transactions"
     
     def reject_transactions(self, request, queryset):
-        queryset.update(status='rejected', processed_by=request.user)
+        from .services import settle_withdrawals
+        settle_withdrawals(list(queryset.values_list('id', flat=True)), 'rejected', request.user)
+        queryset.exclude(transaction_type='withdrawal').update(status='rejected', processed_by=request.user)
     reject_transactions.short_description = "Reject selected transactions"
+    
+    def batch_withdrawals(self, request, queryset):
+        from .settlement import build_payout_batches
+        batches = build_payout_batches(queryset, processed_by=request.user)
+        count = sum(batch.withdrawal_count for batch in batches)
+        self.message_user(request, f'{count} withdrawal(s) approved into {len(batches)} payout batch(es)')
+    batch_withdrawals.short_description = "Approve selected withdrawals into payout batches"
+
+
+@admin.register(PayoutBatch)
+class PayoutBatchAdmin(admin.ModelAdmin):
+    list_display = ['batch_id', 'provider', 'status', 'withdrawal_count', 'total_usd', 'created_by', 'created_at']
+    list_filter = ['status', 'provider', 'created_at']
+    search_fields = ['batch_id']
+    readonly_fields = ['batch_id', 'provider', 'withdrawal_count', 'total_usd', 'created_by', 'created_at', 'completed_at']
+    actions = ['export_csv', 'export_json', 'mark_paid_out']
+    
+    def export(self, request, queryset, export_format):
+        from .settlement import EXPORT_FORMATS
+        if queryset.count() != 1:
+            self.message_user(request, 'Select exactly one batch to export', messages.ERROR)
+            return None
+        batch = queryset.get()
+        export, content_type = EXPORT_FORMATS[export_format]
+        response = StreamingHttpResponse(export(batch), content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="{batch.batch_id}.{export_format}"'
+        return response
+    
+    def export_csv(self, request, queryset):
+        return self.export(request, queryset, 'csv')
+    export_csv.short_description = "Export selected batch as CSV"
+    
+    def export_json(self, request, queryset):
+        return self.export(request, queryset, 'json')
+    export_json.short_description = "Export selected batch as JSON"
+    
+    def mark_paid_out(self, request, queryset):
+        from .settlement import complete_payout_batch
+        batches = list(queryset.filter(status='approved'))
+        for batch in batches:
+            complete_payout_batch(batch)
+        self.message_user(request, f'{len(batches)} batch(es) marked as paid out')
+    mark_paid_out.short_description = "Mark selected batches as paid out"
+
+
+@admin.register(LedgerEntry)
+class LedgerEntryAdmin(admin.ModelAdmin):
+    list_display = ['id', 'account', 'amount', 'kind', 'transaction_id', 'created_at']
+    list_filter = ['kind', 'created_at']
+    search_fields = ['account', 'journal']
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+    
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(TransactionArchive)
+class TransactionArchiveAdmin(admin.ModelAdmin):
+    list_display = ['id', 'user', 'transaction_type', 'amount_usd', 'status', 'created_at', 'settled_at']
+    list_filter = ['transaction_type', 'status']
+    search_fields = ['user__username', 'reference']
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
 
 
 @admin.register(InfluencerProfile)
@@ -52,7 +186,7 @@ class InfluencerProfileAdmin(admin.ModelAdmin):
     list_display = ['user', 'company_name', 'status', 'is_verified', 'total_tasks_created', 'budget_limit', 'total_budget_spent', 'created_at']
     list_filter = ['status', 'is_verified', 'created_at']
     search_fields = ['user__username', 'user__email', 'company_name', 'phone_number']
-    readonly_fields = ['total_tasks_created', 'total_budget_spent', 'created_at', 'updated_at', 'remaining_budget_display']
+    readonly_fields = ['total_tasks_created', 'total_task_value', 'total_completions', 'pending_proofs', 'total_budget_spent', 'created_at', 'updated_at', 'remaining_budget_display']
     actions = ['approve_influencers', 'reject_influencers', 'suspend_influencers']
     
     fieldsets = (
@@ -72,7 +206,7 @@ class InfluencerProfileAdmin(admin.ModelAdmin):
             'fields': ('budget_limit', 'total_budget_spent', 'remaining_budget_display')
         }),
         ('Statistics', {
-            'fields': ('total_tasks_created',)
+            'fields': ('total_tasks_created', 'total_task_value', 'total_completions', 'pending_proofs')
         }),
         ('Timestamps', {
             'fields': ('created_at', 'updated_at')
@@ -89,11 +223,17 @@ class InfluencerProfileAdmin(admin.ModelAdmin):
     remaining_budget_display.short_description = "Remaining Budget"
     
     def approve_influencers(self, request, queryset):
+        from .mailer import enqueue_influencer_approved_email
+        
+        newly_approved = [p.user for p in queryset.exclude(status='approved').select_related('user')]
         count = queryset.update(
             status='approved',
             approved_at=timezone.now(),
             approved_by=request.user
         )
+        for user in newly_approved:
+            if user.email:
+                enqueue_influencer_approved_email(user)
         self.message_user(request, f'{count} influencer(s) approved successfully')
     approve_influencers.short_description = "Approve selected influencers"
     
@@ -106,3 +246,17 @@ class InfluencerProfileAdmin(admin.ModelAdmin):
         count = queryset.update(status='suspended')
         self.message_user(request, f'{count} influencer(s) suspended')
     suspend_influencers.short_description = "Suspend selected influencers"
+
+
+@admin.register(OutboundEmail)
+class OutboundEmailAdmin(admin.ModelAdmin):
+    list_display = ['to_email', 'subject', 'status', 'attempts', 'next_attempt_at', 'sent_at']
+    list_filter = ['status', 'created_at']
+    search_fields = ['to_email', 'subject']
+    readonly_fields = ['created_at', 'sent_at', 'last_error', 'claimed_by', 'claimed_until']
+    actions = ['retry_emails']
+    
+    def retry_emails(self, request, queryset):
+        count = queryset.filter(status='failed').update(status='queued', attempts=0, next_attempt_at=timezone.now())
+        self.message_user(request, f'{count} email(s) queued for retry')
+    retry_emails.short_description = "Retry selected failed emails"
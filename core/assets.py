@@ -0,0 +1,283 @@
+"""
+Self-hosted frontend assets.
+
+Pages used to load the Tailwind Play CDN, which compiles CSS in the browser,
+plus Alpine, Boxicons and Google Fonts from third-party hosts. build_assets
+replaces all of that with files we serve ourselves:
+
+- Alpine, both Boxicons stylesheets and the Google Fonts stylesheet are
+  vendored into assets/vendor/ (build_assets --fetch), together with the
+  font files they reference.
+- The Tailwind CLI compiles assets/app.css against the project templates,
+  so only the utilities the templates use end up in the bundle. The fonts
+  stylesheet is prepended; each page adds the Boxicons set it was written
+  against ({% frontend_assets icons='basic' %} on the landing page).
+- Every output file gets a content hash in its name and, for text files,
+  .gz and .br (when the brotli package is installed) siblings. They are
+  written to ASSETS_ROOT with a manifest.json of logical to hashed names.
+
+The {% frontend_assets %} tag links the built files when the manifest exists
+and falls back to the CDNs otherwise. PrecompressedAssetsMiddleware serves
+ASSETS_URL with the best encoding the client accepts and, since the names
+are hashed, a one-year immutable Cache-Control.
+"""
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import subprocess
+import tempfile
+import urllib.request
+from pathlib import Path
+from urllib.parse import urljoin, urlparse
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse
+from django.utils._os import safe_join
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+GOOGLE_FONTS_URL = (
+    'https://fonts.googleapis.com/css2?family=Hepta+Slab:wght@1..900'
+    '&family=Inter:wght@300;400;500;600;700'
+    '&family=Lora:ital,wght@0,400..700;1,400..700'
+    '&family=Sanchez:ital@0;1&display=swap'
+)
+# The landing page uses the Boxicons v3 basic set (bx-mobile-back-alt, ...),
+# the other pages the classic class names. Both define the same font family,
+# so each is its own stylesheet rather than part of app.css.
+ICON_STYLESHEETS = {
+    'classic': ('boxicons.css', 'https://cdn.boxicons.com/css/boxicons.min.css'),
+    'basic': ('boxicons-basic.css', 'https://cdn.boxicons.com/fonts/basic/boxicons.min.css'),
+}
+VENDOR_ASSETS = {
+    'alpine.js': 'https://cdn.jsdelivr.net/npm/alpinejs@3.14.1/dist/cdn.min.js',
+    'fonts.css': GOOGLE_FONTS_URL,
+    **dict(ICON_STYLESHEETS.values()),
+}
+# Google Fonts picks the font format from the User-Agent; ask for woff2.
+FETCH_USER_AGENT = 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0 Safari/537.36'
+
+COMPRESSIBLE_EXTENSIONS = {'.css', '.js', '.svg', '.json', '.ttf', '.eot'}
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+SHORT_CACHE_CONTROL = 'public, max-age=300'
+HASHED_NAME = re.compile(r'\.[0-9a-f]{12}\.[A-Za-z0-9]+$')
+CSS_URL = re.compile(r'url\(\s*([\'"]?)([^\'")]+)\1\s*\)')
+CSS_COMMENT = re.compile(r'/\*.*?\*/', re.S)
+
+MANIFEST_NAME = 'manifest.json'
+_manifest = {}
+
+mimetypes.add_type('font/woff2', '.woff2')
+
+
+class AssetBuildError(Exception):
+    pass
+
+
+def source_dir():
+    return Path(settings.ASSETS_SOURCE_DIR)
+
+
+def vendor_dir():
+    return source_dir() / 'vendor'
+
+
+def fetch(url):
+    request = urllib.request.Request(url, headers={'User-Agent': FETCH_USER_AGENT})
+    with urllib.request.urlopen(request, timeout=30) as response:
+        return response.read()
+
+
+def fetch_vendor_assets():
+    """
+    Download VENDOR_ASSETS into the vendor directory. Files a stylesheet
+    refers to are downloaded into vendor/fonts/ and the stylesheet is
+    rewritten to point at them. Returns the names written.
+    """
+    target = vendor_dir()
+    (target / 'fonts').mkdir(parents=True, exist_ok=True)
+    written = []
+    for name, url in VENDOR_ASSETS.items():
+        content = fetch(url)
+        if name.endswith('.css'):
+            content = vendor_stylesheet(content.decode('utf-8'), url, target, written).encode('utf-8')
+        (target / name).write_bytes(content)
+        written.append(name)
+    return written
+
+
+def vendor_stylesheet(css, base_url, target, written):
+    fetched = {}
+
+    def download(match):
+        reference = match.group(2)
+        if reference.startswith('data:'):
+            return match.group(0)
+        url = urljoin(base_url, reference)
+        if url not in fetched:
+            path = urlparse(url).path
+            local = f'fonts/{hashlib.sha256(url.encode()).hexdigest()[:10]}-{os.path.basename(path)}'
+            (target / local).write_bytes(fetch(url))
+            written.append(local)
+            fetched[url] = local
+        return f'url({fetched[url]})'
+
+    return CSS_URL.sub(download, css)
+
+
+def run_tailwind(cli=None):
+    """Compile assets/app.css with the Tailwind CLI; returns the minified CSS."""
+    cli = cli or settings.TAILWIND_CLI
+    with tempfile.TemporaryDirectory() as tmp:
+        output = Path(tmp) / 'tailwind.css'
+        command = [
+            *cli.split(),
+            '--config', str(source_dir() / 'tailwind.config.js'),
+            '--input', str(source_dir() / 'app.css'),
+            '--output', str(output),
+            '--minify',
+        ]
+        try:
+            subprocess.run(command, cwd=settings.BASE_DIR, check=True, capture_output=True)
+        except FileNotFoundError:
+            raise AssetBuildError(f'Tailwind CLI not found: {cli!r}. Set TAILWIND_CLI or pass --tailwind.')
+        except subprocess.CalledProcessError as e:
+            raise AssetBuildError(f'Tailwind failed: {e.stderr.decode(errors="replace")}')
+        return output.read_text(encoding='utf-8')
+
+
+def minify_css(css):
+    return re.sub(r'\s*([{};,])\s*', r'\1', re.sub(r'\s+', ' ', CSS_COMMENT.sub('', css))).strip()
+
+
+def write_asset(root, name, content):
+    """
+    Write content under its hashed name plus compressed siblings. Returns
+    the hashed name, relative to root.
+    """
+    stem, extension = os.path.splitext(name)
+    hashed = f'{stem}.{hashlib.sha256(content).hexdigest()[:12]}{extension}'
+    path = Path(root) / hashed
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(content)
+    if extension in COMPRESSIBLE_EXTENSIONS:
+        path.with_name(path.name + '.gz').write_bytes(gzip.compress(content, 9, mtime=0))
+        if brotli is not None:
+            path.with_name(path.name + '.br').write_bytes(brotli.compress(content, quality=11))
+    return hashed
+
+
+def rewrite_font_urls(css, manifest):
+    def rewrite(match):
+        return f'url({manifest.get(match.group(2), match.group(2))})'
+
+    return CSS_URL.sub(rewrite, css)
+
+
+def bundle_css(tailwind_css, manifest):
+    """Vendored fonts then Tailwind, with font URLs pointing at the hashed fonts."""
+    path = vendor_dir() / 'fonts.css'
+    vendored = minify_css(path.read_text(encoding='utf-8')) if path.exists() else ''
+    return rewrite_font_urls(vendored, manifest) + '\n' + tailwind_css
+
+
+def build_assets(tailwind_css=None, root=None):
+    """
+    Build everything into root (ASSETS_ROOT by default) and write the
+    manifest. tailwind_css skips running the CLI. Returns the manifest.
+    """
+    root = Path(root or settings.ASSETS_ROOT)
+    if not (vendor_dir() / 'alpine.js').exists():
+        raise AssetBuildError(f'No vendored assets in {vendor_dir()}. Run build_assets --fetch first.')
+    if tailwind_css is None:
+        tailwind_css = run_tailwind()
+
+    manifest = {}
+    fonts = vendor_dir() / 'fonts'
+    if fonts.is_dir():
+        for font in sorted(fonts.iterdir()):
+            manifest[f'fonts/{font.name}'] = write_asset(root, f'fonts/{font.name}', font.read_bytes())
+    manifest['app.css'] = write_asset(root, 'app.css', bundle_css(tailwind_css, manifest).encode('utf-8'))
+    for name, _ in ICON_STYLESHEETS.values():
+        path = vendor_dir() / name
+        if path.exists():
+            css = rewrite_font_urls(minify_css(path.read_text(encoding='utf-8')), manifest)
+            manifest[name] = write_asset(root, name, css.encode('utf-8'))
+    manifest['alpine.js'] = write_asset(root, 'alpine.js', (vendor_dir() / 'alpine.js').read_bytes())
+
+    (root / MANIFEST_NAME).write_text(json.dumps(manifest, indent=2, sort_keys=True), encoding='utf-8')
+    return manifest
+
+
+def load_manifest():
+    """The built manifest, or {} when build_assets has not been run."""
+    path = Path(settings.ASSETS_ROOT) / MANIFEST_NAME
+    try:
+        mtime = path.stat().st_mtime
+    except FileNotFoundError:
+        return {}
+    if _manifest.get('key') != (path, mtime):
+        _manifest.update(key=(path, mtime), names=json.loads(path.read_text(encoding='utf-8')))
+    return _manifest['names']
+
+
+def asset_url(name):
+    hashed = load_manifest().get(name)
+    return settings.ASSETS_URL + hashed if hashed else None
+
+
+def accepted_encodings(request):
+    accepted = set()
+    for part in request.headers.get('Accept-Encoding', '').split(','):
+        encoding, _, params = part.partition(';')
+        if re.fullmatch(r'\s*q=0(\.0*)?\s*', params):
+            continue
+        accepted.add(encoding.strip().lower())
+    return accepted
+
+
+class PrecompressedAssetsMiddleware(MiddlewareMixin):
+    # MiddlewareMixin makes it usable from both the WSGI and ASGI handlers
+    # without a thread switch on every request.
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        self.prefix = settings.ASSETS_URL
+
+    def process_request(self, request):
+        if request.method in ('GET', 'HEAD') and request.path.startswith(self.prefix):
+            return self.serve(request, request.path[len(self.prefix):])
+        return None
+
+    def serve(self, request, name):
+        try:
+            path = safe_join(settings.ASSETS_ROOT, name)
+        except SuspiciousFileOperation:
+            return None
+        if not name or not os.path.isfile(path):
+            return None
+
+        encoding = None
+        accepted = accepted_encodings(request)
+        for candidate, suffix in (('br', '.br'), ('gzip', '.gz')):
+            if candidate in accepted and os.path.isfile(path + suffix):
+                encoding = candidate
+                break
+        content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        served = path + ('.br' if encoding == 'br' else '.gz') if encoding else path
+
+        response = FileResponse(open(served, 'rb'), content_type=content_type, filename=os.path.basename(path))
+        if encoding:
+            response['Content-Encoding'] = encoding
+        response['Cache-Control'] = IMMUTABLE_CACHE_CONTROL if HASHED_NAME.search(name) else SHORT_CACHE_CONTROL
+        patch_vary_headers(response, ['Accept-Encoding'])
+        return response
@@ -0,0 +1,159 @@
+"""
+Reference counts and duplicate flags for content-addressed proof files.
+
+complete_task() retains the blob behind a new proof and flags every
+completion sharing its hash; rejections release it, and the file is removed
+once nothing refers to it any more. The thumbnail and preview files, which
+siblings with the same hash share, go once no completion names them.
+"""
+from collections import Counter
+
+from django.core.files.storage import default_storage
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q
+
+from .models import ProofBlob, TaskCompletion
+from .stats import bump_many
+from .storage import digest_from_name, proof_storage
+
+
+def retain_blob(digest, name, size=0):
+    retained = ProofBlob.objects.filter(sha256=digest).update(ref_count=F('ref_count') + 1)
+    if retained:
+        return
+    try:
+        with transaction.atomic():
+            ProofBlob.objects.create(sha256=digest, file=name, size=size, ref_count=1)
+    except IntegrityError:
+        ProofBlob.objects.filter(sha256=digest).update(ref_count=F('ref_count') + 1)
+
+
+def attach_proof_blob(completion):
+    """
+    Record the hash of a freshly stored proof and flag it, and any other
+    completion with the same bytes, as a duplicate.
+    """
+    digest = digest_from_name(completion.proof_screenshot.name)
+    if not digest:
+        return
+
+    retain_blob(digest, completion.proof_screenshot.name, completion.proof_screenshot.size)
+    duplicates = TaskCompletion.objects.filter(proof_sha256=digest).update(is_duplicate_proof=True)
+    completion.proof_sha256 = digest
+    completion.is_duplicate_proof = bool(duplicates)
+    TaskCompletion.objects.filter(id=completion.id).update(
+        proof_sha256=digest,
+        is_duplicate_proof=completion.is_duplicate_proof,
+    )
+
+
+def delete_unreferenced_files(names):
+    storage = proof_storage()
+    for blob_name in names:
+        if not ProofBlob.objects.filter(file=blob_name).exists():
+            storage.delete(blob_name)
+
+
+def delete_unreferenced_variants(names):
+    referenced = set()
+    for thumbnail, preview in TaskCompletion.objects.filter(
+        Q(proof_thumbnail__in=names) | Q(proof_preview__in=names)
+    ).values_list('proof_thumbnail', 'proof_preview'):
+        referenced.update((thumbnail, preview))
+    for name in set(names) - referenced:
+        default_storage.delete(name)
+
+
+def release_proof_blobs(completions):
+    """
+    Drop one reference per completion, which the caller then deletes. Blobs
+    nobody refers to any more are deleted, and their files removed once the
+    transaction commits, as are variants no remaining completion uses.
+    """
+    variants = [
+        name for c in completions for name in (c.proof_thumbnail.name, c.proof_preview.name) if name
+    ]
+    if variants:
+        transaction.on_commit(lambda: delete_unreferenced_variants(variants))
+
+    released = Counter(c.proof_sha256 for c in completions if c.proof_sha256)
+    if not released:
+        return
+
+    bump_many(ProofBlob, 'sha256', {digest: {'ref_count': -count} for digest, count in released.items()})
+    orphans = list(ProofBlob.objects.filter(sha256__in=released, ref_count__lte=0))
+    if orphans:
+        ProofBlob.objects.filter(id__in=[blob.id for blob in orphans]).delete()
+        names = [blob.file.name for blob in orphans]
+        transaction.on_commit(lambda: delete_unreferenced_files(names))
+
+
+def duplicate_proofs_of(completion):
+    if not completion.proof_sha256:
+        return TaskCompletion.objects.none()
+    return (
+        TaskCompletion.objects.filter(proof_sha256=completion.proof_sha256)
+        .exclude(id=completion.id)
+        .select_related('user', 'task')
+        .order_by('completed_at')
+    )
+
+
+def adopt_legacy_proof(completion):
+    """
+    Move a proof saved under its upload name into the content-addressed
+    layout. Reference counts are left to rebuild_proof_blobs().
+    """
+    storage = proof_storage()
+    old_name = completion.proof_screenshot.name
+    with storage.open(old_name) as source:
+        new_name = storage.save(old_name, source)
+    TaskCompletion.objects.filter(proof_screenshot=old_name).update(
+        proof_screenshot=new_name,
+        proof_sha256=digest_from_name(new_name),
+    )
+    if new_name != old_name:
+        storage.delete(old_name)
+    return new_name
+
+
+def legacy_proofs():
+    return TaskCompletion.objects.filter(proof_screenshot__gt='', proof_sha256='').order_by('id')
+
+
+def rebuild_proof_blobs():
+    """
+    Recompute every blob, ref_count and duplicate flag from the completions.
+    Returns the number of blobs.
+    """
+    with transaction.atomic():
+        referenced = (
+            TaskCompletion.objects.exclude(proof_sha256='')
+            .values('proof_sha256')
+            .annotate(n=Count('id'))
+        )
+        counts = {row['proof_sha256']: row['n'] for row in referenced}
+        blobs = {blob.sha256: blob for blob in ProofBlob.objects.all()}
+
+        for blob in blobs.values():
+            blob.ref_count = counts.get(blob.sha256, 0)
+        ProofBlob.objects.bulk_update(blobs.values(), ['ref_count'], batch_size=500)
+
+        missing = (
+            TaskCompletion.objects.filter(proof_sha256__in=set(counts) - set(blobs))
+            .values_list('proof_sha256', 'proof_screenshot')
+        )
+        ProofBlob.objects.bulk_create(
+            [ProofBlob(sha256=digest, file=name, ref_count=counts[digest]) for digest, name in dict(missing).items()],
+            batch_size=500,
+        )
+
+        orphans = [blob for blob in blobs.values() if not blob.ref_count]
+        ProofBlob.objects.filter(id__in=[blob.id for blob in orphans]).delete()
+        names = [blob.file.name for blob in orphans]
+        transaction.on_commit(lambda: delete_unreferenced_files(names))
+
+        duplicated = referenced.filter(n__gt=1).values('proof_sha256')
+        TaskCompletion.objects.filter(is_duplicate_proof=True).exclude(proof_sha256__in=duplicated).update(is_duplicate_proof=False)
+        TaskCompletion.objects.filter(proof_sha256__in=duplicated).update(is_duplicate_proof=True)
+    return len(counts)
@@ -0,0 +1,70 @@
+"""
+Cached catalog of active tasks.
+
+The catalog lives in the cache configured under TASK_CATALOG_CACHE_ALIAS
+(local memory by default, file or Redis in production). Keys are versioned
+per category: invalidating a category bumps its version, so readers move
+to a fresh key and the stale entry simply expires.
+"""
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+from .models import Task
+
+
+ALL_CATEGORIES = 'all'
+
+
+def _cache():
+    return caches[getattr(settings, 'TASK_CATALOG_CACHE_ALIAS', 'default')]
+
+
+def _version_key(category):
+    return f'task_catalog:version:{category}'
+
+
+def catalog_version(category):
+    cache = _cache()
+    cache.add(_version_key(category), 1, timeout=None)
+    return cache.get(_version_key(category), 1)
+
+
+def catalog_key(category):
+    return f'task_catalog:{category}:v{catalog_version(category)}'
+
+
+def _load_catalog(category):
+    # Full and expired tasks are closed by core.scheduler, so status is enough.
+    tasks = Task.objects.filter(status='active').order_by('-created_at')
+    if category != ALL_CATEGORIES:
+        tasks = tasks.filter(category=category)
+    return list(tasks)
+
+
+def get_active_catalog(category=ALL_CATEGORIES):
+    cache = _cache()
+    key = catalog_key(category)
+    catalog = cache.get(key)
+    if catalog is None:
+        catalog = _load_catalog(category)
+        cache.set(key, catalog, getattr(settings, 'TASK_CATALOG_CACHE_TIMEOUT', 300))
+    return catalog
+
+
+def invalidate_catalog(*categories):
+    cache = _cache()
+    for category in set(categories) | {ALL_CATEGORIES}:
+        key = _version_key(category)
+        if not cache.add(key, 2, timeout=None):
+            try:
+                cache.incr(key)
+            except ValueError:
+                cache.set(key, 2, timeout=None)
+
+
+def invalidate_catalog_on_commit(*categories):
+    # Invalidate now and again once the transaction commits, so a reader that
+    # re-cached the pre-commit rows in between does not keep them.
+    invalidate_catalog(*categories)
+    transaction.on_commit(lambda: invalidate_catalog(*categories))
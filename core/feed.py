@@ -0,0 +1,39 @@
+"""
+Per-user available task feed.
+
+Each UserProfile keeps the IDs of the tasks its user already completed, so
+the ranked feed (core.ranking) is the cached active catalog minus those IDs
+instead of an anti-join against the whole TaskCompletion table.
+"""
+from .models import TaskCompletion, UserProfile
+
+
+def get_feed_profile(user):
+    profile, created = UserProfile.objects.get_or_create(user=user)
+    return profile
+
+
+def has_completed(profile, task_id):
+    return task_id in profile.completed_task_ids
+
+
+def record_completion(profile, task_id):
+    if task_id not in profile.completed_task_ids:
+        profile.completed_task_ids = profile.completed_task_ids + [task_id]
+        profile.save(update_fields=['completed_task_ids'])
+
+
+def forget_completion(profile, task_id):
+    if task_id in profile.completed_task_ids:
+        profile.completed_task_ids = [i for i in profile.completed_task_ids if i != task_id]
+        profile.save(update_fields=['completed_task_ids'])
+
+
+def rebuild_feed(profile):
+    profile.completed_task_ids = list(
+        TaskCompletion.objects.filter(user_id=profile.user_id)
+        .order_by('task_id')
+        .values_list('task_id', flat=True)
+    )
+    profile.save(update_fields=['completed_task_ids'])
+    return profile.completed_task_ids
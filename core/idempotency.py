@@ -0,0 +1,104 @@
+"""
+Idempotency keys for POSTs that claim task slots or move money.
+
+Forms carry a one-time key rendered by {% idempotency_key_field %}; other
+clients can send an Idempotency-Key header instead. The first request with a
+key runs the view and its response is kept for IDEMPOTENCY_KEY_TTL seconds.
+Repeats of the key (double taps, mobile retries) get that response back,
+flash messages included, without the view running again.
+"""
+import time
+from functools import wraps
+from uuid import uuid4
+
+from django.conf import settings
+from django.contrib import messages
+from django.core.cache import caches
+from django.http import HttpResponse, HttpResponseRedirect
+
+
+FORM_FIELD = 'idempotency_key'
+MAX_KEY_LENGTH = 100
+IN_FLIGHT = 'in-flight'
+POLL_INTERVAL = 0.05
+
+
+def get_idempotency_cache():
+    return caches[settings.IDEMPOTENCY_CACHE_ALIAS]
+
+
+def new_idempotency_key():
+    return uuid4().hex
+
+
+def request_idempotency_key(request):
+    key = request.headers.get('Idempotency-Key') or request.POST.get(FORM_FIELD, '')
+    key = key.strip()
+    if not key or len(key) > MAX_KEY_LENGTH:
+        return None
+    return f'idempotency:{request.user.pk}:{request.path}:{key}'
+
+
+def freeze_response(request, response):
+    storage = messages.get_messages(request)
+    return {
+        'status': response.status_code,
+        'headers': list(response.items()),
+        'content': response.content,
+        'messages': [(m.level, m.message, m.extra_tags) for m in getattr(storage, '_queued_messages', [])],
+    }
+
+
+def replay_response(request, frozen):
+    headers = dict(frozen['headers'])
+    if 'Location' in headers:
+        response = HttpResponseRedirect(headers['Location'], frozen['content'], status=frozen['status'])
+    else:
+        response = HttpResponse(frozen['content'], status=frozen['status'])
+    for header, value in frozen['headers']:
+        response[header] = value
+    for level, message, extra_tags in frozen['messages']:
+        messages.add_message(request, level, message, extra_tags=extra_tags)
+    response['Idempotent-Replay'] = 'true'
+    return response
+
+
+def wait_for_response(cache, cache_key):
+    deadline = time.monotonic() + settings.IDEMPOTENCY_WAIT_SECONDS
+    frozen = cache.get(cache_key)
+    while frozen == IN_FLIGHT and time.monotonic() < deadline:
+        time.sleep(POLL_INTERVAL)
+        frozen = cache.get(cache_key)
+    return frozen
+
+
+def idempotent(view_func):
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        if request.method != 'POST':
+            return view_func(request, *args, **kwargs)
+        cache_key = request_idempotency_key(request)
+        if cache_key is None:
+            return view_func(request, *args, **kwargs)
+
+        cache = get_idempotency_cache()
+        ttl = settings.IDEMPOTENCY_KEY_TTL
+        if not cache.add(cache_key, IN_FLIGHT, ttl):
+            frozen = wait_for_response(cache, cache_key)
+            if isinstance(frozen, dict):
+                return replay_response(request, frozen)
+            if frozen == IN_FLIGHT:
+                return HttpResponse('This request is already being processed.', status=409)
+
+        try:
+            response = view_func(request, *args, **kwargs)
+        except Exception:
+            cache.delete(cache_key)
+            raise
+
+        if response.streaming or response.status_code >= 500:
+            cache.delete(cache_key)
+        else:
+            cache.set(cache_key, freeze_response(request, response), ttl)
+        return response
+    return wrapper
@@ -0,0 +1,105 @@
+"""
+Resized variants of uploaded proof screenshots.
+
+Reviewers browse proofs as a grid of small tiles, so each screenshot gets a
+compressed thumbnail for the grid and a medium preview for the review page.
+The variants are generated by the process_proof_images worker, never inside
+the upload request. The same worker fingerprints each proof with a
+perceptual hash and records its closest earlier look-alikes as ProofMatch
+rows.
+"""
+import os
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps, features
+
+from .models import ProofMatch, TaskCompletion
+from .phash import MAX_MATCHES, HammingIndex, dhash, from_db, to_db
+
+
+THUMBNAIL_SIZE = (480, 270)
+PREVIEW_SIZE = (1280, 1280)
+VARIANT_QUALITY = 75
+
+
+def variant_format():
+    return ('WEBP', 'webp') if features.check('webp') else ('JPEG', 'jpg')
+
+
+def make_variant(image, max_size, quality=VARIANT_QUALITY):
+    image_format, extension = variant_format()
+    variant = image.copy()
+    variant.thumbnail(max_size, Image.LANCZOS)
+    if variant.mode not in ('RGB', 'RGBA') or (image_format == 'JPEG' and variant.mode == 'RGBA'):
+        variant = variant.convert('RGB')
+
+    buffer = BytesIO()
+    variant.save(buffer, image_format, quality=quality, optimize=True)
+    return ContentFile(buffer.getvalue()), extension
+
+
+def generate_proof_variants(completion):
+    if completion.proof_sha256:
+        sibling = (
+            TaskCompletion.objects.filter(proof_sha256=completion.proof_sha256)
+            .exclude(proof_thumbnail='')
+            .values_list('proof_thumbnail', 'proof_preview')
+            .first()
+        )
+        if sibling:
+            completion.proof_thumbnail, completion.proof_preview = sibling
+            completion.save(update_fields=['proof_thumbnail', 'proof_preview'])
+            return
+
+    with completion.proof_screenshot.open('rb') as source:
+        with Image.open(source) as image:
+            image = ImageOps.exif_transpose(image)
+            thumbnail, extension = make_variant(image, THUMBNAIL_SIZE)
+            preview, extension = make_variant(image, PREVIEW_SIZE)
+
+    stem = os.path.splitext(os.path.basename(completion.proof_screenshot.name))[0]
+    completion.proof_thumbnail.save(f'{stem}.{extension}', thumbnail, save=False)
+    completion.proof_preview.save(f'{stem}.{extension}', preview, save=False)
+    completion.save(update_fields=['proof_thumbnail', 'proof_preview'])
+
+
+def proofs_missing_variants():
+    return TaskCompletion.objects.filter(
+        proof_screenshot__gt='',
+        proof_thumbnail='',
+    ).order_by('completed_at')
+
+
+def proofs_missing_fingerprint():
+    return TaskCompletion.objects.filter(proof_screenshot__gt='', proof_dhash__isnull=True).order_by('id')
+
+
+def load_proof_index():
+    index = HammingIndex()
+    hashed = TaskCompletion.objects.filter(proof_dhash__isnull=False).values_list('id', 'proof_dhash')
+    for completion_id, value in hashed.iterator(chunk_size=5000):
+        index.add(completion_id, from_db(value))
+    return index
+
+
+def fingerprint_proof(completion, index):
+    with completion.proof_screenshot.open('rb') as source:
+        with Image.open(source) as image:
+            value = dhash(image)
+
+    candidates = [(d, key) for d, key in index.search(value, limit=MAX_MATCHES * 4) if key != completion.id]
+    live = set(TaskCompletion.objects.filter(id__in=[key for d, key in candidates]).values_list('id', flat=True))
+    for d, key in candidates:
+        if key not in live:
+            index.discard(key)
+    matches = [(d, key) for d, key in candidates if key in live][:MAX_MATCHES]
+
+    ProofMatch.objects.bulk_create(
+        [ProofMatch(completion=completion, match_id=key, distance=d) for d, key in matches],
+        ignore_conflicts=True,
+    )
+    completion.proof_dhash = to_db(value)
+    completion.save(update_fields=['proof_dhash'])
+    index.add(completion.id, value)
+    return matches
@@ -0,0 +1,247 @@
+"""
+Append-only double-entry ledger behind user balances.
+
+Every movement of money is a journal: a set of LedgerEntry rows, one per
+account touched, whose amounts sum to zero. Entries are never updated or
+deleted; a withdrawal that is turned down is refunded by a new journal.
+
+Balances are never stored on the profile. Every SNAPSHOT_INTERVAL entries
+an account gets a LedgerSnapshot, so a balance is its latest snapshot plus
+the handful of entries posted since, whatever the length of the history.
+
+That relies on one invariant: an entry committed for an account always has
+a higher id than every entry of that account already in a snapshot. See
+take_snapshots.
+"""
+from collections import defaultdict, namedtuple
+from decimal import Decimal
+from functools import reduce
+from operator import or_
+from uuid import uuid4
+
+from django.db.models import Count, Max, OuterRef, Q, Subquery, Sum
+
+from .models import LedgerAccount, LedgerEntry, LedgerSnapshot
+
+
+SNAPSHOT_INTERVAL = 100
+
+TASK_PAYOUTS_ACCOUNT = 'platform:task_payouts'
+PENDING_WITHDRAWALS_ACCOUNT = 'platform:withdrawals_pending'
+PAID_WITHDRAWALS_ACCOUNT = 'platform:withdrawals_paid'
+OPENING_BALANCES_ACCOUNT = 'platform:opening_balances'
+
+Balance = namedtuple('Balance', ['available', 'earned'])
+ZERO = Decimal('0.00')
+
+
+class LedgerError(Exception):
+    pass
+
+
+class UnbalancedJournal(LedgerError):
+    pass
+
+
+class InsufficientFunds(LedgerError):
+    pass
+
+
+def user_account(user_id):
+    return f'user:{user_id}'
+
+
+def journal(kind, legs, transaction_id=None):
+    """
+    Unsaved entries for one journal. legs is a list of (account, amount)
+    pairs that must sum to zero.
+    """
+    if sum(amount for account, amount in legs) != 0:
+        raise UnbalancedJournal(f'{kind} journal does not balance: {legs}')
+    journal_id = uuid4()
+    return [
+        LedgerEntry(journal=journal_id, account=account, amount=amount, kind=kind, transaction_id=transaction_id)
+        for account, amount in legs
+    ]
+
+
+def post(kind, legs, transaction_id=None):
+    return post_many([journal(kind, legs, transaction_id)])
+
+
+def post_many(journals):
+    """
+    Insert several journals with one query and snapshot the accounts that
+    are due. Call inside the transaction that made the business change.
+    """
+    entries = [entry for entries in journals for entry in entries]
+    if not entries:
+        return entries
+    accounts = {entry.account for entry in entries}
+    lock_accounts(accounts)
+    LedgerEntry.objects.bulk_create(entries)
+    take_snapshots(accounts)
+    return entries
+
+
+def lock_accounts(accounts):
+    """
+    Lock the accounts' rows until the transaction ends, in name order so two
+    posters never wait on each other. Whoever holds an account's lock is the
+    only one inserting entries for it.
+    """
+    LedgerAccount.objects.bulk_create([LedgerAccount(name=name) for name in accounts], ignore_conflicts=True)
+    list(LedgerAccount.objects.select_for_update().filter(name__in=accounts).order_by('name').values_list('id'))
+
+
+def _latest_snapshots(accounts):
+    latest = LedgerSnapshot.objects.filter(account=OuterRef('account')).order_by('-last_entry_id')
+    snapshots = LedgerSnapshot.objects.filter(
+        account__in=accounts,
+        last_entry_id=Subquery(latest.values('last_entry_id')[:1]),
+    )
+    return {snapshot.account: snapshot for snapshot in snapshots}
+
+
+def _since_snapshots(accounts):
+    """
+    Latest snapshot and totals of the entries posted after it, per account.
+    Both queries only touch the entries since the snapshot.
+    """
+    snapshots = _latest_snapshots(accounts)
+    since = reduce(or_, [
+        Q(account=account, id__gt=snapshots[account].last_entry_id if account in snapshots else 0)
+        for account in accounts
+    ])
+    deltas = (
+        LedgerEntry.objects.filter(since)
+        .values('account')
+        .annotate(
+            count=Count('id'),
+            last_entry_id=Max('id'),
+            total=Sum('amount'),
+            earned=Sum('amount', filter=Q(kind='earning')),
+        )
+    )
+    return snapshots, {row['account']: row for row in deltas}
+
+
+def _balance(snapshot, delta):
+    available = snapshot.balance if snapshot else ZERO
+    earned = snapshot.earned if snapshot else ZERO
+    if delta:
+        available += delta['total']
+        earned += delta['earned'] or 0
+    return Balance(available, earned)
+
+
+def take_snapshots(accounts, every=SNAPSHOT_INTERVAL):
+    """
+    Snapshot the accounts that have at least `every` entries since their
+    last snapshot. Only call while holding their lock_accounts lock: ids are
+    handed out at insert, not at commit, so without it another transaction
+    could still commit an entry below last_entry_id, and balances would
+    skip that entry forever. Under the lock every earlier entry of the
+    account is committed and every later one gets a higher id. (SQLite's
+    IMMEDIATE transactions serialize all writers anyway; other databases
+    need the row locks.)
+    """
+    accounts = list(accounts)
+    snapshots, deltas = _since_snapshots(accounts)
+    due = []
+    for account, delta in deltas.items():
+        if delta['count'] < every:
+            continue
+        balance = _balance(snapshots.get(account), delta)
+        due.append(LedgerSnapshot(
+            account=account,
+            last_entry_id=delta['last_entry_id'],
+            balance=balance.available,
+            earned=balance.earned,
+        ))
+    if due:
+        LedgerSnapshot.objects.bulk_create(due, ignore_conflicts=True)
+    return len(due)
+
+
+def balances(accounts):
+    accounts = list(accounts)
+    if not accounts:
+        return {}
+    snapshots, deltas = _since_snapshots(accounts)
+    return {account: _balance(snapshots.get(account), deltas.get(account)) for account in accounts}
+
+
+def balance_of(account):
+    return balances([account])[account]
+
+
+def user_balance(user_id):
+    return balance_of(user_account(user_id))
+
+
+def prime_user_balances(profiles):
+    """
+    Load the balances of many UserProfiles with two queries, so rendering
+    available_balance_usd for each of them runs none.
+    """
+    by_user = balances(user_account(profile.user_id) for profile in profiles)
+    for profile in profiles:
+        profile.balance = by_user[user_account(profile.user_id)]
+    return profiles
+
+
+def reconcile():
+    """
+    Check the whole ledger in one streaming pass in entry order: every
+    journal sums to zero, every snapshot equals the running total of its
+    account at the entry it was taken at, and no user balance is negative.
+    Returns (entry count, account count, list of problems).
+    """
+    problems = []
+    running = defaultdict(Decimal)
+    earned = defaultdict(Decimal)
+    open_journals = {}
+
+    snapshots = (
+        LedgerSnapshot.objects.order_by('last_entry_id', 'account')
+        .values_list('account', 'last_entry_id', 'balance', 'earned')
+        .iterator(chunk_size=5000)
+    )
+    snapshot = next(snapshots, None)
+    entries = (
+        LedgerEntry.objects.order_by('id')
+        .values_list('id', 'journal', 'account', 'amount', 'kind')
+        .iterator(chunk_size=5000)
+    )
+
+    count = 0
+    for entry_id, journal_id, account, amount, kind in entries:
+        count += 1
+        running[account] += amount
+        if kind == 'earning':
+            earned[account] += amount
+        total = open_journals.pop(journal_id, ZERO) + amount
+        if total:
+            open_journals[journal_id] = total
+
+        while snapshot and snapshot[1] <= entry_id:
+            snapshot_account, last_entry_id, balance, snapshot_earned = snapshot
+            if last_entry_id < entry_id or snapshot_account != account:
+                problems.append(f'Snapshot of {snapshot_account} at entry {last_entry_id} does not match an entry of that account')
+            elif (balance, snapshot_earned) != (running[account], earned[account]):
+                problems.append(
+                    f'Snapshot of {account} at entry {entry_id} says {balance}/{snapshot_earned}, '
+                    f'ledger says {running[account]}/{earned[account]}'
+                )
+            snapshot = next(snapshots, None)
+
+    while snapshot:
+        problems.append(f'Snapshot of {snapshot[0]} at entry {snapshot[1]} is past the last entry')
+        snapshot = next(snapshots, None)
+    for journal_id, total in open_journals.items():
+        problems.append(f'Journal {journal_id} does not balance: off by {total}')
+    for account, balance in running.items():
+        if account.startswith('user:') and balance < 0:
+            problems.append(f'{account} has a negative balance of {balance}')
+    return count, len(running), problems
@@ -0,0 +1,156 @@
+"""
+Outbound email queue.
+
+Views only INSERT an OutboundEmail row. The send_queued_mail command drains
+the queue in batches over a single connection of the configured
+EMAIL_BACKEND and retries failures with exponential backoff. Each batch is
+claimed with a conditional UPDATE first, so several workers can run at once.
+"""
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db.models import Q
+from django.utils import timezone
+
+from .email_templates import (
+    get_influencer_approved_email_html, get_influencer_approved_email_text,
+    get_otp_email_html, get_otp_email_text,
+)
+from .models import OutboundEmail
+
+
+MAX_ATTEMPTS = 5
+BACKOFF_BASE_SECONDS = 30
+BACKOFF_MAX_SECONDS = 3600
+# How long a worker's claim on a batch lasts before another worker may take
+# the unsent rows over.
+CLAIM_LEASE_SECONDS = 600
+UPDATE_FIELDS = ['attempts', 'status', 'next_attempt_at', 'sent_at', 'last_error', 'claimed_by', 'claimed_until']
+
+
+def enqueue_email(to_email, subject, text_body, html_body=''):
+    return OutboundEmail.objects.create(
+        to_email=to_email,
+        subject=subject,
+        text_body=text_body,
+        html_body=html_body,
+        from_email=settings.DEFAULT_FROM_EMAIL,
+    )
+
+
+def enqueue_otp_email(user, otp_code, subject='Ken - Email Verification Code'):
+    return enqueue_email(
+        user.email,
+        subject,
+        get_otp_email_text(user.username, otp_code),
+        get_otp_email_html(user.username, otp_code),
+    )
+
+
+def enqueue_influencer_approved_email(user):
+    return enqueue_email(
+        user.email,
+        'Ken Influencer - Account Approved',
+        get_influencer_approved_email_text(user.username),
+        get_influencer_approved_email_html(user.username),
+    )
+
+
+def backoff_delay(attempts):
+    return timedelta(seconds=min(BACKOFF_BASE_SECONDS * 2 ** (attempts - 1), BACKOFF_MAX_SECONDS))
+
+
+def _claim_batch(batch_size, now, lease_seconds):
+    """
+    Mark up to batch_size due emails as 'sending' under a fresh worker token
+    and return them. The UPDATE re-checks that each row is still claimable,
+    so concurrent workers never get the same row. Rows whose claim expired
+    (a worker died mid-batch) are claimable again.
+    """
+    claimable = (
+        Q(status='queued', next_attempt_at__lte=now)
+        | Q(status='sending', claimed_until__lt=now)
+    )
+    ids = list(
+        OutboundEmail.objects.filter(claimable)
+        .order_by('next_attempt_at', 'id')
+        .values_list('id', flat=True)[:batch_size]
+    )
+    if not ids:
+        return []
+    token = uuid.uuid4().hex
+    OutboundEmail.objects.filter(claimable, id__in=ids).update(
+        status='sending',
+        claimed_by=token,
+        claimed_until=now + timedelta(seconds=lease_seconds),
+    )
+    return list(OutboundEmail.objects.filter(status='sending', claimed_by=token).order_by('next_attempt_at', 'id'))
+
+
+def _record_failure(email, error, max_attempts):
+    email.attempts += 1
+    email.last_error = str(error)
+    if email.attempts >= max_attempts:
+        email.status = 'failed'
+    else:
+        email.status = 'queued'
+        email.next_attempt_at = timezone.now() + backoff_delay(email.attempts)
+    email.claimed_by = ''
+    email.claimed_until = None
+
+
+def send_queued_emails(batch_size=50, max_attempts=MAX_ATTEMPTS, lease_seconds=CLAIM_LEASE_SECONDS):
+    """
+    Claim and send one batch of due emails. Returns a (sent, failed) tuple.
+
+    If the connection cannot be opened, the whole batch counts as a failed
+    attempt and backs off. Each email is marked as soon as it is sent, so a
+    worker that dies mid-batch can only resend the one it was sending when
+    its claim expires.
+    """
+    batch = _claim_batch(batch_size, timezone.now(), lease_seconds)
+    if not batch:
+        return 0, 0
+
+    connection = get_connection()
+    try:
+        connection.open()
+    except Exception as e:
+        for email in batch:
+            _record_failure(email, e, max_attempts)
+        OutboundEmail.objects.bulk_update(batch, UPDATE_FIELDS)
+        return 0, len(batch)
+
+    sent = failed = 0
+    try:
+        for email in batch:
+            message = EmailMultiAlternatives(
+                email.subject,
+                email.text_body,
+                email.from_email or settings.DEFAULT_FROM_EMAIL,
+                [email.to_email],
+                connection=connection,
+            )
+            if email.html_body:
+                message.attach_alternative(email.html_body, 'text/html')
+
+            try:
+                message.send()
+            except Exception as e:
+                failed += 1
+                _record_failure(email, e, max_attempts)
+            else:
+                sent += 1
+                email.attempts += 1
+                email.status = 'sent'
+                email.sent_at = timezone.now()
+                email.last_error = ''
+                email.claimed_by = ''
+                email.claimed_until = None
+            email.save(update_fields=UPDATE_FIELDS)
+    finally:
+        connection.close()
+
+    return sent, failed
@@ -0,0 +1,42 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.phash import HASH_BITS, NEAR_DUPLICATE_DISTANCE, HammingIndex
+
+
+class Command(BaseCommand):
+    help = 'Time near-duplicate lookups in the perceptual-hash index on random hashes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size', type=int, default=1_000_000, help='Number of hashes to index')
+        parser.add_argument('--queries', type=int, default=2000)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        index = HammingIndex()
+        started = time.perf_counter()
+        for key in range(options['size']):
+            index.add(key, rng.getrandbits(HASH_BITS))
+        self.stdout.write(f'Indexed {len(index)} hashes in {time.perf_counter() - started:.1f}s')
+
+        timings = []
+        hits = 0
+        for _ in range(options['queries']):
+            key = rng.randrange(options['size'])
+            query = index.hashes[key]
+            for bit in rng.sample(range(HASH_BITS), rng.randint(0, NEAR_DUPLICATE_DISTANCE)):
+                query ^= 1 << bit
+            started = time.perf_counter()
+            matches = index.search(query)
+            timings.append(time.perf_counter() - started)
+            hits += any(match == key for distance, match in matches)
+
+        timings.sort()
+        p50, p99 = (timings[int(len(timings) * q)] * 1000 for q in (0.5, 0.99))
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(timings)} lookups: p50 {p50:.3f} ms, p99 {p99:.3f} ms, '
+            f'{hits}/{len(timings)} planted near-duplicates found'
+        ))
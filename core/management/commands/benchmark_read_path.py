@@ -0,0 +1,208 @@
+import asyncio
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand, CommandError
+from django.core.wsgi import get_wsgi_application
+from django.db.backends.signals import connection_created
+from django.test import Client
+from django.urls import reverse
+from django.utils import translation
+
+from core.models import UserProfile
+
+
+VIEWS = ['dashboard', 'task_list', 'transactions']
+
+
+def summarize(latencies, elapsed, errors):
+    latencies = sorted(latencies)
+    count = len(latencies)
+    return (
+        f'{count / elapsed:.1f} req/s, '
+        f'p50 {latencies[count // 2] * 1000:.1f} ms, '
+        f'p95 {latencies[min(count - 1, int(count * 0.95))] * 1000:.1f} ms, '
+        f'{errors} non-200'
+    )
+
+
+def add_query_latency(seconds):
+    """Sleep before every query on every new connection, like a database across a network."""
+    def delay(execute, sql, params, many, context):
+        time.sleep(seconds)
+        return execute(sql, params, many, context)
+
+    def install(sender, connection, **kwargs):
+        # The wrapper list outlives reconnects of the same thread's connection.
+        if delay not in connection.execute_wrappers:
+            connection.execute_wrappers.append(delay)
+
+    connection_created.connect(install, weak=False)
+
+
+def wsgi_environ(path, cookie):
+    return {
+        'REQUEST_METHOD': 'GET',
+        'SCRIPT_NAME': '',
+        'PATH_INFO': path,
+        'QUERY_STRING': '',
+        'SERVER_NAME': 'benchmark',
+        'SERVER_PORT': '80',
+        'SERVER_PROTOCOL': 'HTTP/1.1',
+        'HTTP_HOST': 'benchmark',
+        'HTTP_COOKIE': cookie,
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': 'http',
+        'wsgi.input': BytesIO(),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+
+
+def asgi_scope(path, cookie):
+    return {
+        'type': 'http',
+        'asgi': {'version': '3.0'},
+        'http_version': '1.1',
+        'method': 'GET',
+        'scheme': 'http',
+        'path': path,
+        'raw_path': path.encode(),
+        'query_string': b'',
+        'root_path': '',
+        'headers': [(b'host', b'benchmark'), (b'cookie', cookie.encode())],
+        'server': ('benchmark', 80),
+        'client': ('127.0.0.1', 50000),
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        'Time concurrent requests to the read views through the WSGI handler (sync views, '
+        'a thread per request) and the ASGI handler (core.views_async on one event loop)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--mode', choices=['both', 'wsgi', 'asgi'], default='both',
+                            help='both runs each path in its own process, as they would be deployed')
+        parser.add_argument('--requests', type=int, default=300, help='Requests per view')
+        parser.add_argument('--concurrency', type=int, default=16)
+        parser.add_argument('--views', nargs='+', choices=VIEWS, default=VIEWS)
+        parser.add_argument('--db-latency', type=float, default=0,
+                            help='Milliseconds added to every query, to stand in for a networked database')
+        parser.add_argument('--username', help='Existing user to request as; by default a temporary one is created')
+
+    def handle(self, *args, **options):
+        if options['mode'] == 'both':
+            self.run_both(options)
+            return
+
+        if (options['mode'] == 'asgi') != settings.ASYNC_READ_VIEWS:
+            raise CommandError(f'Run --mode {options["mode"]} with ASYNC_READ_VIEWS={int(options["mode"] == "asgi")} in the environment')
+        if not options['username']:
+            raise CommandError('--username is required with --mode wsgi/asgi')
+        try:
+            user = User.objects.get(username=options['username'])
+        except User.DoesNotExist:
+            raise CommandError(f'No user {options["username"]!r}')
+
+        if options['db_latency']:
+            add_query_latency(options['db_latency'] / 1000)
+
+        client = Client()
+        client.force_login(user)
+        cookie = f'{settings.SESSION_COOKIE_NAME}={client.cookies[settings.SESSION_COOKIE_NAME].value}'
+        run = self.run_wsgi if options['mode'] == 'wsgi' else self.run_asgi
+
+        with translation.override(settings.LANGUAGE_CODE):
+            paths = {name: reverse(name) for name in options['views']}
+        for name, path in paths.items():
+            run(path, cookie, min(options['concurrency'], options['requests']), options['concurrency'])
+            latencies, elapsed, errors = run(path, cookie, options['requests'], options['concurrency'])
+            self.stdout.write(f'{options["mode"].upper()} {name}: {summarize(latencies, elapsed, errors)}')
+
+    def run_both(self, options):
+        user = None
+        username = options['username']
+        if not username:
+            user = User.objects.create_user(username=f'read-path-benchmark-{time.time_ns()}')
+            UserProfile.objects.create(user=user)
+            username = user.username
+        try:
+            for mode in ('wsgi', 'asgi'):
+                env = dict(os.environ, ASYNC_READ_VIEWS='1' if mode == 'asgi' else '0')
+                command = [
+                    sys.executable, sys.argv[0], 'benchmark_read_path', '--mode', mode,
+                    '--username', username,
+                    '--requests', str(options['requests']),
+                    '--concurrency', str(options['concurrency']),
+                    '--db-latency', str(options['db_latency']),
+                    '--views', *options['views'],
+                ]
+                result = subprocess.run(command, env=env, capture_output=True, text=True)
+                if result.returncode:
+                    raise CommandError(result.stderr.strip() or f'{mode} run failed')
+                self.stdout.write(result.stdout.rstrip())
+        finally:
+            if user is not None:
+                user.delete()
+
+    def run_wsgi(self, path, cookie, count, concurrency):
+        application = get_wsgi_application()
+
+        def request(_):
+            statuses = []
+            started = time.perf_counter()
+            body = application(wsgi_environ(path, cookie), lambda status, headers, exc_info=None: statuses.append(status))
+            try:
+                for chunk in body:
+                    pass
+            finally:
+                body.close()
+            return time.perf_counter() - started, statuses[0].startswith('200')
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            results = list(pool.map(request, range(count)))
+        elapsed = time.perf_counter() - started
+        return [latency for latency, ok in results], elapsed, sum(not ok for latency, ok in results)
+
+    def run_asgi(self, path, cookie, count, concurrency):
+        application = get_asgi_application()
+
+        async def request(limit):
+            async with limit:
+                sent = []
+                received = asyncio.Event()
+
+                async def receive():
+                    if not received.is_set():
+                        received.set()
+                        return {'type': 'http.request', 'body': b'', 'more_body': False}
+                    # Nothing more to read; Django cancels this once the response is sent.
+                    await asyncio.Event().wait()
+
+                async def send(message):
+                    sent.append(message)
+
+                started = time.perf_counter()
+                await application(asgi_scope(path, cookie), receive, send)
+                return time.perf_counter() - started, sent[0]['status'] == 200
+
+        async def main():
+            limit = asyncio.Semaphore(concurrency)
+            return await asyncio.gather(*[request(limit) for _ in range(count)])
+
+        started = time.perf_counter()
+        results = asyncio.run(main())
+        elapsed = time.perf_counter() - started
+        return [latency for latency, ok in results], elapsed, sum(not ok for latency, ok in results)
@@ -0,0 +1,131 @@
+import random
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Case, DurationField, ExpressionWrapper, F, FloatField, Value, When
+from django.db.models.functions import Cast, Greatest
+from django.utils import timezone
+
+from core.models import Task
+from core.ranking import CATEGORIES, URGENCY_HALF_LIFE_HOURS, WEIGHTS, TaskColumns, np, score_tasks, top_k
+
+
+def random_tasks(rng, count, now):
+    tasks = []
+    for i in range(count):
+        points = rng.choice([50, 100, 150, 200, 300])
+        tasks.append(Task(
+            id=i + 1,
+            title=f'Task {i}',
+            task_type='watch',
+            category=rng.choice(CATEGORIES),
+            video_url='https://www.youtube.com/watch?v=dQw4w9WgXcQ',
+            points=points,
+            usd_value=Decimal(points) / 200,
+            duration_seconds=rng.randint(0, 1200),
+            max_completions=100,
+            current_completions=rng.randint(0, 99),
+            expires_at=now + timedelta(hours=rng.uniform(1, 24 * 14)) if rng.random() < 0.5 else None,
+        ))
+    return tasks
+
+
+def orm_ranking(tasks, columns, affinity, now, k):
+    """The same score as core.ranking, computed in SQL and ordered by the database."""
+    half_life = URGENCY_HALF_LIFE_HOURS * 3600
+    usd = Cast('usd_value', FloatField())
+    minutes = Greatest(Cast('duration_seconds', FloatField()) / 60, Value(1.0))
+    # Durations come back from SQLite as microseconds.
+    seconds_left = Greatest(
+        Cast(ExpressionWrapper(F('expires_at') - Value(now), output_field=DurationField()), FloatField()) / 1_000_000,
+        Value(0.0),
+    )
+    score = ExpressionWrapper(
+        WEIGHTS['rate'] * usd / minutes / columns.max_rate
+        + WEIGHTS['usd'] * usd / columns.max_usd
+        + WEIGHTS['points'] * Cast('points', FloatField()) / columns.max_points
+        + WEIGHTS['scarcity'] / (1 + Cast(F('max_completions') - F('current_completions'), FloatField()))
+        + Case(
+            When(expires_at__isnull=True, then=Value(0.0)),
+            default=WEIGHTS['urgency'] / (1 + seconds_left / half_life),
+            output_field=FloatField(),
+        )
+        + Case(
+            *[When(category=category, then=Value(WEIGHTS['affinity'] * affinity[i])) for i, category in enumerate(CATEGORIES)],
+            default=Value(0.0),
+            output_field=FloatField(),
+        ),
+        output_field=FloatField(),
+    )
+    return list(
+        tasks.filter(status='active').annotate(score=score).order_by('-score', 'id').values_list('id', flat=True)[:k]
+    )
+
+
+class Command(BaseCommand):
+    help = 'Time ranking the task feed in memory (core.ranking) against ordering by the same score in SQL'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size', type=int, default=100_000)
+        parser.add_argument('--top', type=int, default=10)
+        parser.add_argument('--runs', type=int, default=50)
+        parser.add_argument('--orm-size', type=int, default=20_000, help='Tasks to insert for the SQL comparison (rolled back); 0 skips it')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        now = timezone.now()
+        tasks = random_tasks(rng, options['size'], now)
+        affinity = [0.6, 0.3, 0.1]
+        completed = set(rng.sample(range(len(tasks)), min(200, len(tasks))))
+
+        started = time.perf_counter()
+        columns = TaskColumns(tasks)
+        self.stdout.write(f'Built columns for {len(columns)} tasks in {(time.perf_counter() - started) * 1000:.1f} ms (once per catalog version)')
+
+        timings = []
+        for _ in range(options['runs']):
+            started = time.perf_counter()
+            top_k(score_tasks(columns, affinity, now), options['top'], completed)
+            timings.append(time.perf_counter() - started)
+        timings.sort()
+        engine = 'NumPy' if np is not None else 'pure Python (NumPy not installed)'
+        self.stdout.write(self.style.SUCCESS(
+            f'{engine}: score {len(columns)} tasks and take the top {options["top"]}: '
+            f'p50 {timings[len(timings) // 2] * 1000:.2f} ms, max {timings[-1] * 1000:.2f} ms'
+        ))
+
+        if options['orm_size']:
+            self.benchmark_orm(tasks[:options['orm_size']], affinity, now, options)
+
+    def benchmark_orm(self, tasks, affinity, now, options):
+        columns = TaskColumns(tasks)
+        with transaction.atomic():
+            creator = User.objects.create(username=f'ranking-benchmark-{time.time_ns()}')
+            for task in tasks:
+                task.id = None
+                task.created_by = creator
+            Task.objects.bulk_create(tasks, batch_size=2000)
+
+            queryset = Task.objects.filter(created_by=creator)
+            timings = []
+            for _ in range(min(options['runs'], 10)):
+                started = time.perf_counter()
+                from_sql = orm_ranking(queryset, columns, affinity, now, options['top'])
+                timings.append(time.perf_counter() - started)
+            timings.sort()
+
+            started = time.perf_counter()
+            in_memory = top_k(score_tasks(columns, affinity, now), options['top'], set())
+            elapsed = time.perf_counter() - started
+            transaction.set_rollback(True)
+
+        same = 'same' if from_sql == [tasks[i].id for i in in_memory] else 'DIFFERENT'
+        self.stdout.write(
+            f'ORM order_by on {len(tasks)} tasks: p50 {timings[len(timings) // 2] * 1000:.2f} ms; '
+            f'in memory on the same tasks: {elapsed * 1000:.2f} ms ({same} top {options["top"]})'
+        )
@@ -0,0 +1,33 @@
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.assets import AssetBuildError, build_assets, brotli, fetch_vendor_assets, run_tailwind
+
+
+class Command(BaseCommand):
+    help = 'Build the purged Tailwind bundle, vendored JS and fonts into ASSETS_ROOT with hashed names and .gz/.br variants'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fetch', action='store_true', help='Download the pinned vendor files into assets/vendor/ first')
+        parser.add_argument('--tailwind', help='Tailwind CLI command to run instead of TAILWIND_CLI')
+        parser.add_argument('--css', help='Use this compiled Tailwind CSS file instead of running the CLI')
+
+    def handle(self, *args, **options):
+        try:
+            if options['fetch']:
+                for name in fetch_vendor_assets():
+                    self.stdout.write(f'Fetched {name}')
+            if options['css']:
+                tailwind_css = Path(options['css']).read_text(encoding='utf-8')
+            else:
+                tailwind_css = run_tailwind(options['tailwind'])
+            manifest = build_assets(tailwind_css)
+        except (AssetBuildError, OSError) as e:
+            raise CommandError(str(e))
+
+        for name, hashed in sorted(manifest.items()):
+            self.stdout.write(f'{name} -> {hashed}')
+        if brotli is None:
+            self.stderr.write('brotli is not installed; only .gz variants were written')
+        self.stdout.write(self.style.SUCCESS(f'Built {len(manifest)} asset(s)'))
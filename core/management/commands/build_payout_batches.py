@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from core.settlement import PAYOUT_BATCH_SIZE, build_payout_batches, pending_withdrawals
+
+
+class Command(BaseCommand):
+    help = 'Approve pending withdrawals into per-provider payout batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=PAYOUT_BATCH_SIZE)
+        parser.add_argument('--provider', help='Only batch withdrawals to this mobile money provider')
+
+    def handle(self, *args, **options):
+        withdrawals = pending_withdrawals()
+        if options['provider']:
+            withdrawals = withdrawals.filter(mobile_money_provider=options['provider'])
+
+        batches = build_payout_batches(withdrawals, batch_size=options['batch_size'])
+        for batch in batches:
+            self.stdout.write(f'{batch.batch_id}: {batch.withdrawal_count} payout(s), ${batch.total_usd}')
+        self.stdout.write(self.style.SUCCESS(f'Built {len(batches)} batch(es)'))
@@ -0,0 +1,31 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import PayoutBatch
+from core.settlement import EXPORT_FORMATS
+
+
+class Command(BaseCommand):
+    help = 'Write a payout batch as a CSV or JSON file for the mobile money provider'
+
+    def add_arguments(self, parser):
+        parser.add_argument('batch_id')
+        parser.add_argument('--format', choices=sorted(EXPORT_FORMATS), default='csv')
+        parser.add_argument('--output', help='File to write to, standard output by default')
+
+    def handle(self, *args, **options):
+        try:
+            batch = PayoutBatch.objects.get(batch_id=options['batch_id'])
+        except PayoutBatch.DoesNotExist:
+            raise CommandError(f"No payout batch {options['batch_id']}")
+
+        export, content_type = EXPORT_FORMATS[options['format']]
+        if options['output']:
+            with open(options['output'], 'w', newline='') as output:
+                output.writelines(export(batch))
+            self.stderr.write(self.style.SUCCESS(f"Wrote {batch.withdrawal_count} payout(s) to {options['output']}"))
+        else:
+            self.stdout.ending = ''
+            for chunk in export(batch):
+                self.stdout.write(chunk)
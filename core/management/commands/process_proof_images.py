@@ -0,0 +1,54 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.images import (
+    fingerprint_proof, generate_proof_variants, load_proof_index, proofs_missing_fingerprint,
+    proofs_missing_variants,
+)
+
+
+class Command(BaseCommand):
+    help = 'Generate thumbnails, previews and perceptual hashes for uploaded proof screenshots'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument('--loop', action='store_true', help='Keep polling for new proofs instead of exiting when done')
+        parser.add_argument('--interval', type=float, default=10, help='Seconds to sleep between polls in --loop mode')
+
+    def handle(self, *args, **options):
+        # The near-duplicate index lives in this process, so run a single
+        # worker; a second one would not see the hashes the first adds.
+        index = load_proof_index()
+        processed = fingerprinted = failed = 0
+        failed_ids = set()
+        while True:
+            batch = list(proofs_missing_variants().exclude(id__in=failed_ids)[:options['batch_size']])
+            for completion in batch:
+                try:
+                    generate_proof_variants(completion)
+                    processed += 1
+                except (OSError, ValueError) as e:
+                    failed += 1
+                    failed_ids.add(completion.id)
+                    self.stderr.write(f'Proof {completion.id}: {e}')
+
+            unhashed = list(proofs_missing_fingerprint().exclude(id__in=failed_ids)[:options['batch_size']])
+            for completion in unhashed:
+                try:
+                    fingerprint_proof(completion, index)
+                    fingerprinted += 1
+                except (OSError, ValueError) as e:
+                    failed += 1
+                    failed_ids.add(completion.id)
+                    self.stderr.write(f'Proof {completion.id}: {e}')
+
+            if batch or unhashed:
+                continue
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Processed {processed} proof(s), fingerprinted {fingerprinted}, {failed} failed'
+        ))
@@ -0,0 +1,47 @@
+from collections import Counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.profiling import read_profile_log, summarize
+
+
+SORT_KEYS = ['p50', 'p95', 'p99', 'requests', 'queries', 'sql_p95', 'template_p95']
+
+
+class Command(BaseCommand):
+    help = 'Summarise the request profiling log: wall-time percentiles, SQL and template time per URL name'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--log', default=str(settings.PROFILING_LOG_PATH))
+        parser.add_argument('--sort', choices=SORT_KEYS, default='p95')
+        parser.add_argument('--limit', type=int, default=30)
+        parser.add_argument('--duplicates', type=int, default=5, help='Show the N most repeated queries')
+
+    def handle(self, *args, **options):
+        records = list(read_profile_log(options['log']))
+        if not records:
+            raise CommandError(f'No profiled requests in {options["log"]}')
+
+        rows = sorted(summarize(records), key=lambda row: row[options['sort']], reverse=True)
+        self.stdout.write(
+            f'{"url name":<40} {"reqs":>6} {"p50 ms":>8} {"p95 ms":>8} {"p99 ms":>8} '
+            f'{"sql p95":>8} {"tpl p95":>8} {"queries":>8} {"dup reqs":>8}'
+        )
+        for row in rows[:options['limit']]:
+            self.stdout.write(
+                f'{row["url_name"][:40]:<40} {row["requests"]:>6} {row["p50"]:>8.1f} {row["p95"]:>8.1f} '
+                f'{row["p99"]:>8.1f} {row["sql_p95"]:>8.1f} {row["template_p95"]:>8.1f} '
+                f'{row["queries"]:>8.1f} {row["with_duplicates"]:>8}'
+            )
+
+        repeated = Counter()
+        for record in records:
+            for duplicate in record['duplicate_queries']:
+                repeated[(record['url_name'], duplicate['sql'])] += duplicate['count']
+        if options['duplicates'] and repeated:
+            self.stdout.write('\nMost repeated queries:')
+            for (url_name, sql), count in repeated.most_common(options['duplicates']):
+                self.stdout.write(f'{count:>8}  {url_name}: {sql}')
+
+        self.stdout.write(self.style.SUCCESS(f'{len(records)} request(s) across {len(rows)} URL name(s)'))
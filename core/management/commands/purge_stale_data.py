@@ -0,0 +1,36 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from core.purge import OTP_RETENTION, PURGE_BATCH_SIZE, TRANSACTION_RETENTION, archive_transactions, purge_otps
+
+
+class Command(BaseCommand):
+    help = 'Delete spent and expired OTP codes and archive old settled transactions, in small batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=PURGE_BATCH_SIZE)
+        parser.add_argument('--pause', type=float, default=0.05, help='Seconds to sleep between batches so request writes can get the lock')
+        parser.add_argument('--otp-retention-hours', type=float, default=OTP_RETENTION.total_seconds() / 3600)
+        parser.add_argument('--transaction-retention-days', type=float, default=TRANSACTION_RETENTION.days)
+        parser.add_argument('--skip-otps', action='store_true')
+        parser.add_argument('--skip-transactions', action='store_true')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        pause = options['pause']
+        progress = self.progress if options['verbosity'] > 1 else None
+
+        if not options['skip_otps']:
+            stats = purge_otps(
+                batch_size, pause, retention=timedelta(hours=options['otp_retention_hours']), progress=progress
+            )
+            self.stdout.write(self.style.SUCCESS(str(stats)))
+        if not options['skip_transactions']:
+            stats = archive_transactions(
+                batch_size, pause, retention=timedelta(days=options['transaction_retention_days']), progress=progress
+            )
+            self.stdout.write(self.style.SUCCESS(str(stats)))
+
+    def progress(self, stats):
+        self.stdout.write(str(stats))
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from core.models import InfluencerProfile
+from core.stats import rebuild_influencer_counters
+
+
+class Command(BaseCommand):
+    help = 'Recompute the running task and completion counters of every influencer'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='Only rebuild the counters of this username')
+
+    def handle(self, *args, **options):
+        profiles = InfluencerProfile.objects.select_related('user')
+        if options['user']:
+            profiles = profiles.filter(user__username=options['user'])
+
+        count = 0
+        for profile in profiles.iterator():
+            rebuild_influencer_counters(profile)
+            count += 1
+
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt counters for {count} influencer(s)'))
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from core.blobs import adopt_legacy_proof, legacy_proofs, rebuild_proof_blobs
+
+
+class Command(BaseCommand):
+    help = 'Move proofs into content-addressed storage and recompute blob reference counts and duplicate flags'
+
+    def handle(self, *args, **options):
+        adopted = failed = 0
+        failed_ids = set()
+        adopted_names = set()
+        while True:
+            batch = list(legacy_proofs().exclude(id__in=failed_ids)[:100])
+            if not batch:
+                break
+            for completion in batch:
+                if completion.proof_screenshot.name in adopted_names:
+                    continue
+                try:
+                    adopt_legacy_proof(completion)
+                    adopted_names.add(completion.proof_screenshot.name)
+                    adopted += 1
+                except OSError as e:
+                    failed += 1
+                    failed_ids.add(completion.id)
+                    self.stderr.write(f'Proof {completion.id}: {e}')
+
+        blobs = rebuild_proof_blobs()
+        self.stdout.write(self.style.SUCCESS(
+            f'Adopted {adopted} legacy proof(s), {failed} failed; {blobs} unique blob(s)'
+        ))
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from core.feed import rebuild_feed
+from core.models import UserProfile
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the completed task IDs feed of every user from TaskCompletion'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='Only rebuild the feed of this username')
+
+    def handle(self, *args, **options):
+        profiles = UserProfile.objects.all()
+        if options['user']:
+            profiles = profiles.filter(user__username=options['user'])
+
+        count = 0
+        for profile in profiles.iterator():
+            rebuild_feed(profile)
+            count += 1
+
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt task feed for {count} user(s)'))
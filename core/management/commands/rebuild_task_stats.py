@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from core.models import Task
+from core.stats import rebuild_task_stats
+
+
+class Command(BaseCommand):
+    help = 'Recompute the completion rollup and hourly buckets of every task'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--task', type=int, help='Only rebuild the stats of this task ID')
+
+    def handle(self, *args, **options):
+        tasks = Task.objects.all()
+        if options['task']:
+            tasks = tasks.filter(id=options['task'])
+
+        count = 0
+        for task in tasks.iterator():
+            rebuild_task_stats(task)
+            count += 1
+
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt stats for {count} task(s)'))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.ledger import reconcile
+
+
+class Command(BaseCommand):
+    help = 'Verify every journal, snapshot and user balance against the ledger in one pass'
+
+    def handle(self, *args, **options):
+        entries, accounts, problems = reconcile()
+        for problem in problems:
+            self.stderr.write(problem)
+        if problems:
+            raise CommandError(f'{len(problems)} problem(s) in {entries} entries across {accounts} accounts')
+
+        self.stdout.write(self.style.SUCCESS(f'Ledger balances: {entries} entries across {accounts} accounts'))
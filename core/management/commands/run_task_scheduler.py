@@ -0,0 +1,44 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from django.utils import timezone
+
+from core.scheduler import ExpiryScheduler, close_full_tasks
+
+
+class Command(BaseCommand):
+    help = 'Close tasks when they expire or fill up. Run a single instance; --once for a cron-style pass'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Close what is due now and exit')
+        parser.add_argument('--refresh', type=float, default=30, help='Seconds between checks for new or edited tasks')
+        parser.add_argument('--sweep', type=float, default=600, help='Seconds between sweeps for tasks at capacity')
+
+    def handle(self, *args, **options):
+        scheduler = ExpiryScheduler()
+        now = timezone.now()
+        scheduler.load(now)
+        full = close_full_tasks()
+        expired = scheduler.close_due(now)
+        self.stdout.write(f'Scheduled {len(scheduler)} expiries; closed {expired} expired and {full} full task(s)')
+        if options['once']:
+            return
+
+        next_refresh = next_sweep = time.time()
+        next_refresh += options['refresh']
+        next_sweep += options['sweep']
+        while True:
+            wake_at = min(next_refresh, next_sweep, scheduler.next_due() or next_refresh)
+            time.sleep(max(0, wake_at - time.time()))
+            close_old_connections()
+            now = timezone.now()
+            if time.time() >= next_refresh:
+                scheduler.refresh(now)
+                next_refresh = time.time() + options['refresh']
+            closed = scheduler.close_due(now)
+            if time.time() >= next_sweep:
+                closed += close_full_tasks()
+                next_sweep = time.time() + options['sweep']
+            if closed:
+                self.stdout.write(f'{now:%Y-%m-%d %H:%M:%S} closed {closed} task(s)')
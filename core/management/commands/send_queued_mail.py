@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.mailer import CLAIM_LEASE_SECONDS, MAX_ATTEMPTS, send_queued_emails
+
+
+class Command(BaseCommand):
+    help = 'Send queued outbound emails in batches over a single connection'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=50)
+        parser.add_argument('--max-attempts', type=int, default=MAX_ATTEMPTS)
+        parser.add_argument('--lease', type=int, default=CLAIM_LEASE_SECONDS,
+                            help='Seconds before a batch claimed by a dead worker can be taken over')
+        parser.add_argument('--loop', action='store_true', help='Keep polling the queue instead of exiting when it is empty')
+        parser.add_argument('--interval', type=float, default=5, help='Seconds to sleep between polls in --loop mode')
+
+    def handle(self, *args, **options):
+        total_sent = total_failed = 0
+        while True:
+            sent, failed = send_queued_emails(options['batch_size'], options['max_attempts'], options['lease'])
+            total_sent += sent
+            total_failed += failed
+            if sent or failed:
+                self.stdout.write(f'Sent {sent}, failed {failed}')
+                continue
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+
+        self.stdout.write(self.style.SUCCESS(f'Done: {total_sent} sent, {total_failed} failed'))
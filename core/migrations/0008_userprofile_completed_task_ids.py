@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:02
+
+from django.db import migrations, models
+
+
+def backfill_completed_task_ids(apps, schema_editor):
+    UserProfile = apps.get_model('core', 'UserProfile')
+    TaskCompletion = apps.get_model('core', 'TaskCompletion')
+    for profile in UserProfile.objects.all().iterator():
+        profile.completed_task_ids = list(
+            TaskCompletion.objects.filter(user_id=profile.user_id).values_list('task_id', flat=True)
+        )
+        profile.save(update_fields=['completed_task_ids'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_influencerprofile_budget_limit'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofile',
+            name='completed_task_ids',
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.RunPython(backfill_completed_task_ids, migrations.RunPython.noop),
+    ]
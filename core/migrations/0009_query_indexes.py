@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:03
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_userprofile_completed_task_ids'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='emailverification',
+            index=models.Index(fields=['user', 'otp_code', 'is_used'], name='emailverif_user_otp_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['status', 'category', '-created_at'], name='task_status_category_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['created_by', '-created_at'], name='task_creator_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='taskcompletion',
+            index=models.Index(fields=['user', '-completed_at'], name='completion_user_done_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='taskcompletion',
+            index=models.Index(fields=['task', 'is_verified'], name='completion_task_verified_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='taskcompletion',
+            index=models.Index(condition=models.Q(('is_verified', False), ('proof_screenshot__isnull', False)), fields=['task', '-completed_at'], name='completion_pending_proof_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['user', '-created_at'], name='transaction_user_created_idx'),
+        ),
+    ]
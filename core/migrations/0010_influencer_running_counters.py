@@ -0,0 +1,50 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:06
+
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+
+
+def backfill_influencer_counters(apps, schema_editor):
+    InfluencerProfile = apps.get_model('core', 'InfluencerProfile')
+    Task = apps.get_model('core', 'Task')
+    TaskCompletion = apps.get_model('core', 'TaskCompletion')
+    for profile in InfluencerProfile.objects.all().iterator():
+        tasks = Task.objects.filter(created_by_id=profile.user_id).aggregate(
+            total_tasks=Count('id'),
+            total_value=Sum('usd_value'),
+        )
+        completions = TaskCompletion.objects.filter(task__created_by_id=profile.user_id).aggregate(
+            total=Count('id'),
+            pending=Count('id', filter=Q(is_verified=False, proof_screenshot__isnull=False)),
+        )
+        profile.total_tasks_created = tasks['total_tasks']
+        profile.total_task_value = tasks['total_value'] or 0
+        profile.total_completions = completions['total']
+        profile.pending_proofs = completions['pending']
+        profile.save(update_fields=['total_tasks_created', 'total_task_value', 'total_completions', 'pending_proofs'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='influencerprofile',
+            name='pending_proofs',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='influencerprofile',
+            name='total_completions',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='influencerprofile',
+            name='total_task_value',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12),
+        ),
+        migrations.RunPython(backfill_influencer_counters, migrations.RunPython.noop),
+    ]
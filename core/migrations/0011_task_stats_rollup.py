@@ -0,0 +1,78 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:08
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import Coalesce, TruncHour
+
+
+def backfill_task_stats(apps, schema_editor):
+    Task = apps.get_model('core', 'Task')
+    TaskCompletion = apps.get_model('core', 'TaskCompletion')
+    TaskStats = apps.get_model('core', 'TaskStats')
+    TaskStatsBucket = apps.get_model('core', 'TaskStatsBucket')
+    for task in Task.objects.all().iterator():
+        completions = TaskCompletion.objects.filter(task_id=task.id)
+        totals = completions.aggregate(
+            total=Count('id'),
+            verified=Count('id', filter=Q(is_verified=True)),
+            pending=Count('id', filter=Q(is_verified=False, proof_screenshot__isnull=False)),
+            paid=Sum('usd_earned', filter=Q(is_verified=True)),
+        )
+        TaskStats.objects.create(
+            task_id=task.id,
+            completion_count=totals['total'],
+            verified_count=totals['verified'],
+            pending_count=totals['pending'],
+            usd_paid_out=totals['paid'] or 0,
+        )
+
+        buckets = {}
+        for row in completions.annotate(hour=TruncHour('completed_at')).values('hour').annotate(n=Count('id')):
+            buckets.setdefault(row['hour'], {'completions': 0, 'verified': 0, 'usd_paid_out': 0})['completions'] = row['n']
+        verified = completions.filter(is_verified=True).annotate(
+            hour=TruncHour(Coalesce('verified_at', 'completed_at'))
+        ).values('hour').annotate(n=Count('id'), paid=Sum('usd_earned'))
+        for row in verified:
+            bucket = buckets.setdefault(row['hour'], {'completions': 0, 'verified': 0, 'usd_paid_out': 0})
+            bucket['verified'] = row['n']
+            bucket['usd_paid_out'] = row['paid']
+        TaskStatsBucket.objects.bulk_create([
+            TaskStatsBucket(task_id=task.id, hour=hour, **values) for hour, values in buckets.items()
+        ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_influencer_running_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TaskStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('completion_count', models.IntegerField(default=0)),
+                ('verified_count', models.IntegerField(default=0)),
+                ('pending_count', models.IntegerField(default=0)),
+                ('usd_paid_out', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('task', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='stats', to='core.task')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='TaskStatsBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField()),
+                ('completions', models.IntegerField(default=0)),
+                ('verified', models.IntegerField(default=0)),
+                ('usd_paid_out', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('task', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stats_buckets', to='core.task')),
+            ],
+            options={
+                'unique_together': {('task', 'hour')},
+            },
+        ),
+        migrations.RunPython(backfill_task_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:15
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_outbound_email'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='taskcompletion',
+            name='proof_preview',
+            field=models.ImageField(blank=True, upload_to='proofs/previews/'),
+        ),
+        migrations.AddField(
+            model_name='taskcompletion',
+            name='proof_thumbnail',
+            field=models.ImageField(blank=True, upload_to='proofs/thumbs/'),
+        ),
+        migrations.AddIndex(
+            model_name='taskcompletion',
+            index=models.Index(condition=models.Q(('proof_screenshot__gt', ''), ('proof_thumbnail', '')), fields=['completed_at'], name='completion_needs_thumbs_idx'),
+        ),
+    ]
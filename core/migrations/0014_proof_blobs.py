@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:20
+
+import core.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_proof_image_variants'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProofBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sha256', models.CharField(max_length=64, unique=True)),
+                ('file', models.FileField(storage=core.storage.proof_storage, upload_to='proofs/')),
+                ('size', models.BigIntegerField(default=0)),
+                ('ref_count', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='taskcompletion',
+            name='is_duplicate_proof',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='taskcompletion',
+            name='proof_sha256',
+            field=models.CharField(blank=True, db_index=True, max_length=64),
+        ),
+        migrations.AlterField(
+            model_name='taskcompletion',
+            name='proof_screenshot',
+            field=models.ImageField(blank=True, null=True, storage=core.storage.proof_storage, upload_to='proofs/'),
+        ),
+    ]
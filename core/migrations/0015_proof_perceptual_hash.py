@@ -0,0 +1,46 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:23
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_proof_blobs'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProofMatch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('distance', models.PositiveSmallIntegerField()),
+            ],
+        ),
+        migrations.AddField(
+            model_name='taskcompletion',
+            name='proof_dhash',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='taskcompletion',
+            index=models.Index(condition=models.Q(('proof_dhash__isnull', True), ('proof_screenshot__gt', '')), fields=['id'], name='completion_needs_dhash_idx'),
+        ),
+        migrations.AddField(
+            model_name='proofmatch',
+            name='completion',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='near_matches', to='core.taskcompletion'),
+        ),
+        migrations.AddField(
+            model_name='proofmatch',
+            name='match',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.taskcompletion'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='proofmatch',
+            unique_together={('completion', 'match')},
+        ),
+    ]
@@ -0,0 +1,99 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:28
+
+import uuid
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import Sum
+
+
+def open_ledger_balances(apps, schema_editor):
+    """
+    Carry the old profile balances over as opening journals. Pending and
+    settled withdrawals are posted against their Transaction rows so later
+    refunds and payouts find them; whatever history is left unexplained
+    goes to the opening balances account.
+    """
+    UserProfile = apps.get_model('core', 'UserProfile')
+    Transaction = apps.get_model('core', 'Transaction')
+    LedgerEntry = apps.get_model('core', 'LedgerEntry')
+
+    def journal(kind, user_account, amount, other_account, transaction_id=None):
+        journal_id = uuid.uuid4()
+        return [
+            LedgerEntry(journal=journal_id, account=user_account, amount=amount, kind=kind, transaction_id=transaction_id),
+            LedgerEntry(journal=journal_id, account=other_account, amount=-amount, kind=kind, transaction_id=transaction_id),
+        ]
+
+    entries = []
+    for profile in UserProfile.objects.all().iterator():
+        account = f'user:{profile.user_id}'
+        if profile.total_earned_usd:
+            entries += journal('earning', account, profile.total_earned_usd, 'platform:opening_balances')
+
+        withdrawals = Transaction.objects.filter(user_id=profile.user_id, transaction_type='withdrawal')
+        pending = withdrawals.filter(status='pending')
+        settled = withdrawals.filter(status__in=['approved', 'completed'])
+        for withdrawal in pending:
+            entries += journal('withdrawal', account, -withdrawal.amount_usd, 'platform:withdrawals_pending', withdrawal.id)
+        for withdrawal in settled:
+            entries += journal('withdrawal', account, -withdrawal.amount_usd, 'platform:withdrawals_paid', withdrawal.id)
+
+        withdrawn = (pending.aggregate(total=Sum('amount_usd'))['total'] or 0) + (settled.aggregate(total=Sum('amount_usd'))['total'] or 0)
+        unexplained = profile.available_balance_usd - profile.total_earned_usd + withdrawn
+        if unexplained:
+            entries += journal('opening', account, unexplained, 'platform:opening_balances')
+
+        if len(entries) >= 1000:
+            LedgerEntry.objects.bulk_create(entries)
+            entries = []
+    LedgerEntry.objects.bulk_create(entries)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_proof_perceptual_hash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LedgerSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('account', models.CharField(max_length=64)),
+                ('last_entry_id', models.BigIntegerField()),
+                ('balance', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('earned', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'unique_together': {('account', 'last_entry_id')},
+            },
+        ),
+        migrations.CreateModel(
+            name='LedgerEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('journal', models.UUIDField()),
+                ('account', models.CharField(max_length=64)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('kind', models.CharField(choices=[('earning', 'Task Earning'), ('withdrawal', 'Withdrawal'), ('withdrawal_refund', 'Withdrawal Refund'), ('withdrawal_payout', 'Withdrawal Payout'), ('opening', 'Opening Balance')], max_length=20)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('transaction', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='ledger_entries', to='core.transaction')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['account', 'id'], name='ledger_account_entry_idx')],
+            },
+        ),
+        migrations.RunPython(open_ledger_balances, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='userprofile',
+            name='available_balance_usd',
+        ),
+        migrations.RemoveField(
+            model_name='userprofile',
+            name='total_earned_usd',
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:34
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0016_double_entry_ledger'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PayoutBatch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('batch_id', models.CharField(max_length=40, unique=True)),
+                ('provider', models.CharField(blank=True, max_length=50)),
+                ('status', models.CharField(choices=[('approved', 'Approved'), ('completed', 'Paid Out')], default='approved', max_length=20)),
+                ('withdrawal_count', models.IntegerField(default=0)),
+                ('total_usd', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('completed_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['reference', 'id'], name='transaction_reference_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(condition=models.Q(('status', 'pending'), ('transaction_type', 'withdrawal')), fields=['mobile_money_provider', 'id'], name='transaction_pending_payout_idx'),
+        ),
+        migrations.AddField(
+            model_name='payoutbatch',
+            name='created_by',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='payout_batches', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
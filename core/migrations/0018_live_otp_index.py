@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:37
+
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def retire_dead_otps(apps, schema_editor):
+    EmailVerification = apps.get_model('core', 'EmailVerification')
+    EmailVerification.objects.filter(is_used=False, expires_at__lte=timezone.now()).update(is_used=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0017_payout_batches'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(retire_dead_otps, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='emailverification',
+            name='emailverif_user_otp_idx',
+        ),
+        migrations.AddIndex(
+            model_name='emailverification',
+            index=models.Index(condition=models.Q(('is_used', False)), fields=['user', 'otp_code'], name='emailverif_live_otp_idx'),
+        ),
+    ]
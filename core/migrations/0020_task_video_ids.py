@@ -0,0 +1,114 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:49
+
+import re
+from urllib.parse import parse_qs, urlsplit
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+# A frozen copy of core.video as of this migration, so later changes to
+# that module do not change what this backfill does.
+YOUTUBE_HOSTS = {
+    'youtube.com', 'www.youtube.com', 'm.youtube.com', 'music.youtube.com',
+    'youtube-nocookie.com', 'www.youtube-nocookie.com',
+}
+SHORT_HOSTS = {'youtu.be', 'www.youtu.be'}
+VIDEO_PATHS = {'shorts', 'embed', 'live', 'v', 'e'}
+CHANNEL_PATHS = {'channel', 'c', 'user'}
+VIDEO_ID = re.compile(r'^[A-Za-z0-9_-]{11}$')
+
+
+def _split(url):
+    url = (url or '').strip()
+    if not url:
+        return None
+    if '://' not in url:
+        url = f'https://{url}'
+    parts = urlsplit(url)
+    return parts, (parts.hostname or '').lower(), [segment for segment in parts.path.split('/') if segment]
+
+
+def parse_video_url(url):
+    split = _split(url)
+    if split is None:
+        return '', ''
+    parts, host, segments = split
+
+    candidate = ''
+    if host in SHORT_HOSTS:
+        candidate = segments[0] if segments else ''
+    elif host in YOUTUBE_HOSTS:
+        if segments[:1] == ['watch']:
+            candidate = parse_qs(parts.query).get('v', [''])[0]
+        elif len(segments) >= 2 and segments[0] in VIDEO_PATHS:
+            candidate = segments[1]
+
+    if VIDEO_ID.match(candidate):
+        return 'youtube', candidate
+    return '', ''
+
+
+def parse_channel_url(url):
+    split = _split(url)
+    if split is None:
+        return ''
+    parts, host, segments = split
+    if host not in YOUTUBE_HOSTS or not segments:
+        return ''
+    if segments[0].startswith('@') and len(segments[0]) > 1:
+        return segments[0].lower()
+    if len(segments) >= 2 and segments[0] in CHANNEL_PATHS:
+        if segments[0] == 'channel':
+            return f'channel/{segments[1]}'
+        return f'{segments[0]}/{segments[1].lower()}'
+    return ''
+
+
+def backfill_video_ids(apps, schema_editor):
+    Task = apps.get_model('core', 'Task')
+    batch = []
+    for task in Task.objects.only('id', 'video_url', 'channel_url').order_by('id').iterator(chunk_size=500):
+        task.platform, task.video_id = parse_video_url(task.video_url)
+        task.channel_key = parse_channel_url(task.channel_url) or parse_channel_url(task.video_url)
+        batch.append(task)
+        if len(batch) == 500:
+            Task.objects.bulk_update(batch, ['platform', 'video_id', 'channel_key'])
+            batch = []
+    if batch:
+        Task.objects.bulk_update(batch, ['platform', 'video_id', 'channel_key'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0019_transaction_archive'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='task',
+            name='channel_key',
+            field=models.CharField(blank=True, editable=False, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='task',
+            name='platform',
+            field=models.CharField(blank=True, editable=False, max_length=20),
+        ),
+        migrations.AddField(
+            model_name='task',
+            name='video_id',
+            field=models.CharField(blank=True, editable=False, max_length=32),
+        ),
+        migrations.RunPython(backfill_video_ids, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['platform', 'video_id'], name='task_video_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['channel_key'], name='task_channel_idx'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:52
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F, Q
+from django.utils import timezone
+
+
+def close_dead_tasks(apps, schema_editor):
+    # Listings now filter on status alone; close what used to be filtered out.
+    Task = apps.get_model('core', 'Task')
+    Task.objects.filter(
+        Q(current_completions__gte=F('max_completions')) | Q(expires_at__lte=timezone.now()),
+        status='active',
+    ).update(status='completed')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0020_task_video_ids'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(close_dead_tasks, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(condition=models.Q(('status', 'active')), fields=['expires_at'], name='task_active_expiry_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(condition=models.Q(('status', 'active')), fields=['updated_at'], name='task_active_updated_idx'),
+        ),
+    ]
@@ -1,6 +1,10 @@
 from django.db import models
 from django.contrib.auth.models import User
 from django.utils import timezone
+from django.utils.functional import cached_property
+
+from .storage import proof_storage
+from .video import embed_url, parse_channel_url, parse_video_url
 
 
 class Task(models.Model):
@@ -29,6 +33,10 @@ class Task(models.Model):
     category = models.CharField(max_length=20, choices=CATEGORY_CHOICES, default='video')
     video_url = models.URLField()
     channel_url = models.URLField(blank=True, null=True)
+    # Parsed from video_url/channel_url in save().
+    platform = models.CharField(max_length=20, blank=True, editable=False)
+    video_id = models.CharField(max_length=32, blank=True, editable=False)
+    channel_key = models.CharField(max_length=100, blank=True, editable=False)
     points = models.IntegerField()
     usd_value = models.DecimalField(max_digits=10, decimal_places=2)
     duration_seconds = models.IntegerField(default=0)
@@ -40,6 +48,16 @@ class Task(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'category', '-created_at'], name='task_status_category_idx'),
+            models.Index(fields=['created_by', '-created_at'], name='task_creator_created_idx'),
+            models.Index(fields=['platform', 'video_id'], name='task_video_idx'),
+            models.Index(fields=['channel_key'], name='task_channel_idx'),
+            models.Index(fields=['expires_at'], name='task_active_expiry_idx', condition=models.Q(status='active')),
+            models.Index(fields=['updated_at'], name='task_active_updated_idx', condition=models.Q(status='active')),
+        ]
+    
     def __str__(self):
         return f"{self.title} ({self.task_type})"
     
@@ -59,41 +77,89 @@ class Task(models.Model):
         else:
             return self.points * 0.005
     
+    def parse_urls(self):
+        self.platform, self.video_id = parse_video_url(self.video_url)
+        # Subscribe tasks often put the channel link in video_url.
+        self.channel_key = parse_channel_url(self.channel_url) or parse_channel_url(self.video_url)
+    
     def save(self, *args, **kwargs):
         if not self.usd_value:
             self.usd_value = self.calculate_usd_from_points()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None:
+            self.parse_urls()
+        elif {'video_url', 'channel_url'} & set(update_fields):
+            self.parse_urls()
+            kwargs['update_fields'] = {*update_fields, 'platform', 'video_id', 'channel_key'}
         super().save(*args, **kwargs)
     
     def get_embed_url(self):
-        url = self.video_url
-        if 'youtube.com/watch?v=' in url:
-            video_id = url.split('watch?v=')[1].split('&')[0]
-            return f'https://www.youtube.com/embed/{video_id}'
-        elif 'youtube.com/shorts/' in url:
-            video_id = url.split('shorts/')[1].split('?')[0]
-            return f'https://www.youtube.com/embed/{video_id}'
-        elif 'youtu.be/' in url:
-            video_id = url.split('youtu.be/')[1].split('?')[0]
-            return f'https://www.youtube.com/embed/{video_id}'
-        return url
+        return embed_url(self.platform, self.video_id) or self.video_url
+    
+    def same_video_tasks(self):
+        if not self.video_id:
+            return Task.objects.none()
+        return Task.objects.filter(platform=self.platform, video_id=self.video_id).exclude(id=self.id)
+    
+    def same_channel_tasks(self):
+        if not self.channel_key:
+            return Task.objects.none()
+        return Task.objects.filter(channel_key=self.channel_key).exclude(id=self.id)
+
+
+class TaskStats(models.Model):
+    task = models.OneToOneField(Task, on_delete=models.CASCADE, related_name='stats')
+    completion_count = models.IntegerField(default=0)
+    verified_count = models.IntegerField(default=0)
+    pending_count = models.IntegerField(default=0)
+    usd_paid_out = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    
+    def __str__(self):
+        return f"{self.task.title} - {self.completion_count} completions"
+
+
+class TaskStatsBucket(models.Model):
+    task = models.ForeignKey(Task, on_delete=models.CASCADE, related_name='stats_buckets')
+    hour = models.DateTimeField()
+    completions = models.IntegerField(default=0)
+    verified = models.IntegerField(default=0)
+    usd_paid_out = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    
+    class Meta:
+        unique_together = ('task', 'hour')
+    
+    def __str__(self):
+        return f"{self.task_id} @ {self.hour:%Y-%m-%d %H}:00"
 
 
 class UserProfile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='profile')
     profile_picture = models.ImageField(upload_to='profile_pics/', blank=True, null=True)
     total_points = models.IntegerField(default=0)
-    total_earned_usd = models.DecimalField(max_digits=10, decimal_places=2, default=0)
-    available_balance_usd = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     phone_number = models.CharField(max_length=20, blank=True, null=True)
     mobile_money_provider = models.CharField(max_length=50, blank=True, null=True)
     withdrawal_pin = models.CharField(max_length=6, blank=True, null=True)
     is_email_verified = models.BooleanField(default=False)
     is_withdrawal_verified = models.BooleanField(default=False)
+    completed_task_ids = models.JSONField(default=list, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
     def __str__(self):
         return f"{self.user.username} - {self.total_points} points"
+    
+    @cached_property
+    def balance(self):
+        from .ledger import user_balance
+        return user_balance(self.user_id)
+    
+    @property
+    def available_balance_usd(self):
+        return self.balance.available
+    
+    @property
+    def total_earned_usd(self):
+        return self.balance.earned
 
 
 class InfluencerProfile(models.Model):
@@ -119,6 +185,9 @@ class InfluencerProfile(models.Model):
     rejection_reason = models.TextField(blank=True, null=True)
     
     total_tasks_created = models.IntegerField(default=0)
+    total_task_value = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    total_completions = models.IntegerField(default=0)
+    pending_proofs = models.IntegerField(default=0)
     total_budget_spent = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     budget_limit = models.DecimalField(max_digits=10, decimal_places=2, default=0, help_text="Maximum budget the influencer can spend. 0 means unlimited.")
     
@@ -149,6 +218,11 @@ class EmailVerification(models.Model):
     expires_at = models.DateTimeField()
     is_used = models.BooleanField(default=False)
     
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'otp_code'], name='emailverif_live_otp_idx', condition=models.Q(is_used=False)),
+        ]
+    
     def is_valid(self):
         from django.utils import timezone
         return not self.is_used and timezone.now() < self.expires_at
@@ -160,13 +234,37 @@ class TaskCompletion(models.Model):
     completed_at = models.DateTimeField(default=timezone.now)
     points_earned = models.IntegerField()
     usd_earned = models.DecimalField(max_digits=10, decimal_places=2)
-    proof_screenshot = models.ImageField(upload_to='proofs/', blank=True, null=True)
+    proof_screenshot = models.ImageField(upload_to='proofs/', storage=proof_storage, blank=True, null=True)
+    proof_sha256 = models.CharField(max_length=64, blank=True, db_index=True)
+    is_duplicate_proof = models.BooleanField(default=False)
+    proof_dhash = models.BigIntegerField(blank=True, null=True)
+    proof_thumbnail = models.ImageField(upload_to='proofs/thumbs/', blank=True)
+    proof_preview = models.ImageField(upload_to='proofs/previews/', blank=True)
     is_verified = models.BooleanField(default=False)
     verified_at = models.DateTimeField(blank=True, null=True)
     verified_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='verified_completions')
     
     class Meta:
         unique_together = ('user', 'task')
+        indexes = [
+            models.Index(fields=['user', '-completed_at'], name='completion_user_done_idx'),
+            models.Index(fields=['task', 'is_verified'], name='completion_task_verified_idx'),
+            models.Index(
+                fields=['task', '-completed_at'],
+                name='completion_pending_proof_idx',
+                condition=models.Q(is_verified=False, proof_screenshot__isnull=False),
+            ),
+            models.Index(
+                fields=['completed_at'],
+                name='completion_needs_thumbs_idx',
+                condition=models.Q(proof_screenshot__gt='', proof_thumbnail=''),
+            ),
+            models.Index(
+                fields=['id'],
+                name='completion_needs_dhash_idx',
+                condition=models.Q(proof_screenshot__gt='', proof_dhash__isnull=True),
+            ),
+        ]
     
     def __str__(self):
         return f"{self.user.username} - {self.task.title}"
@@ -199,5 +297,164 @@ class Transaction(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-created_at'], name='transaction_user_created_idx'),
+            models.Index(fields=['reference', 'id'], name='transaction_reference_idx'),
+            models.Index(
+                fields=['mobile_money_provider', 'id'],
+                name='transaction_pending_payout_idx',
+                condition=models.Q(transaction_type='withdrawal', status='pending'),
+            ),
+        ]
+    
     def __str__(self):
         return f"{self.user.username} - {self.transaction_type} - ${self.amount_usd}"
+
+
+class TransactionArchive(models.Model):
+    # Settled transactions moved out of Transaction by purge_stale_data. The
+    # id is the original transaction id; payout details and notes are dropped.
+    id = models.BigIntegerField(primary_key=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='archived_transactions')
+    transaction_type = models.CharField(max_length=20, choices=Transaction.TRANSACTION_TYPES)
+    status = models.CharField(max_length=20, choices=Transaction.STATUS_CHOICES)
+    amount_usd = models.DecimalField(max_digits=10, decimal_places=2)
+    points = models.IntegerField(default=0)
+    reference = models.CharField(max_length=100, blank=True, null=True)
+    created_at = models.DateTimeField()
+    settled_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-created_at'], name='txn_archive_user_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} - {self.transaction_type} - ${self.amount_usd} (archived)"
+
+
+class PayoutBatch(models.Model):
+    STATUS_CHOICES = (
+        ('approved', 'Approved'),
+        ('completed', 'Paid Out'),
+    )
+    
+    batch_id = models.CharField(max_length=40, unique=True)
+    provider = models.CharField(max_length=50, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='approved')
+    withdrawal_count = models.IntegerField(default=0)
+    total_usd = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='payout_batches')
+    created_at = models.DateTimeField(auto_now_add=True)
+    completed_at = models.DateTimeField(blank=True, null=True)
+    
+    def __str__(self):
+        return f"{self.batch_id} - {self.provider} ({self.withdrawal_count} payouts, ${self.total_usd})"
+
+
+class LedgerEntry(models.Model):
+    KINDS = (
+        ('earning', 'Task Earning'),
+        ('withdrawal', 'Withdrawal'),
+        ('withdrawal_refund', 'Withdrawal Refund'),
+        ('withdrawal_payout', 'Withdrawal Payout'),
+        ('opening', 'Opening Balance'),
+    )
+    
+    journal = models.UUIDField()
+    account = models.CharField(max_length=64)
+    amount = models.DecimalField(max_digits=12, decimal_places=2)
+    kind = models.CharField(max_length=20, choices=KINDS)
+    # Entries are never updated, so archiving a transaction (core.purge)
+    # leaves this id in place; it then names a TransactionArchive row.
+    transaction = models.ForeignKey(
+        Transaction, on_delete=models.DO_NOTHING, db_constraint=False,
+        null=True, blank=True, related_name='ledger_entries',
+    )
+    created_at = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['account', 'id'], name='ledger_account_entry_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.account} {self.amount:+} ({self.kind})"
+
+
+class LedgerAccount(models.Model):
+    # One row per account, locked by core.ledger.post_many while it posts.
+    name = models.CharField(max_length=64, unique=True)
+    
+    def __str__(self):
+        return self.name
+
+
+class LedgerSnapshot(models.Model):
+    account = models.CharField(max_length=64)
+    last_entry_id = models.BigIntegerField()
+    balance = models.DecimalField(max_digits=14, decimal_places=2)
+    earned = models.DecimalField(max_digits=14, decimal_places=2)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        unique_together = ('account', 'last_entry_id')
+    
+    def __str__(self):
+        return f"{self.account} @ {self.last_entry_id}: {self.balance}"
+
+
+class ProofMatch(models.Model):
+    completion = models.ForeignKey(TaskCompletion, on_delete=models.CASCADE, related_name='near_matches')
+    match = models.ForeignKey(TaskCompletion, on_delete=models.CASCADE, related_name='+')
+    distance = models.PositiveSmallIntegerField()
+    
+    class Meta:
+        unique_together = ('completion', 'match')
+    
+    def __str__(self):
+        return f"{self.completion_id} ~ {self.match_id} ({self.distance})"
+
+
+class ProofBlob(models.Model):
+    sha256 = models.CharField(max_length=64, unique=True)
+    file = models.FileField(upload_to='proofs/', storage=proof_storage)
+    size = models.BigIntegerField(default=0)
+    ref_count = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f"{self.sha256[:12]} ({self.ref_count} refs)"
+
+
+class OutboundEmail(models.Model):
+    STATUS_CHOICES = (
+        ('queued', 'Queued'),
+        ('sending', 'Sending'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+    )
+    
+    to_email = models.EmailField()
+    subject = models.CharField(max_length=255)
+    text_body = models.TextField()
+    html_body = models.TextField(blank=True)
+    from_email = models.CharField(max_length=255, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+    attempts = models.IntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    # Set while a send_queued_mail worker holds the row (status 'sending').
+    claimed_by = models.CharField(max_length=32, blank=True)
+    claimed_until = models.DateTimeField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(blank=True, null=True)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='outbound_email_queue_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.to_email} - {self.subject} ({self.status})"
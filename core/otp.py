@@ -0,0 +1,43 @@
+"""
+Email one-time codes for signup, influencer upgrade and withdrawal setup.
+
+A user has at most one live code: issuing a new one retires the others, and
+a code is consumed with a single conditional UPDATE, so a verify attempt
+only ever looks at that user's one unused row.
+"""
+import secrets
+from datetime import timedelta
+
+from django.utils import timezone
+
+from .mailer import enqueue_otp_email
+from .models import EmailVerification
+
+
+OTP_VALIDITY = timedelta(minutes=10)
+
+
+def issue_otp(user, subject=None):
+    otp_code = f'{secrets.randbelow(900000) + 100000}'
+    EmailVerification.objects.filter(user=user, is_used=False).update(is_used=True)
+    EmailVerification.objects.create(
+        user=user,
+        otp_code=otp_code,
+        expires_at=timezone.now() + OTP_VALIDITY
+    )
+    if subject:
+        enqueue_otp_email(user, otp_code, subject)
+    else:
+        enqueue_otp_email(user, otp_code)
+    return otp_code
+
+
+def verify_otp(user, otp_code):
+    if not otp_code:
+        return False
+    return bool(EmailVerification.objects.filter(
+        user=user,
+        otp_code=otp_code,
+        is_used=False,
+        expires_at__gt=timezone.now(),
+    ).update(is_used=True))
@@ -0,0 +1,82 @@
+"""
+Keyset (cursor) pagination on (timestamp, id).
+
+Each page is a single indexed range scan: the cursor carries the timestamp and
+id of the last row shown, so the cost of a page does not depend on how deep
+in the history it is, unlike OFFSET based pagination.
+"""
+import base64
+from datetime import datetime
+
+from django.db.models import Q
+
+
+class KeysetPage:
+    def __init__(self, object_list, next_cursor):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __bool__(self):
+        return bool(self.object_list)
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+
+def encode_cursor(timestamp, pk):
+    raw = f'{timestamp.isoformat()}|{pk}'.encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        timestamp, pk = raw.split('|')
+        return datetime.fromisoformat(timestamp), int(pk)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+def _after(queryset, field, position):
+    queryset = queryset.order_by(f'-{field}', '-id')
+    if position:
+        timestamp, pk = position
+        queryset = queryset.filter(
+            Q(**{f'{field}__lt': timestamp}) | Q(**{field: timestamp, 'id__lt': pk})
+        )
+    return queryset
+
+
+def _page(rows, field, per_page):
+    next_cursor = None
+    if len(rows) > per_page:
+        rows = rows[:per_page]
+        last = rows[-1]
+        next_cursor = encode_cursor(getattr(last, field), last.id)
+    return KeysetPage(rows, next_cursor)
+
+
+def keyset_page(queryset, field, cursor=None, per_page=20):
+    rows = list(_after(queryset, field, decode_cursor(cursor))[:per_page + 1])
+    return _page(rows, field, per_page)
+
+
+def merged_keyset_page(querysets, field, cursor=None, per_page=20):
+    """
+    One page over several querysets whose ids do not collide (e.g. a table
+    and its archive), in the same (field, id) order: each is read with its
+    own range scan and the results are merged.
+    """
+    position = decode_cursor(cursor)
+    rows = [row for queryset in querysets for row in _after(queryset, field, position)[:per_page + 1]]
+    rows.sort(key=lambda row: (getattr(row, field), row.id), reverse=True)
+    return _page(rows, field, per_page)
@@ -0,0 +1,108 @@
+"""
+Perceptual hashes of proof screenshots and an in-memory index for finding
+near-duplicates by Hamming distance.
+
+The index uses multi-index hashing: each 64-bit hash is split into three
+bands of 21-22 bits with a lookup table per band. Two hashes within
+distance d agree to within d // 3 bits on at least one band, so a search
+only probes the band values that close to the query's bands and checks the
+few candidates it finds, instead of scanning every stored hash.
+"""
+import heapq
+from collections import defaultdict
+from functools import lru_cache
+from itertools import combinations
+
+from PIL import Image
+
+
+HASH_BITS = 64
+BAND_WIDTHS = (22, 21, 21)
+BAND_COUNT = len(BAND_WIDTHS)
+
+NEAR_DUPLICATE_DISTANCE = 7
+MAX_MATCHES = 5
+
+
+def dhash(image):
+    """
+    64-bit difference hash: shrink to 9x8 greys and record whether each
+    pixel is brighter than its right-hand neighbour.
+    """
+    image.draft('L', (64, 64))
+    pixels = image.convert('L').resize((9, 8), Image.LANCZOS).tobytes()
+    bits = 0
+    for row in range(8):
+        for col in range(8):
+            offset = row * 9 + col
+            bits = (bits << 1) | (pixels[offset] > pixels[offset + 1])
+    return bits
+
+
+def to_db(value):
+    """Unsigned 64-bit hash to the signed value a BigIntegerField holds."""
+    return value - (1 << HASH_BITS) if value >= 1 << (HASH_BITS - 1) else value
+
+
+def from_db(value):
+    return value & ((1 << HASH_BITS) - 1)
+
+
+def split_bands(value):
+    bands = []
+    for width in BAND_WIDTHS:
+        bands.append(value & ((1 << width) - 1))
+        value >>= width
+    return bands
+
+
+@lru_cache(maxsize=None)
+def flip_masks(width, radius):
+    return tuple(
+        sum(1 << bit for bit in bits)
+        for distance in range(radius + 1)
+        for bits in combinations(range(width), distance)
+    )
+
+
+class HammingIndex:
+    def __init__(self):
+        self.hashes = {}
+        self.tables = [defaultdict(list) for _ in range(BAND_COUNT)]
+
+    def __len__(self):
+        return len(self.hashes)
+
+    def add(self, key, value):
+        if key in self.hashes:
+            self.discard(key)
+        self.hashes[key] = value
+        for table, band in zip(self.tables, split_bands(value)):
+            table[band].append(key)
+
+    def discard(self, key):
+        value = self.hashes.pop(key, None)
+        if value is None:
+            return
+        for table, band in zip(self.tables, split_bands(value)):
+            bucket = table[band]
+            bucket.remove(key)
+            if not bucket:
+                del table[band]
+
+    def search(self, value, max_distance=NEAR_DUPLICATE_DISTANCE, limit=MAX_MATCHES):
+        """
+        The closest stored keys within max_distance as (distance, key)
+        pairs, nearest first.
+        """
+        radius = max_distance // BAND_COUNT
+        hashes = self.hashes
+        found = {}
+        for table, width, band in zip(self.tables, BAND_WIDTHS, split_bands(value)):
+            probe = table.get
+            for mask in flip_masks(width, radius):
+                for key in probe(band ^ mask, ()):
+                    distance = (hashes[key] ^ value).bit_count()
+                    if distance <= max_distance:
+                        found[key] = distance
+        return heapq.nsmallest(limit, ((distance, key) for key, distance in found.items()))
@@ -0,0 +1,185 @@
+"""
+Opt-in request profiling.
+
+With PROFILING_ENABLED on, ProfilingMiddleware times every request and
+records its SQL queries (count, time, and statements run more than once with
+the same SQL, which usually means a loop doing a query per row) and how long
+template rendering took. The numbers go out in a Server-Timing header, so
+they show up in the browser's network panel, and as one JSON object per line
+in PROFILING_LOG_PATH, which rotates at PROFILING_LOG_MAX_BYTES. The
+profile_report command turns that log into percentiles per URL name.
+
+With PROFILING_ENABLED off the middleware removes itself at startup.
+"""
+import json
+import logging
+import math
+import time
+from collections import Counter
+from contextvars import ContextVar
+from logging.handlers import RotatingFileHandler
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+from django.utils import timezone
+
+
+MAX_DUPLICATES_LOGGED = 5
+MAX_SQL_LENGTH = 300
+
+_current = ContextVar('request_profile', default=None)
+
+
+class RequestProfile:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.sql_count = 0
+        self.sql_seconds = 0.0
+        self.template_seconds = 0.0
+        self.statements = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_seconds += time.perf_counter() - started
+            self.sql_count += 1
+            self.statements[sql] += 1
+
+    def duplicates(self):
+        return [
+            {'sql': sql[:MAX_SQL_LENGTH], 'count': count}
+            for sql, count in self.statements.most_common(MAX_DUPLICATES_LOGGED)
+            if count > 1
+        ]
+
+    def server_timing(self, total):
+        return ', '.join([
+            f'total;dur={total * 1000:.1f}',
+            f'sql;dur={self.sql_seconds * 1000:.1f};desc="{self.sql_count} queries"',
+            f'tpl;dur={self.template_seconds * 1000:.1f}',
+        ])
+
+
+def _timed_render(render):
+    def wrapper(self, *args, **kwargs):
+        profile = _current.get()
+        if profile is None:
+            return render(self, *args, **kwargs)
+        started = time.perf_counter()
+        try:
+            return render(self, *args, **kwargs)
+        finally:
+            profile.template_seconds += time.perf_counter() - started
+    wrapper.profiled = True
+    return wrapper
+
+
+def instrument_templates():
+    """
+    Time Template.render of the Django template backend. Only top-level
+    renders go through it; {% include %} renders inside them, so nothing is
+    counted twice.
+    """
+    from django.template.backends.django import Template
+
+    if not getattr(Template.render, 'profiled', False):
+        Template.render = _timed_render(Template.render)
+
+
+def open_profile_log():
+    handler = RotatingFileHandler(
+        settings.PROFILING_LOG_PATH,
+        maxBytes=settings.PROFILING_LOG_MAX_BYTES,
+        backupCount=settings.PROFILING_LOG_BACKUPS,
+    )
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    return handler
+
+
+class ProfilingMiddleware:
+    def __init__(self, get_response):
+        if not settings.PROFILING_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.log = open_profile_log()
+        instrument_templates()
+
+    def __call__(self, request):
+        profile = RequestProfile()
+        token = _current.set(profile)
+        try:
+            with connection.execute_wrapper(profile):
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+
+        total = time.perf_counter() - profile.started
+        response['Server-Timing'] = profile.server_timing(total)
+        match = request.resolver_match
+        self.log.handle(logging.makeLogRecord({'msg': json.dumps({
+            'at': timezone.now().isoformat(),
+            'method': request.method,
+            'path': request.path,
+            'url_name': match.view_name if match else None,
+            'status': response.status_code,
+            'total_ms': round(total * 1000, 2),
+            'sql_count': profile.sql_count,
+            'sql_ms': round(profile.sql_seconds * 1000, 2),
+            'template_ms': round(profile.template_seconds * 1000, 2),
+            'duplicate_queries': profile.duplicates(),
+        })}))
+        return response
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(len(sorted_values) * pct / 100))
+    return sorted_values[rank - 1]
+
+
+def read_profile_log(path):
+    """Records from the log and its rotated backups, oldest file first."""
+    paths = [f'{path}.{n}' for n in range(settings.PROFILING_LOG_BACKUPS, 0, -1)] + [str(path)]
+    for log_path in paths:
+        try:
+            log = open(log_path, encoding='utf-8')
+        except FileNotFoundError:
+            continue
+        with log:
+            for line in log:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+
+
+def summarize(records):
+    """
+    Per URL name: request count, p50/p95/p99 wall time, p95 SQL and
+    template time, mean query count and how many requests repeated a query.
+    """
+    grouped = {}
+    for record in records:
+        grouped.setdefault(record['url_name'] or record['path'], []).append(record)
+
+    rows = []
+    for url_name, group in grouped.items():
+        total = sorted(r['total_ms'] for r in group)
+        sql = sorted(r['sql_ms'] for r in group)
+        template = sorted(r['template_ms'] for r in group)
+        rows.append({
+            'url_name': url_name,
+            'requests': len(group),
+            'p50': percentile(total, 50),
+            'p95': percentile(total, 95),
+            'p99': percentile(total, 99),
+            'sql_p95': percentile(sql, 95),
+            'template_p95': percentile(template, 95),
+            'queries': sum(r['sql_count'] for r in group) / len(group),
+            'with_duplicates': sum(1 for r in group if r['duplicate_queries']),
+        })
+    return rows
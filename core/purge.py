@@ -0,0 +1,118 @@
+"""
+Batched cleanup of rows nobody reads any more.
+
+Spent and expired OTP codes are deleted, and settled transactions older than
+the retention period are moved to TransactionArchive. Rows are walked in id
+order and each batch is its own short transaction, so on SQLite the write
+lock is released between batches and request writes are not held up behind
+one long DELETE.
+"""
+import time
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import EmailVerification, Transaction, TransactionArchive
+
+
+PURGE_BATCH_SIZE = 500
+OTP_RETENTION = timedelta(days=1)
+TRANSACTION_RETENTION = timedelta(days=365)
+ARCHIVED_STATUSES = ('completed', 'rejected')
+
+
+class PurgeStats:
+    def __init__(self, name):
+        self.name = name
+        self.rows = 0
+        self.batches = 0
+        self.started = time.monotonic()
+        self.elapsed = 0.0
+
+    def add(self, rows):
+        self.rows += rows
+        self.batches += 1
+        self.elapsed = time.monotonic() - self.started
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.elapsed if self.elapsed else 0.0
+
+    def __str__(self):
+        return (
+            f'{self.name}: {self.rows} row(s) in {self.batches} batch(es), '
+            f'{self.elapsed:.2f}s, {self.rows_per_second:.0f} rows/s'
+        )
+
+
+def _batches(queryset, batch_size):
+    """
+    Ids of queryset a batch at a time, resuming after the last id seen so
+    each query only reads forward from where the previous one stopped.
+    """
+    last_id = 0
+    while True:
+        ids = list(queryset.filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return
+        last_id = ids[-1]
+        yield ids
+
+
+def dead_otps(now=None, retention=OTP_RETENTION):
+    now = now or timezone.now()
+    return EmailVerification.objects.filter(
+        Q(is_used=True) | Q(expires_at__lte=now),
+        created_at__lt=now - retention,
+    )
+
+
+def archivable_transactions(now=None, retention=TRANSACTION_RETENTION):
+    now = now or timezone.now()
+    return Transaction.objects.filter(status__in=ARCHIVED_STATUSES, updated_at__lt=now - retention)
+
+
+def purge_otps(batch_size=PURGE_BATCH_SIZE, pause=0, now=None, retention=OTP_RETENTION, progress=None):
+    stats = PurgeStats('OTP codes deleted')
+    queryset = dead_otps(now, retention)
+    for ids in _batches(queryset, batch_size):
+        with transaction.atomic():
+            deleted, _ = EmailVerification.objects.filter(id__in=ids).delete()
+        stats.add(deleted)
+        if progress:
+            progress(stats)
+        if pause:
+            time.sleep(pause)
+    return stats
+
+
+def archive_transactions(batch_size=PURGE_BATCH_SIZE, pause=0, now=None, retention=TRANSACTION_RETENTION, progress=None):
+    """
+    Copy each batch into TransactionArchive and delete it from Transaction
+    in the same transaction. Ledger entries are left untouched: their
+    transaction_id now names the archived row, which keeps the original id.
+    The transaction history pages read both tables.
+    """
+    stats = PurgeStats('Transactions archived')
+    queryset = archivable_transactions(now, retention)
+    for ids in _batches(queryset, batch_size):
+        with transaction.atomic():
+            rows = Transaction.objects.filter(id__in=ids).values_list(
+                'id', 'user_id', 'transaction_type', 'status', 'amount_usd', 'points', 'reference', 'created_at', 'updated_at'
+            )
+            TransactionArchive.objects.bulk_create([
+                TransactionArchive(
+                    id=id, user_id=user_id, transaction_type=transaction_type, status=status, amount_usd=amount_usd,
+                    points=points, reference=reference, created_at=created_at, settled_at=updated_at,
+                )
+                for id, user_id, transaction_type, status, amount_usd, points, reference, created_at, updated_at in rows
+            ], ignore_conflicts=True)
+            _, deleted = Transaction.objects.filter(id__in=ids).delete()
+        stats.add(deleted.get(Transaction._meta.label, 0))
+        if progress:
+            progress(stats)
+        if pause:
+            time.sleep(pause)
+    return stats
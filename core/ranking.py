@@ -0,0 +1,187 @@
+"""
+Ranking of the task feed.
+
+The active catalog is turned into columns (points, USD value, minutes to
+complete, remaining slots, expiry, category) once per catalog version and
+kept in this process. Each request then scores every task for the user in
+a few vector operations and takes the top k with argpartition, instead of
+ordering rows in SQL. Without NumPy the same scores are computed in a plain
+Python loop, which gives the same order, just more slowly.
+
+A task's score is a weighted sum of:
+- how much it pays per minute, and how much it pays and awards in total,
+  each relative to the best task in the catalog;
+- urgency, which grows as expires_at approaches;
+- scarcity, which grows as the remaining slots run out;
+- the user's affinity for its category: their share of past completions in
+  that category, smoothed so new users get an even spread.
+"""
+import heapq
+import math
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.db.models import Count
+from django.utils import timezone
+
+from .catalog import ALL_CATEGORIES, catalog_key, get_active_catalog
+from .models import Task, TaskCompletion
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+WEIGHTS = {
+    'rate': 3.0,
+    'usd': 1.0,
+    'points': 0.5,
+    'urgency': 1.5,
+    'scarcity': 0.5,
+    'affinity': 2.0,
+}
+URGENCY_HALF_LIFE_HOURS = 24
+CATEGORIES = [category for category, label in Task.CATEGORY_CHOICES]
+
+_columns = {}
+
+
+class TaskColumns:
+    def __init__(self, tasks):
+        self.tasks = tasks
+        self.ids = [task.id for task in tasks]
+        self.position = {task_id: i for i, task_id in enumerate(self.ids)}
+        self.points = [float(task.points) for task in tasks]
+        self.usd = [float(task.usd_value) for task in tasks]
+        self.minutes = [max(task.duration_seconds / 60, 1) for task in tasks]
+        self.remaining = [max(task.max_completions - task.current_completions, 0) for task in tasks]
+        self.expires = [task.expires_at.timestamp() if task.expires_at else math.inf for task in tasks]
+        self.categories = [CATEGORIES.index(task.category) if task.category in CATEGORIES else 0 for task in tasks]
+        self.rate = [usd / minutes for usd, minutes in zip(self.usd, self.minutes)]
+        self.max_rate = max(self.rate, default=0) or 1
+        self.max_usd = max(self.usd, default=0) or 1
+        self.max_points = max(self.points, default=0) or 1
+        if np is not None:
+            self.static_score = (
+                WEIGHTS['rate'] * np.array(self.rate) / self.max_rate
+                + WEIGHTS['usd'] * np.array(self.usd) / self.max_usd
+                + WEIGHTS['points'] * np.array(self.points) / self.max_points
+                + WEIGHTS['scarcity'] / (1 + np.array(self.remaining, dtype=np.float64))
+            )
+            self.array_expires = np.array(self.expires)
+            self.array_categories = np.array(self.categories, dtype=np.intp)
+        else:
+            self.static_score = [
+                WEIGHTS['rate'] * rate / self.max_rate
+                + WEIGHTS['usd'] * usd / self.max_usd
+                + WEIGHTS['points'] * points / self.max_points
+                + WEIGHTS['scarcity'] / (1 + remaining)
+                for rate, usd, points, remaining in zip(self.rate, self.usd, self.points, self.remaining)
+            ]
+
+    def __len__(self):
+        return len(self.ids)
+
+
+def get_task_columns(category=ALL_CATEGORIES):
+    """
+    Columns of the active catalog for category, rebuilt when the catalog
+    version changes or after TASK_CATALOG_CACHE_TIMEOUT seconds.
+    """
+    key = catalog_key(category)
+    cached = _columns.get(category)
+    ttl = getattr(settings, 'TASK_CATALOG_CACHE_TIMEOUT', 300)
+    if cached is None or cached[0] != key or time.monotonic() - cached[1] > ttl:
+        cached = (key, time.monotonic(), TaskColumns(get_active_catalog(category)))
+        _columns[category] = cached
+    return cached[2]
+
+
+def category_affinity(user_id):
+    """Smoothed share of the user's completions in each category, by category index."""
+    counts = Counter(dict(
+        TaskCompletion.objects.filter(user_id=user_id)
+        .values_list('task__category')
+        .annotate(count=Count('id'))
+        .order_by()
+    ))
+    total = sum(counts.values())
+    return [(counts[category] + 1) / (total + len(CATEGORIES)) for category in CATEGORIES]
+
+
+def score_tasks(columns, affinity, now=None):
+    now = (now or timezone.now()).timestamp()
+    half_life = URGENCY_HALF_LIFE_HOURS * 3600
+    if np is not None:
+        hours_left = np.maximum(columns.array_expires - now, 0)
+        urgency = np.where(np.isinf(columns.array_expires), 0.0, 1 / (1 + hours_left / half_life))
+        return (
+            columns.static_score
+            + WEIGHTS['urgency'] * urgency
+            + WEIGHTS['affinity'] * np.array(affinity)[columns.array_categories]
+        )
+    return [
+        static
+        + (0.0 if expires == math.inf else WEIGHTS['urgency'] / (1 + max(expires - now, 0) / half_life))
+        + WEIGHTS['affinity'] * affinity[category]
+        for static, expires, category in zip(columns.static_score, columns.expires, columns.categories)
+    ]
+
+
+def top_k(scores, k, excluded):
+    """
+    Indexes of the k best scores, best first, skipping the positions in
+    excluded. Ties keep catalog order (newest first).
+    """
+    if np is not None:
+        scores = scores.copy()
+        if excluded:
+            scores[list(excluded)] = -np.inf
+        eligible = len(scores) - len(excluded)
+        k = min(k, eligible)
+        if k <= 0:
+            return []
+        # argpartition picks arbitrarily among tasks tied with the kth
+        # score, so take all of them and let the sort break the tie.
+        kth = scores[np.argpartition(-scores, k - 1)[k - 1]]
+        top = np.flatnonzero(scores >= kth)
+        return top[np.lexsort((top, -scores[top]))][:k].tolist()
+    return heapq.nsmallest(
+        k, (i for i in range(len(scores)) if i not in excluded), key=lambda i: (-scores[i], i)
+    )
+
+
+class RankedFeed:
+    """
+    The user's available tasks, best first. Sliceable and sized, so it can
+    go straight into a Paginator; a slice only ranks as far as its end.
+    """
+
+    def __init__(self, profile, category=ALL_CATEGORIES, now=None, columns=None, affinity=None):
+        # columns and affinity can be passed in when they were loaded
+        # concurrently (core.views_async).
+        self.columns = columns if columns is not None else get_task_columns(category)
+        position = self.columns.position
+        self.excluded = {position[task_id] for task_id in profile.completed_task_ids if task_id in position}
+        if affinity is None and len(self.columns):
+            affinity = category_affinity(profile.user_id)
+        self.scores = score_tasks(self.columns, affinity, now) if len(self.columns) else []
+
+    def __len__(self):
+        return len(self.columns) - len(self.excluded)
+
+    def count(self):
+        return len(self)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            ranked = top_k(self.scores, stop, self.excluded) if stop > start else []
+            return [self.columns.tasks[i] for i in ranked[start:stop:step]]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        return self[index:index + 1][0]
@@ -0,0 +1,142 @@
+"""
+Token-bucket rate limiting for OTP issue and verification.
+
+Each scope in settings.RATE_LIMITS allows a burst of `capacity` attempts and
+then one more every `interval` seconds. An attempt is charged to a bucket per
+identity (the user and the client IP), and is refused while any of them is
+empty.
+
+RATE_LIMIT_STORE picks where buckets live: 'memory' keeps them in this
+process, 'cache' keeps them in the RATE_LIMIT_CACHE_ALIAS cache so that
+every worker sees the same buckets.
+
+Behind reverse proxies, set RATE_LIMIT_TRUSTED_PROXIES so that the IP
+bucket is the client's rather than the proxy's.
+"""
+import math
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+
+MAX_MEMORY_BUCKETS = 100_000
+LOCK_TIMEOUT = 2
+LOCK_WAIT = 0.05
+
+
+def take_token(state, now, capacity, interval):
+    """
+    Refill the bucket for the time elapsed and take one token. Returns the
+    new state and how long to wait before retrying (0 when allowed).
+    """
+    tokens, updated_at = state if state else (capacity, now)
+    tokens = min(capacity, tokens + (now - updated_at) / interval)
+    if tokens >= 1:
+        return (tokens - 1, now), 0
+    return (tokens, now), (1 - tokens) * interval
+
+
+class MemoryBucketStore:
+    def __init__(self):
+        self.buckets = {}
+        self.lock = threading.Lock()
+
+    def consume(self, key, capacity, interval, now):
+        with self.lock:
+            state, wait = take_token(self.buckets.get(key), now, capacity, interval)
+            self.buckets[key] = state
+            if len(self.buckets) > MAX_MEMORY_BUCKETS:
+                self.prune(now)
+        return wait
+
+    def prune(self, now):
+        full_after = max(capacity * interval for capacity, interval in settings.RATE_LIMITS.values())
+        self.buckets = {
+            key: (tokens, updated_at) for key, (tokens, updated_at) in self.buckets.items()
+            if now - updated_at < full_after
+        }
+
+
+class CacheBucketStore:
+    def __init__(self, alias):
+        self.cache = caches[alias]
+
+    def consume(self, key, capacity, interval, now):
+        lock_key = f'{key}:lock'
+        deadline = time.monotonic() + LOCK_WAIT
+        while not self.cache.add(lock_key, 1, LOCK_TIMEOUT):
+            if time.monotonic() > deadline:
+                # Someone is hammering this bucket right now; refuse rather
+                # than risk letting the race hand out extra tokens.
+                return interval
+            time.sleep(0.005)
+        try:
+            state, wait = take_token(self.cache.get(key), now, capacity, interval)
+            self.cache.set(key, state, math.ceil(capacity * interval))
+        finally:
+            self.cache.delete(lock_key)
+        return wait
+
+
+_memory_store = MemoryBucketStore()
+
+
+def get_bucket_store():
+    if settings.RATE_LIMIT_STORE == 'memory':
+        return _memory_store
+    return CacheBucketStore(settings.RATE_LIMIT_CACHE_ALIAS)
+
+
+def client_ip(request):
+    """
+    The address of the client, as seen by the outermost of the
+    RATE_LIMIT_TRUSTED_PROXIES proxies. Entries further left in the header
+    come from the client and are ignored.
+    """
+    remote_addr = request.META.get('REMOTE_ADDR') or 'unknown'
+    hops = settings.RATE_LIMIT_TRUSTED_PROXIES
+    if not hops:
+        return remote_addr
+    forwarded = [
+        address.strip() for address in request.META.get(settings.RATE_LIMIT_CLIENT_IP_HEADER, '').split(',')
+        if address.strip()
+    ]
+    if len(forwarded) < hops:
+        # Did not come through every proxy, so the header is not theirs.
+        return remote_addr
+    return forwarded[-hops]
+
+
+def request_identities(request, user=None):
+    user = user or getattr(request, 'user', None)
+    identities = [f'ip:{client_ip(request)}']
+    if user is not None and user.is_authenticated:
+        identities.append(f'user:{user.pk}')
+    return identities
+
+
+def rate_limit_wait(scope, identities):
+    """
+    Charge one attempt in scope to every identity. Returns 0 when allowed,
+    otherwise the seconds until the next attempt would be.
+    """
+    capacity, interval = settings.RATE_LIMITS[scope]
+    store = get_bucket_store()
+    now = time.time()
+    return max(
+        store.consume(f'ratelimit:{scope}:{identity}', capacity, interval, now)
+        for identity in identities
+    )
+
+
+def throttle(request, scope, user=None):
+    return rate_limit_wait(scope, request_identities(request, user))
+
+
+def retry_message(wait):
+    minutes = math.ceil(wait / 60)
+    if minutes <= 1:
+        return 'Too many attempts. Please try again in a minute.'
+    return f'Too many attempts. Please try again in {minutes} minutes.'
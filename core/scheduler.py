@@ -0,0 +1,121 @@
+"""
+Closing of expired and full tasks.
+
+A task leaves the active catalog by having its status set to 'completed',
+so listings filter on status alone. Full tasks are closed by the completion
+that fills them (services.complete_task). Expiries are handled by the
+run_task_scheduler process: it keeps a min-heap of the expiry times of
+active tasks and wakes up when the earliest is due, closing all due tasks
+with one UPDATE per batch.
+
+The heap is rebuilt from the database on start, and tasks created or
+edited since are picked up by a periodic query on updated_at. An edit that
+moves an expiry just pushes a new heap entry; entries that no longer match
+a task's current expiry are skipped when they surface.
+"""
+import heapq
+from datetime import timedelta
+
+from django.db.models import F
+
+from .catalog import invalidate_catalog_on_commit
+from .models import Task
+
+
+CLOSE_BATCH_SIZE = 500
+# How far back each refresh looks past the previous one, so an edit that
+# commits while a refresh is running is not missed.
+REFRESH_OVERLAP = timedelta(seconds=5)
+
+
+def invalidate_all_categories():
+    invalidate_catalog_on_commit(*[category for category, label in Task.CATEGORY_CHOICES])
+
+
+def close_full_tasks():
+    """Close every active task at capacity, e.g. after max_completions was lowered."""
+    closed = Task.objects.filter(
+        status='active',
+        current_completions__gte=F('max_completions'),
+    ).update(status='completed')
+    if closed:
+        invalidate_all_categories()
+    return closed
+
+
+class ExpiryScheduler:
+    def __init__(self, batch_size=CLOSE_BATCH_SIZE):
+        self.batch_size = batch_size
+        self.heap = []
+        self.expiries = {}
+        self.refreshed_at = None
+
+    def __len__(self):
+        return len(self.expiries)
+
+    def load(self, now):
+        """Rebuild the heap from every active task that has an expiry."""
+        rows = (
+            Task.objects.filter(status='active', expires_at__isnull=False)
+            .values_list('id', 'expires_at')
+            .iterator(chunk_size=5000)
+        )
+        self.expiries = {task_id: expires_at.timestamp() for task_id, expires_at in rows}
+        self.heap = [(timestamp, task_id) for task_id, timestamp in self.expiries.items()]
+        heapq.heapify(self.heap)
+        self.refreshed_at = now
+
+    def schedule(self, task_id, expires_at):
+        if expires_at is None:
+            self.expiries.pop(task_id, None)
+            return
+        timestamp = expires_at.timestamp()
+        if self.expiries.get(task_id) != timestamp:
+            self.expiries[task_id] = timestamp
+            heapq.heappush(self.heap, (timestamp, task_id))
+
+    def refresh(self, now):
+        """Pick up tasks created or edited since the last refresh."""
+        changed = Task.objects.filter(
+            status='active',
+            updated_at__gte=self.refreshed_at - REFRESH_OVERLAP,
+        ).values_list('id', 'expires_at')
+        self.refreshed_at = now
+        count = 0
+        for task_id, expires_at in changed:
+            self.schedule(task_id, expires_at)
+            count += 1
+        return count
+
+    def pop_due(self, now):
+        due = []
+        now = now.timestamp()
+        while self.heap and self.heap[0][0] <= now:
+            timestamp, task_id = heapq.heappop(self.heap)
+            if self.expiries.get(task_id) == timestamp:
+                del self.expiries[task_id]
+                due.append(task_id)
+        return due
+
+    def close_due(self, now):
+        """
+        Close the tasks whose expiry has passed. The UPDATE re-checks the
+        expiry, so a task extended since it was scheduled stays open.
+        """
+        due = self.pop_due(now)
+        closed = 0
+        for start in range(0, len(due), self.batch_size):
+            closed += Task.objects.filter(
+                id__in=due[start:start + self.batch_size],
+                status='active',
+                expires_at__lte=now,
+            ).update(status='completed')
+        if closed:
+            invalidate_all_categories()
+        return closed
+
+    def next_due(self):
+        """Timestamp of the earliest scheduled expiry, or None."""
+        while self.heap and self.expiries.get(self.heap[0][1]) != self.heap[0][0]:
+            heapq.heappop(self.heap)
+        return self.heap[0][0] if self.heap else None
@@ -0,0 +1,400 @@
+"""
+Write paths shared by the user and influencer views.
+
+Counters are only ever changed with conditional UPDATEs and F() expressions
+inside a transaction, never read, modified and saved back. Money moves by
+posting journals to the ledger in the same transaction as the Transaction
+row that explains it.
+"""
+from collections import Counter
+
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .blobs import attach_proof_blob, release_proof_blobs
+from .catalog import invalidate_catalog_on_commit
+from .feed import forget_completion, record_completion
+from .ledger import (
+    PAID_WITHDRAWALS_ACCOUNT, PENDING_WITHDRAWALS_ACCOUNT, TASK_PAYOUTS_ACCOUNT,
+    InsufficientFunds, journal, post, post_many, user_account, user_balance,
+)
+from .models import Task, TaskCompletion, Transaction, UserProfile
+from .stats import bump_influencer_counters, bump_many, bump_task_stats, bump_task_stats_many
+
+
+PROOF_TASK_TYPES = ('like', 'subscribe', 'question')
+
+
+class TaskCompletionError(Exception):
+    pass
+
+
+class AlreadyCompleted(TaskCompletionError):
+    pass
+
+
+class TaskUnavailable(TaskCompletionError):
+    pass
+
+
+def task_needs_proof(task):
+    return task.task_type in PROOF_TASK_TYPES
+
+
+def is_pending_proof(completion):
+    return not completion.is_verified and bool(completion.proof_screenshot)
+
+
+def credit_earning(user_id, points, usd):
+    UserProfile.objects.filter(user_id=user_id).update(total_points=F('total_points') + points)
+    earning = Transaction.objects.create(
+        user_id=user_id,
+        transaction_type='earning',
+        amount_usd=usd,
+        points=points,
+        status='completed'
+    )
+    post('earning', [(user_account(user_id), usd), (TASK_PAYOUTS_ACCOUNT, -usd)], earning.id)
+
+
+def complete_task(user, task, proof_screenshot=None):
+    needs_proof = task_needs_proof(task)
+
+    with transaction.atomic():
+        claimed = Task.objects.filter(
+            Q(expires_at__isnull=True) | Q(expires_at__gt=timezone.now()),
+            id=task.id,
+            status='active',
+            current_completions__lt=F('max_completions'),
+        ).update(current_completions=F('current_completions') + 1)
+        if not claimed:
+            raise TaskUnavailable(task.id)
+        # The completion that fills the task closes it.
+        if Task.objects.filter(id=task.id, current_completions__gte=F('max_completions')).update(status='completed'):
+            invalidate_catalog_on_commit(task.category)
+
+        try:
+            with transaction.atomic():
+                completion = TaskCompletion.objects.create(
+                    user=user,
+                    task=task,
+                    points_earned=task.points,
+                    usd_earned=task.usd_value,
+                    is_verified=not needs_proof,
+                    proof_screenshot=proof_screenshot if needs_proof else None
+                )
+        except IntegrityError:
+            raise AlreadyCompleted(task.id)
+
+        if completion.proof_screenshot:
+            attach_proof_blob(completion)
+        if not needs_proof:
+            credit_earning(user.id, task.points, task.usd_value)
+
+        bump_influencer_counters(
+            task.created_by_id,
+            total_completions=1,
+            pending_proofs=1 if is_pending_proof(completion) else 0,
+        )
+        bump_task_stats(
+            task.id,
+            completion.completed_at,
+            completion_count=1,
+            verified_count=0 if needs_proof else 1,
+            pending_count=1 if is_pending_proof(completion) else 0,
+            usd_paid_out=0 if needs_proof else task.usd_value,
+        )
+
+        profile, created = UserProfile.objects.select_for_update().get_or_create(user=user)
+        record_completion(profile, task.id)
+
+    return completion
+
+
+def approve_completion(completion, reviewer):
+    verified_at = timezone.now()
+    with transaction.atomic():
+        approved = TaskCompletion.objects.filter(id=completion.id, is_verified=False).update(
+            is_verified=True,
+            verified_at=verified_at,
+            verified_by=reviewer,
+        )
+        if approved:
+            credit_earning(completion.user_id, completion.points_earned, completion.usd_earned)
+            had_proof = bool(completion.proof_screenshot)
+            if had_proof:
+                bump_influencer_counters(completion.task.created_by_id, pending_proofs=-1)
+            bump_task_stats(
+                completion.task_id,
+                verified_at,
+                verified_count=1,
+                pending_count=-1 if had_proof else 0,
+                usd_paid_out=completion.usd_earned,
+            )
+    return bool(approved)
+
+
+def release_task_slots(slots_by_task):
+    """
+    Give back the completion slots of rejected completions. slots_by_task
+    maps a task id to the number of slots freed. Tasks that were closed for
+    being full, and have not expired, are reopened once they have room.
+    """
+    full = dict(
+        Task.objects.filter(
+            Q(expires_at__isnull=True) | Q(expires_at__gt=timezone.now()),
+            id__in=list(slots_by_task),
+            status='completed',
+            current_completions__gte=F('max_completions'),
+        ).values_list('id', 'category')
+    )
+    bump_many(Task, 'id', {
+        task_id: {'current_completions': -slots} for task_id, slots in slots_by_task.items()
+    })
+    if full and Task.objects.filter(
+        id__in=list(full),
+        current_completions__lt=F('max_completions'),
+    ).update(status='active'):
+        invalidate_catalog_on_commit(*set(full.values()))
+
+
+def reject_completion(completion):
+    with transaction.atomic():
+        profile, created = UserProfile.objects.select_for_update().get_or_create(user_id=completion.user_id)
+        forget_completion(profile, completion.task_id)
+        bump_influencer_counters(
+            completion.task.created_by_id,
+            total_completions=-1,
+            pending_proofs=-1 if is_pending_proof(completion) else 0,
+        )
+        bump_task_stats(
+            completion.task_id,
+            completion.completed_at,
+            completion_count=-1,
+            pending_count=-1 if is_pending_proof(completion) else 0,
+        )
+        if completion.is_verified:
+            # Approval counted these in the hour it was verified.
+            bump_task_stats(
+                completion.task_id,
+                completion.verified_at or completion.completed_at,
+                verified_count=-1,
+                usd_paid_out=-completion.usd_earned,
+            )
+        release_task_slots({completion.task_id: 1})
+        release_proof_blobs([completion])
+        completion.delete()
+
+
+def _creator_share(task):
+    return {'total_task_value': task.usd_value, 'total_budget_spent': task.usd_value * task.max_completions}
+
+
+def update_task(task):
+    """
+    Save an edited task and move its creator's total_task_value and
+    total_budget_spent by the change in usd_value and usd_value *
+    max_completions, the amounts influencer_task_create_view added.
+    """
+    with transaction.atomic():
+        old = Task.objects.select_for_update().get(id=task.id)
+        task.save()
+        old_share, new_share = _creator_share(old), _creator_share(task)
+        if old.created_by_id == task.created_by_id:
+            bump_influencer_counters(task.created_by_id, **{
+                field: new_share[field] - old_share[field] for field in new_share
+            })
+            return
+
+        completions = TaskCompletion.objects.filter(task=task)
+        moved = {
+            'total_tasks_created': 1,
+            'total_completions': completions.count(),
+            'pending_proofs': completions.filter(is_verified=False, proof_screenshot__isnull=False).count(),
+        }
+        bump_influencer_counters(old.created_by_id, **{
+            field: -delta for field, delta in {**moved, **old_share}.items()
+        })
+        bump_influencer_counters(task.created_by_id, **moved, **new_share)
+
+
+def unspent_budget(task, completions):
+    """
+    What deleting the task gives back to its creator's total_budget_spent.
+    Creation charges usd_value * max_completions up front; the earnings of
+    verified completions have been paid to workers and stay spent, the rest
+    of the charge is released.
+    """
+    paid_out = sum(c.usd_earned for c in completions if c.is_verified)
+    return max(_creator_share(task)['total_budget_spent'] - paid_out, 0)
+
+
+def delete_task(task):
+    """
+    Delete a task and its completions, taking them off the creator's
+    counters, and release its unspent_budget.
+    """
+    with transaction.atomic():
+        task = Task.objects.select_for_update().get(id=task.id)
+        completions = list(TaskCompletion.objects.filter(task=task))
+        profiles = list(UserProfile.objects.select_for_update().filter(
+            user_id__in={c.user_id for c in completions}
+        ))
+        for profile in profiles:
+            profile.completed_task_ids = [i for i in profile.completed_task_ids if i != task.id]
+        UserProfile.objects.bulk_update(profiles, ['completed_task_ids'])
+
+        bump_influencer_counters(
+            task.created_by_id,
+            total_tasks_created=-1,
+            total_task_value=-task.usd_value,
+            total_budget_spent=-unspent_budget(task, completions),
+            total_completions=-len(completions),
+            pending_proofs=-sum(is_pending_proof(c) for c in completions),
+        )
+        release_proof_blobs(completions)
+        task.delete()
+
+
+def credit_earnings_bulk(completions):
+    points_by_user = {}
+    for completion in completions:
+        deltas = points_by_user.setdefault(completion.user_id, {'total_points': 0})
+        deltas['total_points'] += completion.points_earned
+    bump_many(UserProfile, 'user_id', points_by_user)
+
+    earnings = Transaction.objects.bulk_create([
+        Transaction(
+            user_id=completion.user_id,
+            transaction_type='earning',
+            amount_usd=completion.usd_earned,
+            points=completion.points_earned,
+            status='completed'
+        )
+        for completion in completions
+    ])
+    post_many([
+        journal('earning', [(user_account(e.user_id), e.amount_usd), (TASK_PAYOUTS_ACCOUNT, -e.amount_usd)], e.id)
+        for e in earnings
+    ])
+
+
+def _locked_pending_proofs(completion_ids, owner):
+    return list(
+        TaskCompletion.objects.select_for_update()
+        .filter(id__in=completion_ids, task__created_by=owner, is_verified=False)
+        .exclude(proof_screenshot__isnull=True)
+    )
+
+
+def bulk_approve_completions(completion_ids, reviewer):
+    """
+    Approve the reviewer's pending proofs among completion_ids with a fixed
+    number of queries, whatever the number of proofs. Returns the count.
+    """
+    verified_at = timezone.now()
+    with transaction.atomic():
+        completions = _locked_pending_proofs(completion_ids, reviewer)
+        if not completions:
+            return 0
+
+        TaskCompletion.objects.filter(id__in=[c.id for c in completions]).update(
+            is_verified=True,
+            verified_at=verified_at,
+            verified_by=reviewer,
+        )
+        credit_earnings_bulk(completions)
+        bump_influencer_counters(reviewer.id, pending_proofs=-len(completions))
+        bump_task_stats_many([
+            (c.task_id, verified_at, {'verified_count': 1, 'pending_count': -1, 'usd_paid_out': c.usd_earned})
+            for c in completions
+        ])
+    return len(completions)
+
+
+def bulk_reject_completions(completion_ids, reviewer):
+    """
+    Reject and delete the reviewer's pending proofs among completion_ids with
+    a fixed number of queries. Returns the count.
+    """
+    with transaction.atomic():
+        completions = _locked_pending_proofs(completion_ids, reviewer)
+        if not completions:
+            return 0
+
+        rejected_by_user = {}
+        for completion in completions:
+            rejected_by_user.setdefault(completion.user_id, set()).add(completion.task_id)
+        profiles = list(UserProfile.objects.select_for_update().filter(user_id__in=rejected_by_user))
+        for profile in profiles:
+            rejected = rejected_by_user[profile.user_id]
+            profile.completed_task_ids = [i for i in profile.completed_task_ids if i not in rejected]
+        UserProfile.objects.bulk_update(profiles, ['completed_task_ids'])
+
+        bump_influencer_counters(
+            reviewer.id,
+            total_completions=-len(completions),
+            pending_proofs=-len(completions),
+        )
+        bump_task_stats_many([
+            (c.task_id, c.completed_at, {'completion_count': -1, 'pending_count': -1})
+            for c in completions
+        ])
+        release_task_slots(Counter(c.task_id for c in completions))
+        release_proof_blobs(completions)
+        TaskCompletion.objects.filter(id__in=[c.id for c in completions]).delete()
+    return len(completions)
+
+
+def request_withdrawal(user, withdrawal):
+    """
+    Save an unsaved withdrawal Transaction and move its amount out of the
+    user's balance into pending withdrawals, or raise InsufficientFunds.
+    """
+    with transaction.atomic():
+        UserProfile.objects.select_for_update().get_or_create(user=user)
+        if withdrawal.amount_usd > user_balance(user.id).available:
+            raise InsufficientFunds(withdrawal.amount_usd)
+
+        withdrawal.user = user
+        withdrawal.transaction_type = 'withdrawal'
+        withdrawal.status = 'pending'
+        withdrawal.save()
+        post(
+            'withdrawal',
+            [(user_account(user.id), -withdrawal.amount_usd), (PENDING_WITHDRAWALS_ACCOUNT, withdrawal.amount_usd)],
+            withdrawal.id,
+        )
+    return withdrawal
+
+
+def settle_withdrawals(withdrawal_ids, status, processed_by, reference=None):
+    """
+    Approve or reject pending withdrawals. Approved amounts leave pending
+    withdrawals as paid out; rejected ones are refunded to the user.
+    Returns the number settled.
+    """
+    with transaction.atomic():
+        withdrawals = list(
+            Transaction.objects.select_for_update()
+            .filter(id__in=withdrawal_ids, transaction_type='withdrawal', status='pending')
+        )
+        if not withdrawals:
+            return 0
+
+        updates = {'status': status, 'processed_by': processed_by}
+        if reference:
+            updates['reference'] = reference
+        Transaction.objects.filter(id__in=[w.id for w in withdrawals]).update(**updates)
+        if status == 'rejected':
+            post_many([
+                journal('withdrawal_refund', [(PENDING_WITHDRAWALS_ACCOUNT, -w.amount_usd), (user_account(w.user_id), w.amount_usd)], w.id)
+                for w in withdrawals
+            ])
+        else:
+            post_many([
+                journal('withdrawal_payout', [(PENDING_WITHDRAWALS_ACCOUNT, -w.amount_usd), (PAID_WITHDRAWALS_ACCOUNT, w.amount_usd)], w.id)
+                for w in withdrawals
+            ])
+    return len(withdrawals)
@@ -0,0 +1,131 @@
+"""
+Payout batches for mobile money providers.
+
+Pending withdrawals are approved a batch at a time, grouped by provider,
+with the batch ID written to Transaction.reference. Each batch is exported
+as CSV or JSON for the provider's bulk payout upload. Both steps walk the
+withdrawals in id order, a chunk at a time, so memory use does not grow
+with the number of payouts.
+"""
+import csv
+import json
+from uuid import uuid4
+
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.utils import timezone
+
+from .models import PayoutBatch, Transaction
+from .services import settle_withdrawals
+
+
+PAYOUT_BATCH_SIZE = 1000
+EXPORT_CHUNK_SIZE = 2000
+
+EXPORT_FIELDS = ['batch_id', 'transaction_id', 'username', 'phone_number', 'provider', 'amount_usd', 'requested_at']
+
+
+def pending_withdrawals():
+    return Transaction.objects.filter(transaction_type='withdrawal', status='pending')
+
+
+def new_batch_id(provider):
+    return f"PB-{timezone.now():%Y%m%d}-{(provider or 'NA')[:10].upper()}-{uuid4().hex[:8].upper()}"
+
+
+def build_payout_batches(withdrawals=None, processed_by=None, batch_size=PAYOUT_BATCH_SIZE):
+    """
+    Approve the given pending withdrawals (all of them by default) into
+    per-provider batches of at most batch_size. Returns the new batches.
+    """
+    withdrawals = (withdrawals if withdrawals is not None else pending_withdrawals()).filter(
+        transaction_type='withdrawal', status='pending'
+    )
+    providers = withdrawals.order_by().values_list('mobile_money_provider', flat=True).distinct()
+
+    batches = []
+    for provider in list(providers):
+        by_provider = withdrawals.filter(mobile_money_provider=provider).order_by('id')
+        last_id = 0
+        while True:
+            ids = list(by_provider.filter(id__gt=last_id).values_list('id', flat=True)[:batch_size])
+            if not ids:
+                break
+            last_id = ids[-1]
+            with transaction.atomic():
+                batch = PayoutBatch.objects.create(
+                    batch_id=new_batch_id(provider),
+                    provider=provider or '',
+                    created_by=processed_by,
+                )
+                if not settle_withdrawals(ids, 'approved', processed_by, reference=batch.batch_id):
+                    batch.delete()
+                    continue
+                totals = Transaction.objects.filter(reference=batch.batch_id).aggregate(
+                    count=Count('id'), total=Sum('amount_usd')
+                )
+                batch.withdrawal_count = totals['count']
+                batch.total_usd = totals['total']
+                batch.save(update_fields=['withdrawal_count', 'total_usd'])
+            batches.append(batch)
+    return batches
+
+
+def complete_payout_batch(batch):
+    with transaction.atomic():
+        Transaction.objects.filter(reference=batch.batch_id, status='approved').update(status='completed')
+        batch.status = 'completed'
+        batch.completed_at = timezone.now()
+        batch.save(update_fields=['status', 'completed_at'])
+
+
+def payout_rows(batch):
+    rows = (
+        Transaction.objects.filter(reference=batch.batch_id)
+        .order_by('id')
+        .values_list('id', 'user__username', 'phone_number', 'mobile_money_provider', 'amount_usd', 'created_at')
+    )
+    for transaction_id, username, phone_number, provider, amount, created_at in rows.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        yield {
+            'batch_id': batch.batch_id,
+            'transaction_id': transaction_id,
+            'username': username,
+            'phone_number': phone_number or '',
+            'provider': provider or '',
+            'amount_usd': str(amount),
+            'requested_at': created_at.isoformat(),
+        }
+
+
+class Echo:
+    def write(self, value):
+        return value
+
+
+def export_csv(batch):
+    writer = csv.DictWriter(Echo(), fieldnames=EXPORT_FIELDS)
+    yield writer.writeheader()
+    for row in payout_rows(batch):
+        yield writer.writerow(row)
+
+
+def export_json(batch):
+    header = {
+        'batch_id': batch.batch_id,
+        'provider': batch.provider,
+        'withdrawal_count': batch.withdrawal_count,
+        'total_usd': str(batch.total_usd),
+        'created_at': batch.created_at.isoformat(),
+    }
+    yield json.dumps(header)[:-1] + ', "payouts": ['
+    separator = ''
+    for row in payout_rows(batch):
+        yield separator + json.dumps(row)
+        separator = ', '
+    yield ']}\n'
+
+
+EXPORT_FORMATS = {
+    'csv': (export_csv, 'text/csv'),
+    'json': (export_json, 'application/json'),
+}
@@ -0,0 +1,22 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .catalog import invalidate_catalog_on_commit
+from .models import Task
+
+
+@receiver(pre_save, sender=Task)
+def remember_task_category(sender, instance, raw=False, update_fields=None, **kwargs):
+    # A task moved to another category must also leave the old one's catalog.
+    instance._saved_category = None
+    if instance.pk and not raw and (update_fields is None or 'category' in update_fields):
+        instance._saved_category = (
+            Task.objects.filter(pk=instance.pk).values_list('category', flat=True).first()
+        )
+
+
+@receiver(post_save, sender=Task)
+@receiver(post_delete, sender=Task)
+def invalidate_task_catalog(sender, instance, **kwargs):
+    categories = {instance.category, getattr(instance, '_saved_category', None)} - {None}
+    invalidate_catalog_on_commit(*categories)
@@ -0,0 +1,181 @@
+"""
+Running counters behind the influencer dashboards and task detail pages.
+
+The write paths in core.services bump these counters with F() expressions,
+including the admin's task edits and deletes (update_task, delete_task,
+reject_completion); the rebuild functions recompute them from scratch with
+conditional aggregates. Deletes that bypass the services, such as a cascade
+from deleting a user, need rebuild_influencer_counters afterwards.
+"""
+from datetime import timedelta
+
+from django.db.models import Case, Count, F, Q, Sum, Value, When
+from django.db.models.functions import Coalesce, TruncHour
+from django.utils import timezone
+
+from .models import InfluencerProfile, Task, TaskCompletion, TaskStats, TaskStatsBucket
+
+
+def bump_many(model, key, deltas_by_key):
+    """
+    Apply different deltas to many rows in one UPDATE.
+    deltas_by_key maps a value of the key column to {field: delta}.
+    """
+    fields = {field for deltas in deltas_by_key.values() for field in deltas}
+    updates = {}
+    for field in fields:
+        whens = [
+            When(**{key: key_value}, then=Value(deltas[field]))
+            for key_value, deltas in deltas_by_key.items() if deltas.get(field)
+        ]
+        if whens:
+            output_field = model._meta.get_field(field)
+            updates[field] = F(field) + Case(*whens, default=Value(0), output_field=output_field)
+    if updates:
+        model.objects.filter(**{f'{key}__in': list(deltas_by_key)}).update(**updates)
+
+
+def bump_influencer_counters(creator_id, **deltas):
+    InfluencerProfile.objects.filter(user_id=creator_id).update(
+        **{field: F(field) + delta for field, delta in deltas.items()}
+    )
+
+
+def influencer_counters(user):
+    tasks = Task.objects.filter(created_by=user).aggregate(
+        total_tasks=Count('id'),
+        total_value=Sum('usd_value'),
+    )
+    completions = TaskCompletion.objects.filter(task__created_by=user).aggregate(
+        total=Count('id'),
+        pending=Count('id', filter=Q(is_verified=False, proof_screenshot__isnull=False)),
+    )
+    return {
+        'total_tasks_created': tasks['total_tasks'],
+        'total_task_value': tasks['total_value'] or 0,
+        'total_completions': completions['total'],
+        'pending_proofs': completions['pending'],
+    }
+
+
+def rebuild_influencer_counters(influencer_profile):
+    counters = influencer_counters(influencer_profile.user)
+    for field, value in counters.items():
+        setattr(influencer_profile, field, value)
+    influencer_profile.save(update_fields=list(counters))
+    return counters
+
+
+# TaskStats field -> TaskStatsBucket field (None: not tracked per hour)
+BUCKET_FIELDS = {
+    'completion_count': 'completions',
+    'verified_count': 'verified',
+    'pending_count': None,
+    'usd_paid_out': 'usd_paid_out',
+}
+
+
+def hour_bucket(moment):
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+
+def _bump_row(model, lookup, deltas):
+    updates = {field: F(field) + delta for field, delta in deltas.items() if delta}
+    if not updates:
+        return
+    if not model.objects.filter(**lookup).update(**updates):
+        model.objects.get_or_create(**lookup)
+        model.objects.filter(**lookup).update(**updates)
+
+
+def bump_task_stats(task_id, moment, **deltas):
+    """
+    Apply deltas to the task's rollup and to the hourly bucket of moment.
+    Rollup fields: completion_count, verified_count, pending_count, usd_paid_out.
+    """
+    _bump_row(TaskStats, {'task_id': task_id}, deltas)
+    _bump_row(TaskStatsBucket, {'task_id': task_id, 'hour': hour_bucket(moment)}, {
+        BUCKET_FIELDS[field]: delta for field, delta in deltas.items() if BUCKET_FIELDS[field]
+    })
+
+
+def bump_task_stats_many(entries):
+    """
+    Bulk version of bump_task_stats for (task_id, moment, deltas) entries,
+    using a constant number of queries whatever the number of entries.
+    """
+    by_task = {}
+    by_bucket = {}
+    for task_id, moment, deltas in entries:
+        task_deltas = by_task.setdefault(task_id, {})
+        bucket_deltas = by_bucket.setdefault((task_id, hour_bucket(moment)), {})
+        for field, delta in deltas.items():
+            task_deltas[field] = task_deltas.get(field, 0) + delta
+            bucket_field = BUCKET_FIELDS[field]
+            if bucket_field:
+                bucket_deltas[bucket_field] = bucket_deltas.get(bucket_field, 0) + delta
+    if not by_task:
+        return
+
+    TaskStats.objects.bulk_create(
+        [TaskStats(task_id=task_id) for task_id in by_task], ignore_conflicts=True
+    )
+    bump_many(TaskStats, 'task_id', by_task)
+
+    TaskStatsBucket.objects.bulk_create(
+        [TaskStatsBucket(task_id=task_id, hour=hour) for task_id, hour in by_bucket], ignore_conflicts=True
+    )
+    bucket_ids = {
+        (row.task_id, row.hour): row.id
+        for row in TaskStatsBucket.objects.filter(
+            task_id__in=by_task, hour__in={hour for _, hour in by_bucket}
+        )
+    }
+    bump_many(TaskStatsBucket, 'id', {
+        bucket_ids[bucket]: deltas for bucket, deltas in by_bucket.items()
+    })
+
+
+def get_task_stats(task):
+    try:
+        return TaskStats.objects.get(task=task)
+    except TaskStats.DoesNotExist:
+        rebuild_task_stats(task)
+        return TaskStats.objects.get(task=task)
+
+
+def recent_task_buckets(task, hours=24):
+    since = hour_bucket(timezone.now()) - timedelta(hours=hours - 1)
+    return TaskStatsBucket.objects.filter(task=task, hour__gte=since).order_by('hour')
+
+
+def rebuild_task_stats(task):
+    completions = TaskCompletion.objects.filter(task=task)
+    totals = completions.aggregate(
+        total=Count('id'),
+        verified=Count('id', filter=Q(is_verified=True)),
+        pending=Count('id', filter=Q(is_verified=False, proof_screenshot__isnull=False)),
+        paid=Sum('usd_earned', filter=Q(is_verified=True)),
+    )
+    TaskStats.objects.update_or_create(task=task, defaults={
+        'completion_count': totals['total'],
+        'verified_count': totals['verified'],
+        'pending_count': totals['pending'],
+        'usd_paid_out': totals['paid'] or 0,
+    })
+
+    buckets = {}
+    for row in completions.annotate(hour=TruncHour('completed_at')).values('hour').annotate(n=Count('id')):
+        buckets.setdefault(row['hour'], {'completions': 0, 'verified': 0, 'usd_paid_out': 0})['completions'] = row['n']
+    verified = completions.filter(is_verified=True).annotate(
+        hour=TruncHour(Coalesce('verified_at', 'completed_at'))
+    ).values('hour').annotate(n=Count('id'), paid=Sum('usd_earned'))
+    for row in verified:
+        bucket = buckets.setdefault(row['hour'], {'completions': 0, 'verified': 0, 'usd_paid_out': 0})
+        bucket['verified'] = row['n']
+        bucket['usd_paid_out'] = row['paid']
+
+    TaskStatsBucket.objects.filter(task=task).delete()
+    TaskStatsBucket.objects.bulk_create([
+        TaskStatsBucket(task=task, hour=hour, **values) for hour, values in buckets.items()
+    ])
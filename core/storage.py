@@ -0,0 +1,58 @@
+"""
+Content-addressed storage for proof screenshots.
+
+Every upload is stored under the SHA-256 of its bytes, e.g.
+proofs/3f/3f9a...c1.png, so the same screenshot submitted for several tasks
+is kept on disk once. The extension comes from the image format found in
+the bytes, not from the upload name, so each digest has exactly one file. The ProofBlob rows in core.blobs count how many
+completions point at each file.
+"""
+import hashlib
+import os
+import re
+
+from django.core.files.storage import FileSystemStorage
+
+
+DIGEST_RE = re.compile(r'^[0-9a-f]{64}')
+
+
+def file_digest(content):
+    digest = hashlib.sha256()
+    for chunk in content.chunks():
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+def digest_from_name(name):
+    """
+    The SHA-256 a content-addressed name was stored under, or None for
+    files saved before this storage was in place.
+    """
+    match = DIGEST_RE.match(os.path.basename(name or ''))
+    return match.group(0) if match else None
+
+
+def content_extension(content):
+    """The canonical extension of an image's format, or '' for anything else."""
+    from .uploadhandlers import FORMAT_EXTENSIONS, sniff_image_format
+
+    content.seek(0)
+    header = content.read(12)
+    content.seek(0)
+    return FORMAT_EXTENSIONS.get(sniff_image_format(header), '')
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    def _save(self, name, content):
+        digest = file_digest(content)
+        directory = os.path.dirname(name)
+        extension = content_extension(content)
+        name = os.path.join(directory, digest[:2], digest + extension)
+        if self.exists(name):
+            return name
+        return super()._save(name, content)
+
+
+def proof_storage():
+    return ContentAddressedStorage()
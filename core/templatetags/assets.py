@@ -0,0 +1,17 @@
+from django import template
+
+from core.assets import ICON_STYLESHEETS, asset_url
+
+
+register = template.Library()
+
+
+@register.inclusion_tag('core/frontend_assets.html')
+def frontend_assets(alpine=False, icons='classic'):
+    name, cdn_url = ICON_STYLESHEETS[icons]
+    return {
+        'css_url': asset_url('app.css'),
+        'alpine_url': asset_url('alpine.js'),
+        'icons_url': asset_url(name) or cdn_url,
+        'alpine': alpine,
+    }
@@ -0,0 +1,12 @@
+from django import template
+from django.utils.html import format_html
+
+from core.idempotency import FORM_FIELD, new_idempotency_key
+
+
+register = template.Library()
+
+
+@register.simple_tag
+def idempotency_key_field():
+    return format_html('<input type="hidden" name="{}" value="{}">', FORM_FIELD, new_idempotency_key())
@@ -1,3 +1,1865 @@
-from django.test import TestCase
+import os
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.mail.backends.base import BaseEmailBackend
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+
+from .models import (
+    EmailVerification, InfluencerProfile, OutboundEmail, ProofBlob, Task, TaskCompletion, Transaction, UserProfile
+)
+from .idempotency import get_idempotency_cache
+from .services import AlreadyCompleted, TaskUnavailable, complete_task, reject_completion
+
+
+def make_user(username):
+    user = User.objects.create_user(username=username, password='pass12345', email=f'{username}@example.com')
+    UserProfile.objects.create(user=user)
+    return user
+
+
+def make_task(creator, **kwargs):
+    defaults = {
+        'title': 'Watch this video',
+        'task_type': 'watch',
+        'video_url': 'https://www.youtube.com/watch?v=dQw4w9WgXcQ',
+        'points': 100,
+        'usd_value': Decimal('0.50'),
+        'max_completions': 100,
+        'created_by': creator,
+    }
+    defaults.update(kwargs)
+    return Task.objects.create(**defaults)
+
+
+def run_in_threads(targets):
+    errors = []
+
+    def runner(target):
+        try:
+            target()
+        except Exception as e:
+            errors.append(e)
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=runner, args=(t,)) for t in targets]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return errors
+
+
+class CompleteTaskServiceTests(TestCase):
+    def setUp(self):
+        self.creator = User.objects.create_user(username='creator', password='pass12345')
+        self.user = make_user('worker')
+
+    def test_credits_profile_and_records_transaction(self):
+        task = make_task(self.creator)
+        complete_task(self.user, task)
+
+        profile = UserProfile.objects.get(user=self.user)
+        self.assertEqual(profile.total_points, 100)
+        self.assertEqual(profile.available_balance_usd, Decimal('0.50'))
+        self.assertEqual(profile.completed_task_ids, [task.id])
+        self.assertEqual(Task.objects.get(id=task.id).current_completions, 1)
+        self.assertEqual(Transaction.objects.filter(user=self.user).count(), 1)
+
+    def test_second_completion_is_rejected_and_rolled_back(self):
+        task = make_task(self.creator)
+        complete_task(self.user, task)
+        with self.assertRaises(AlreadyCompleted):
+            complete_task(self.user, task)
+        self.assertEqual(Task.objects.get(id=task.id).current_completions, 1)
+
+    def test_full_task_is_unavailable(self):
+        task = make_task(self.creator, max_completions=0)
+        with self.assertRaises(TaskUnavailable):
+            complete_task(self.user, task)
+
+
+class ConcurrentCompletionTests(TransactionTestCase):
+    def setUp(self):
+        self.creator = User.objects.create_user(username='creator', password='pass12345')
+
+    def test_task_capacity_is_never_exceeded(self):
+        task = make_task(self.creator, max_completions=5)
+        users = [make_user(f'worker{i}') for i in range(20)]
+
+        def attempt(user):
+            def target():
+                try:
+                    complete_task(user, Task.objects.get(id=task.id))
+                except TaskUnavailable:
+                    pass
+            return target
+
+        errors = run_in_threads([attempt(user) for user in users])
+
+        self.assertEqual(errors, [])
+        task.refresh_from_db()
+        self.assertEqual(task.current_completions, 5)
+        self.assertEqual(TaskCompletion.objects.filter(task=task).count(), 5)
+
+    def test_parallel_credits_to_one_user_are_exact(self):
+        user = make_user('worker')
+        tasks = [make_task(self.creator, title=f'Task {i}') for i in range(15)]
+
+        def attempt(task):
+            return lambda: complete_task(User.objects.get(id=user.id), task)
+
+        errors = run_in_threads([attempt(task) for task in tasks])
+
+        self.assertEqual(errors, [])
+        profile = UserProfile.objects.get(user=user)
+        self.assertEqual(profile.total_points, 1500)
+        self.assertEqual(profile.total_earned_usd, Decimal('7.50'))
+        self.assertEqual(profile.available_balance_usd, Decimal('7.50'))
+        self.assertEqual(sorted(profile.completed_task_ids), sorted(t.id for t in tasks))
+
+
+class QueryPlanTests(TestCase):
+    """Every query the hot views run against core tables must be an index lookup."""
+
+    # Plan steps that scan by design.
+    ALLOWED_SCANS = {'SCAN CONSTANT ROW'}
+
+    def setUp(self):
+        self.influencer = User.objects.create_user(username='brand', password='pass12345')
+        InfluencerProfile.objects.create(
+            user=self.influencer, phone_number='0100', is_verified=True, status='approved'
+        )
+        self.user = make_user('worker')
+        for i in range(3):
+            task = make_task(self.influencer, title=f'Task {i}', task_type='like')
+            complete_task(self.user, task, proof_screenshot='proofs/shot.png')
+        make_task(self.influencer, title='Open task')
+        EmailVerification.objects.create(
+            user=self.user, otp_code='123456', expires_at=timezone.now() + timedelta(minutes=10)
+        )
+
+    def assertViewUsesIndexes(self, user, url, data=None):
+        self.client.force_login(user)
+        with CaptureQueriesContext(connection) as ctx:
+            if data is None:
+                self.client.get(url)
+            else:
+                self.client.post(url, data)
+
+        checked = 0
+        for query in ctx.captured_queries:
+            sql = query['sql']
+            if not sql.startswith('SELECT') or 'core_' not in sql:
+                continue
+            with connection.cursor() as cursor:
+                cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+                plan = [row[-1] for row in cursor.fetchall()]
+            for step in plan:
+                # A SCAN reads the whole table or index, even when it is
+                # "USING (COVERING) INDEX"; joined tables show up under
+                # their aliases (T4, ...), so every SCAN step counts.
+                if step.startswith('SCAN ') and step not in self.ALLOWED_SCANS:
+                    self.fail(f'Scan on {url}: {step}\n{sql}')
+            checked += 1
+        self.assertGreater(checked, 0)
+
+    def test_user_views(self):
+        task = Task.objects.first()
+        self.assertViewUsesIndexes(self.user, reverse('dashboard'))
+        self.assertViewUsesIndexes(self.user, reverse('task_list'))
+        self.assertViewUsesIndexes(self.user, reverse('task_list') + '?category=video')
+        self.assertViewUsesIndexes(self.user, reverse('task_detail', args=[task.id]))
+        self.assertViewUsesIndexes(self.user, reverse('transactions'))
+        self.assertViewUsesIndexes(self.user, reverse('withdrawal') + '?step=verify', {'otp_code': '123456'})
+
+    def test_influencer_views(self):
+        task = Task.objects.first()
+        self.assertViewUsesIndexes(self.influencer, reverse('influencer_dashboard'))
+        self.assertViewUsesIndexes(self.influencer, reverse('influencer_task_list'))
+        self.assertViewUsesIndexes(self.influencer, reverse('influencer_task_detail', args=[task.id]))
+        self.assertViewUsesIndexes(self.influencer, reverse('influencer_proofs'))
+        self.assertViewUsesIndexes(self.influencer, reverse('influencer_proofs') + '?status=verified')
+
+
+class QueryBudgetMixin:
+    """
+    Render a page before and after growing its data set. The query count has
+    to stay within the budget and must not change with the number of rows.
+    """
+
+    def assertQueryBudget(self, user, url, budget, grow):
+        self.client.force_login(user)
+        counts = []
+        for step in range(2):
+            if step:
+                grow()
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            counts.append(len(ctx.captured_queries))
+
+        self.assertEqual(counts[0], counts[1], f'{url} query count grows with rows: {counts}')
+        self.assertLessEqual(counts[1], budget, f'{url} ran {counts[1]} queries, budget is {budget}')
+
+
+class QueryBudgetTests(QueryBudgetMixin, TestCase):
+    def setUp(self):
+        self.influencer = User.objects.create_user(username='brand', password='pass12345')
+        InfluencerProfile.objects.create(
+            user=self.influencer, phone_number='0100', is_verified=True, status='approved'
+        )
+        self.user = make_user('worker')
+        self.task_count = 0
+        self.add_proofs(1)
+
+    def add_proofs(self, count):
+        for i in range(count):
+            self.task_count += 1
+            task = make_task(self.influencer, title=f'Task {self.task_count}', task_type='like')
+            worker = make_user(f'worker{self.task_count}')
+            complete_task(worker, task, proof_screenshot='proofs/shot.png')
+            complete_task(self.user, task, proof_screenshot='proofs/shot.png')
+            Transaction.objects.create(
+                user=self.user, transaction_type='earning', amount_usd=Decimal('0.50'), status='completed'
+            )
+
+    def test_dashboard(self):
+        self.assertQueryBudget(self.user, reverse('dashboard'), 8, lambda: self.add_proofs(6))
+
+    def test_transactions(self):
+        self.assertQueryBudget(self.user, reverse('transactions'), 8, lambda: self.add_proofs(6))
+
+    def test_influencer_dashboard(self):
+        self.assertQueryBudget(self.influencer, reverse('influencer_dashboard'), 12, lambda: self.add_proofs(6))
+
+    def test_influencer_proofs(self):
+        self.assertQueryBudget(self.influencer, reverse('influencer_proofs'), 8, lambda: self.add_proofs(6))
+
+    def test_influencer_verified_proofs(self):
+        def grow():
+            self.add_proofs(6)
+            TaskCompletion.objects.update(is_verified=True, verified_by=self.influencer)
+
+        TaskCompletion.objects.update(is_verified=True, verified_by=self.influencer)
+
+        self.assertQueryBudget(self.influencer, reverse('influencer_proofs') + '?status=verified', 8, grow)
+
+    def test_influencer_task_detail(self):
+        task = Task.objects.first()
+
+        def grow():
+            for i in range(6):
+                complete_task(make_user(f'extra{i}'), task, proof_screenshot='proofs/shot.png')
+
+        self.assertQueryBudget(self.influencer, reverse('influencer_task_detail', args=[task.id]), 10, grow)
+
+    def test_admin_user_profiles(self):
+        from .services import credit_earning
+
+        admin_user = User.objects.create_superuser(username='admin', password='pass12345', email='admin@example.com')
+
+        def grow():
+            self.add_proofs(6)
+            for profile in UserProfile.objects.all():
+                credit_earning(profile.user_id, 10, Decimal('0.50'))
+
+        self.assertQueryBudget(admin_user, reverse('admin:core_userprofile_changelist'), 10, grow)
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        self.user = make_user('worker')
+        same_time = timezone.now()
+        for i in range(45):
+            Transaction.objects.create(
+                user=self.user, transaction_type='earning', amount_usd=Decimal('0.50'), status='completed'
+            )
+        # Rows sharing a timestamp must be split on id without skipping or repeating.
+        Transaction.objects.filter(user=self.user).update(created_at=same_time)
+
+    def test_cursor_walks_whole_history_once(self):
+        from .pagination import keyset_page
+
+        seen = []
+        cursor = None
+        while True:
+            page = keyset_page(Transaction.objects.filter(user=self.user), 'created_at', cursor, per_page=20)
+            seen.extend(t.id for t in page)
+            if not page.has_next:
+                break
+            cursor = page.next_cursor
+
+        expected = list(Transaction.objects.filter(user=self.user).order_by('-id').values_list('id', flat=True))
+        self.assertEqual(seen, expected)
+
+    def test_feed_endpoint_returns_next_page(self):
+        self.client.force_login(self.user)
+        first = self.client.get(reverse('transactions'))
+        cursor = first.context['earnings'].next_cursor
+
+        response = self.client.get(reverse('transactions_feed'), {'kind': 'earnings', 'cursor': cursor})
+        data = response.json()
+        self.assertEqual(data['count'], 20)
+        self.assertIsNotNone(data['next_cursor'])
+        self.assertIn('+$0.50', data['html'])
+
+
+class InfluencerCounterTests(TestCase):
+    def setUp(self):
+        self.influencer = User.objects.create_user(username='brand', password='pass12345')
+        self.profile = InfluencerProfile.objects.create(
+            user=self.influencer, phone_number='0100', is_verified=True, status='approved'
+        )
+
+    def test_counters_follow_completion_approval_and_rejection(self):
+        from .services import approve_completion, reject_completion
+        from .stats import influencer_counters
+
+        proof_task = make_task(self.influencer, task_type='like')
+        watch_task = make_task(self.influencer)
+        first = complete_task(make_user('one'), proof_task, proof_screenshot='proofs/a.png')
+        second = complete_task(make_user('two'), proof_task, proof_screenshot='proofs/b.png')
+        complete_task(make_user('three'), watch_task)
+
+        approve_completion(first, self.influencer)
+        reject_completion(second)
+
+        self.profile.refresh_from_db()
+        self.assertEqual(self.profile.total_completions, 2)
+        self.assertEqual(self.profile.pending_proofs, 0)
+
+        counters = influencer_counters(self.influencer)
+        self.assertEqual(counters['total_completions'], self.profile.total_completions)
+        self.assertEqual(counters['pending_proofs'], self.profile.pending_proofs)
+
+    def test_rejection_gives_the_slot_back_and_reopens_full_tasks(self):
+        from .services import reject_completion
+
+        task = make_task(self.influencer, task_type='like', max_completions=2)
+        expired = make_task(self.influencer, task_type='like', max_completions=1)
+        first = complete_task(make_user('one'), task, proof_screenshot='proofs/a.png')
+        second = complete_task(make_user('two'), task, proof_screenshot='proofs/b.png')
+        late = complete_task(make_user('three'), expired, proof_screenshot='proofs/c.png')
+        task.refresh_from_db()
+        self.assertEqual((task.current_completions, task.status), (2, 'completed'))
+
+        reject_completion(second)
+        task.refresh_from_db()
+        self.assertEqual((task.current_completions, task.status), (1, 'active'))
+
+        reject_completion(first)
+        task.refresh_from_db()
+        self.assertEqual((task.current_completions, task.status), (0, 'active'))
+
+        Task.objects.filter(id=expired.id).update(expires_at=timezone.now() - timedelta(minutes=1))
+        reject_completion(late)
+        expired.refresh_from_db()
+        self.assertEqual((expired.current_completions, expired.status), (0, 'completed'))
+
+    def test_task_edits_and_deletes_move_the_counters(self):
+        from .services import approve_completion, delete_task, update_task
+        from .stats import influencer_counters
+
+        task = make_task(self.influencer, task_type='like', max_completions=10)
+        make_task(self.influencer, max_completions=4)
+        # What influencer_task_create_view adds for the two tasks.
+        InfluencerProfile.objects.filter(id=self.profile.id).update(
+            total_tasks_created=2, total_task_value=Decimal('1.00'), total_budget_spent=Decimal('7.00'),
+        )
+        paid = complete_task(make_user('one'), task, proof_screenshot='proofs/a.png')
+        complete_task(make_user('two'), task, proof_screenshot='proofs/b.png')
+        approve_completion(paid, self.influencer)
+
+        task.usd_value = Decimal('0.80')
+        task.max_completions = 5
+        update_task(task)
+        self.profile.refresh_from_db()
+        self.assertEqual(self.profile.total_task_value, Decimal('1.30'))
+        self.assertEqual(self.profile.total_budget_spent, Decimal('6.00'))
+
+        delete_task(task)
+        self.profile.refresh_from_db()
+        # The 0.50 already paid out stays spent.
+        self.assertEqual(self.profile.total_budget_spent, Decimal('2.50'))
+        counters = influencer_counters(self.influencer)
+        for field, value in counters.items():
+            self.assertEqual(getattr(self.profile, field), value, field)
+        self.assertEqual(UserProfile.objects.get(user=paid.user).completed_task_ids, [])
+
+    def test_admin_deletes_go_through_the_services(self):
+        from .stats import influencer_counters
+
+        admin_user = User.objects.create_superuser(username='admin', password='pass12345', email='admin@example.com')
+        self.client.force_login(admin_user)
+        task = make_task(self.influencer, task_type='like', max_completions=1)
+        other = make_task(self.influencer)
+        self.profile.total_tasks_created = 2
+        self.profile.total_task_value = Decimal('1.00')
+        self.profile.save()
+        pending = complete_task(make_user('one'), task, proof_screenshot='proofs/a.png')
+        complete_task(make_user('two'), other)
+
+        self.client.post(reverse('admin:core_taskcompletion_delete', args=[pending.id]), {'post': 'yes'})
+        task.refresh_from_db()
+        self.assertEqual((task.current_completions, task.status), (0, 'active'))
+        self.client.post(reverse('admin:core_task_changelist'), {
+            'action': 'delete_selected', '_selected_action': [other.id], 'post': 'yes',
+        })
+
+        self.profile.refresh_from_db()
+        self.assertFalse(Task.objects.filter(id=other.id).exists())
+        self.assertEqual(self.profile.total_tasks_created, 1)
+        for field, value in influencer_counters(self.influencer).items():
+            self.assertEqual(getattr(self.profile, field), value, field)
+
+
+class TaskStatsTests(TestCase):
+    def test_rollup_matches_rebuild(self):
+        from .models import TaskStats, TaskStatsBucket
+        from .services import approve_completion, reject_completion
+        from .stats import rebuild_task_stats
+
+        influencer = User.objects.create_user(username='brand', password='pass12345')
+        task = make_task(influencer, task_type='like')
+        completions = [
+            complete_task(make_user(f'worker{i}'), task, proof_screenshot='proofs/a.png') for i in range(4)
+        ]
+        approve_completion(completions[0], influencer)
+        approve_completion(completions[1], influencer)
+        reject_completion(completions[2])
+
+        stats = TaskStats.objects.get(task=task)
+        incremental = (stats.completion_count, stats.verified_count, stats.pending_count, stats.usd_paid_out)
+        self.assertEqual(incremental, (3, 2, 1, Decimal('1.00')))
+        bucket_total = sum(TaskStatsBucket.objects.filter(task=task).values_list('completions', flat=True))
+        self.assertEqual(bucket_total, 3)
+
+        rebuild_task_stats(task)
+        stats.refresh_from_db()
+        self.assertEqual(
+            (stats.completion_count, stats.verified_count, stats.pending_count, stats.usd_paid_out),
+            incremental
+        )
+
+
+    def test_rejecting_a_proof_approved_on_a_later_day_matches_rebuild(self):
+        from .models import TaskStats, TaskStatsBucket
+        from .services import approve_completion
+        from .stats import rebuild_task_stats
+
+        influencer = User.objects.create_user(username='brand', password='pass12345')
+        task = make_task(influencer, task_type='like')
+        kept = complete_task(make_user('one'), task, proof_screenshot='proofs/a.png')
+        rejected = complete_task(make_user('two'), task, proof_screenshot='proofs/b.png')
+        TaskCompletion.objects.filter(task=task).update(completed_at=timezone.now() - timedelta(days=2))
+        rebuild_task_stats(task)
+
+        for completion in (kept, rejected):
+            completion.refresh_from_db()
+            approve_completion(completion, influencer)
+        rejected.refresh_from_db()
+        reject_completion(rejected)
+
+        def snapshot():
+            stats = TaskStats.objects.get(task=task)
+            buckets = {
+                row[0]: row[1:] for row in TaskStatsBucket.objects.filter(task=task)
+                .values_list('hour', 'completions', 'verified', 'usd_paid_out')
+                if any(row[1:])
+            }
+            return (stats.completion_count, stats.verified_count, stats.pending_count, stats.usd_paid_out), buckets
+
+        incremental = snapshot()
+        self.assertTrue(all(min(values) >= 0 for values in incremental[1].values()))
+        rebuild_task_stats(task)
+        self.assertEqual(incremental, snapshot())
+
+
+class TaskCatalogCacheTests(TestCase):
+    def setUp(self):
+        self.creator = User.objects.create_user(username='creator', password='pass12345')
+        self.task = make_task(self.creator, category='video', max_completions=1)
+
+    def test_catalog_is_served_from_cache(self):
+        from .catalog import get_active_catalog
+
+        get_active_catalog('video')
+        with self.assertNumQueries(0):
+            self.assertEqual([t.id for t in get_active_catalog('video')], [self.task.id])
+
+    def test_saving_a_task_invalidates_its_category(self):
+        from .catalog import get_active_catalog
+
+        get_active_catalog('video')
+        other = make_task(self.creator, category='video', title='Second')
+        self.assertEqual({t.id for t in get_active_catalog('video')}, {self.task.id, other.id})
+
+        self.task.status = 'paused'
+        self.task.save()
+        self.assertEqual([t.id for t in get_active_catalog()], [other.id])
+
+    def test_moving_a_task_invalidates_its_old_category(self):
+        from .catalog import get_active_catalog
+        from .services import update_task
+
+        self.assertEqual([t.id for t in get_active_catalog('video')], [self.task.id])
+        self.assertEqual(get_active_catalog('game'), [])
+
+        self.task.category = 'game'
+        update_task(self.task)
+        self.assertEqual(get_active_catalog('video'), [])
+        self.assertEqual([t.id for t in get_active_catalog('game')], [self.task.id])
+
+    def test_full_task_leaves_the_catalog(self):
+        from .catalog import get_active_catalog
+
+        get_active_catalog('video')
+        complete_task(make_user('worker'), self.task)
+        self.assertEqual(get_active_catalog('video'), [])
+
+
+class FailingEmailBackend(BaseEmailBackend):
+    def send_messages(self, email_messages):
+        raise ConnectionError('SMTP relay unavailable')
+
+
+class UnreachableEmailBackend(BaseEmailBackend):
+    def open(self):
+        raise ConnectionRefusedError('SMTP relay refused the connection')
+
+    def send_messages(self, email_messages):
+        raise AssertionError('not connected')
+
+
+class SlowEmailBackend(BaseEmailBackend):
+    sent = []
+
+    def send_messages(self, email_messages):
+        for message in email_messages:
+            time.sleep(0.01)
+            SlowEmailBackend.sent.append(message.body)
+        return len(email_messages)
+
+
+class OutboundEmailTests(TestCase):
+    def setUp(self):
+        self.user = make_user('worker')
+
+    def test_signup_only_enqueues(self):
+        response = self.client.post(reverse('signup'), {
+            'username': 'brand',
+            'email': 'brand@example.com',
+            'password1': 'Sup3r-secret-pass',
+            'password2': 'Sup3r-secret-pass',
+            'user_type': 'influencer',
+        })
+        self.assertRedirects(response, reverse('influencer_verify_email'), fetch_redirect_response=False)
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(OutboundEmail.objects.filter(to_email='brand@example.com', status='queued').count(), 1)
+
+    def test_worker_sends_batch(self):
+        from .mailer import enqueue_otp_email, send_queued_emails
+
+        for code in ('111111', '222222', '333333'):
+            enqueue_otp_email(self.user, code)
+
+        self.assertEqual(send_queued_emails(batch_size=10), (3, 0))
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertIn('222222', mail.outbox[1].body)
+        self.assertFalse(OutboundEmail.objects.filter(status='queued').exists())
+
+    @override_settings(EMAIL_BACKEND='core.tests.FailingEmailBackend')
+    def test_failures_back_off_then_give_up(self):
+        from .mailer import enqueue_otp_email, send_queued_emails
+
+        email = enqueue_otp_email(self.user, '123456')
+        self.assertEqual(send_queued_emails(), (0, 1))
+        email.refresh_from_db()
+        self.assertEqual(email.status, 'queued')
+        self.assertGreater(email.next_attempt_at, timezone.now())
+
+        self.assertEqual(send_queued_emails(), (0, 0))
+
+        OutboundEmail.objects.update(next_attempt_at=timezone.now())
+        send_queued_emails(max_attempts=2)
+        email.refresh_from_db()
+        self.assertEqual(email.status, 'failed')
+        self.assertIn('SMTP relay unavailable', email.last_error)
+
+    @override_settings(EMAIL_BACKEND='core.tests.UnreachableEmailBackend')
+    def test_connect_failure_backs_off_the_whole_batch(self):
+        from .mailer import enqueue_otp_email, send_queued_emails
+
+        for code in ('111111', '222222'):
+            enqueue_otp_email(self.user, code)
+
+        self.assertEqual(send_queued_emails(), (0, 2))
+        for email in OutboundEmail.objects.all():
+            self.assertEqual((email.status, email.attempts, email.claimed_by), ('queued', 1, ''))
+            self.assertGreater(email.next_attempt_at, timezone.now())
+            self.assertIn('refused the connection', email.last_error)
+        self.assertEqual(send_queued_emails(), (0, 0))
+
+    def test_expired_claim_is_taken_over(self):
+        from .mailer import enqueue_otp_email, send_queued_emails
+
+        email = enqueue_otp_email(self.user, '123456')
+        OutboundEmail.objects.filter(id=email.id).update(
+            status='sending', claimed_by='dead-worker', claimed_until=timezone.now() + timedelta(minutes=5),
+        )
+        self.assertEqual(send_queued_emails(), (0, 0))
+
+        OutboundEmail.objects.filter(id=email.id).update(claimed_until=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(send_queued_emails(), (1, 0))
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.claimed_by), ('sent', ''))
+
+
+@override_settings(EMAIL_BACKEND='core.tests.SlowEmailBackend')
+class ConcurrentMailWorkerTests(TransactionTestCase):
+    def test_workers_never_send_the_same_email_twice(self):
+        from .mailer import enqueue_email, send_queued_emails
+
+        for i in range(30):
+            enqueue_email('to@example.com', 'Hello', f'message {i}')
+        SlowEmailBackend.sent = []
+
+        def worker():
+            while send_queued_emails(batch_size=5) != (0, 0):
+                pass
+
+        self.assertEqual(run_in_threads([worker] * 4), [])
+        self.assertEqual(sorted(SlowEmailBackend.sent), sorted(f'message {i}' for i in range(30)))
+        self.assertEqual(OutboundEmail.objects.filter(status='sent').count(), 30)
+
+
+class BulkReviewTests(TestCase):
+    def setUp(self):
+        self.influencer = User.objects.create_user(username='brand', password='pass12345')
+        self.profile = InfluencerProfile.objects.create(
+            user=self.influencer, phone_number='0100', is_verified=True, status='approved'
+        )
+        self.workers = [make_user(f'worker{i}') for i in range(3)]
+        self.task_count = 0
+
+    def make_proofs(self, tasks_per_worker):
+        proofs = []
+        for i in range(tasks_per_worker):
+            self.task_count += 1
+            task = make_task(
+                self.influencer, title=f'Task {self.task_count}', task_type='like', max_completions=len(self.workers)
+            )
+            for worker in self.workers:
+                proofs.append(complete_task(worker, task, proof_screenshot='proofs/a.png'))
+        return [p.id for p in proofs]
+
+    def review(self, action, proof_ids):
+        self.client.force_login(self.influencer)
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.post(reverse('influencer_bulk_review'), {'action': action, 'proof_ids': proof_ids})
+        return len(ctx.captured_queries)
+
+    def test_approve_credits_every_user_with_constant_queries(self):
+        small = self.review('approve', self.make_proofs(1))
+        large = self.review('approve', self.make_proofs(10))
+        self.assertEqual(small, large)
+
+        for worker in self.workers:
+            profile = UserProfile.objects.get(user=worker)
+            self.assertEqual(profile.total_points, 1100)
+            self.assertEqual(profile.available_balance_usd, Decimal('5.50'))
+        self.assertEqual(Transaction.objects.count(), 33)
+        self.assertFalse(TaskCompletion.objects.filter(is_verified=False).exists())
+        self.profile.refresh_from_db()
+        self.assertEqual(self.profile.pending_proofs, 0)
+
+    def test_reject_deletes_and_reopens_tasks_with_constant_queries(self):
+        small = self.review('reject', self.make_proofs(1))
+        large = self.review('reject', self.make_proofs(10))
+        self.assertEqual(small, large)
+
+        self.assertFalse(TaskCompletion.objects.exists())
+        for worker in self.workers:
+            self.assertEqual(UserProfile.objects.get(user=worker).completed_task_ids, [])
+        self.profile.refresh_from_db()
+        self.assertEqual((self.profile.total_completions, self.profile.pending_proofs), (0, 0))
+        # Every task was full, and closed, before its proofs were rejected.
+        self.assertEqual(
+            set(Task.objects.values_list('current_completions', 'status')),
+            {(0, 'active')},
+        )
+
+    def test_a_failing_batch_rolls_back_the_whole_review(self):
+        from django.db import IntegrityError
+
+        from . import views_influencer
+
+        self.addCleanup(setattr, views_influencer, 'BULK_REVIEW_BATCH_SIZE', views_influencer.BULK_REVIEW_BATCH_SIZE)
+        views_influencer.BULK_REVIEW_BATCH_SIZE = 1
+        proof_ids = self.make_proofs(2)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'CREATE TEMP TRIGGER fail_last_proof BEFORE UPDATE ON core_taskcompletion '
+                f'WHEN NEW.id = {max(proof_ids)} BEGIN SELECT RAISE(ABORT, \'review failed\'); END'
+            )
+        self.addCleanup(connection.cursor().execute, 'DROP TRIGGER IF EXISTS fail_last_proof')
+
+        with self.assertRaises(IntegrityError):
+            self.review('approve', sorted(proof_ids))
+        self.assertFalse(TaskCompletion.objects.filter(is_verified=True).exists())
+        self.assertFalse(Transaction.objects.exists())
+
+    def test_other_influencers_proofs_are_ignored(self):
+        other = User.objects.create_user(username='other', password='pass12345')
+        task = make_task(other, task_type='like')
+        proof = complete_task(self.workers[0], task, proof_screenshot='proofs/a.png')
+        self.review('approve', [proof.id])
+        proof.refresh_from_db()
+        self.assertFalse(proof.is_verified)
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(prefix='ken-media-'))
+class ProofImageTests(TestCase):
+    def test_worker_generates_small_variants(self):
+        from .images import PREVIEW_SIZE, THUMBNAIL_SIZE, proofs_missing_variants
+
+        influencer = User.objects.create_user(username='brand', password='pass12345')
+        task = make_task(influencer, task_type='like')
+        buffer = BytesIO()
+        Image.new('RGB', (1080, 2400), 'green').save(buffer, 'PNG')
+        upload = SimpleUploadedFile('shot.png', buffer.getvalue(), content_type='image/png')
+        completion = complete_task(make_user('worker'), task, proof_screenshot=upload)
+
+        call_command('process_proof_images', stdout=StringIO())
+
+        completion.refresh_from_db()
+        self.assertFalse(proofs_missing_variants().exists())
+        with Image.open(completion.proof_thumbnail.path) as thumbnail:
+            self.assertLessEqual(thumbnail.size[0], THUMBNAIL_SIZE[0])
+            self.assertLessEqual(thumbnail.size[1], THUMBNAIL_SIZE[1])
+        with Image.open(completion.proof_preview.path) as preview:
+            self.assertLessEqual(max(preview.size), max(PREVIEW_SIZE))
+
+    def test_shared_variants_are_deleted_with_the_last_proof(self):
+        influencer = User.objects.create_user(username='brand', password='pass12345')
+        buffer = BytesIO()
+        Image.new('RGB', (1080, 2400), 'green').save(buffer, 'PNG')
+        completions = [
+            complete_task(make_user(f'worker{i}'), make_task(influencer, task_type='like'),
+                          proof_screenshot=SimpleUploadedFile('shot.png', buffer.getvalue(), content_type='image/png'))
+            for i in range(2)
+        ]
+        call_command('process_proof_images', stdout=StringIO())
+        for completion in completions:
+            completion.refresh_from_db()
+        first, second = completions
+        self.assertEqual(first.proof_thumbnail.name, second.proof_thumbnail.name)
+        paths = [first.proof_screenshot.path, first.proof_thumbnail.path, first.proof_preview.path]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            reject_completion(first)
+        self.assertTrue(all(os.path.exists(path) for path in paths))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            reject_completion(second)
+        self.assertFalse(any(os.path.exists(path) for path in paths))
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(prefix='ken-media-'))
+class UploadHandlerTests(TestCase):
+    def setUp(self):
+        self.influencer = User.objects.create_user(username='brand', password='pass12345')
+        self.task = make_task(self.influencer, task_type='like')
+        self.user = make_user('worker')
+        self.client.force_login(self.user)
+
+    def jpeg_with_exif(self, size=(64, 64)):
+        exif = Image.Exif()
+        exif[0x010F] = 'PhoneMaker'
+        buffer = BytesIO()
+        Image.new('RGB', size, 'red').save(buffer, 'JPEG', exif=exif.tobytes())
+        return buffer.getvalue()
+
+    def submit(self, name, content):
+        upload = SimpleUploadedFile(name, content, content_type='image/jpeg')
+        return self.client.post(reverse('complete_task', args=[self.task.id]), {'proof_screenshot': upload})
+
+    def test_exif_is_stripped_while_streaming(self):
+        from .uploadhandlers import JpegExifStripper
+
+        data = self.jpeg_with_exif()
+        self.assertIn(b'PhoneMaker', data)
+        stripper = JpegExifStripper()
+        stripped = b''.join(stripper.feed(data[i:i + 7]) for i in range(0, len(data), 7)) + stripper.flush()
+        self.assertNotIn(b'PhoneMaker', stripped)
+        with Image.open(BytesIO(stripped)) as image:
+            image.load()
+            self.assertEqual(image.size, (64, 64))
+
+    def image_with_exif(self, image_format, orientation):
+        exif = Image.Exif()
+        exif[0x010F] = 'PhoneMaker'
+        exif[0x0112] = orientation
+        buffer = BytesIO()
+        Image.new('RGB', (40, 20), 'red').save(buffer, image_format, exif=exif.tobytes())
+        return buffer.getvalue()
+
+    def test_valid_proof_is_stored_without_exif(self):
+        self.submit('shot.jpeg', self.jpeg_with_exif())
+        completion = TaskCompletion.objects.get(user=self.user)
+        self.assertTrue(completion.proof_screenshot.name.endswith('.jpg'))
+        with completion.proof_screenshot.open('rb') as stored:
+            self.assertNotIn(b'PhoneMaker', stored.read())
+
+    def test_metadata_is_stripped_but_orientation_kept_for_each_format(self):
+        from PIL import ImageOps
+
+        for image_format, extension in (('JPEG', '.jpg'), ('PNG', '.png'), ('WEBP', '.webp')):
+            for orientation in (1, 6):
+                with self.subTest(image_format=image_format, orientation=orientation):
+                    TaskCompletion.objects.all().delete()
+                    data = self.image_with_exif(image_format, orientation)
+                    self.assertIn(b'PhoneMaker', data)
+
+                    self.submit(f'shot{extension}', data)
+                    completion = TaskCompletion.objects.get(user=self.user)
+                    self.assertTrue(completion.proof_screenshot.name.endswith(extension))
+                    with completion.proof_screenshot.open('rb') as stored:
+                        content = stored.read()
+                    self.assertNotIn(b'PhoneMaker', content)
+                    with Image.open(BytesIO(content)) as image:
+                        image.load()
+                        self.assertEqual(image.getexif().get(0x0112), orientation if orientation != 1 else None)
+                        self.assertEqual(ImageOps.exif_transpose(image).size, (20, 40) if orientation == 6 else (40, 20))
+
+    @override_settings(IMAGE_UPLOAD_MAX_BYTES=16 * 1024)
+    def test_oversized_upload_is_rejected(self):
+        noisy = Image.frombytes('RGB', (256, 256), os.urandom(256 * 256 * 3))
+        buffer = BytesIO()
+        noisy.save(buffer, 'PNG')
+        self.assertGreater(len(buffer.getvalue()), 16 * 1024)
+
+        self.submit('big.png', buffer.getvalue())
+        self.assertFalse(TaskCompletion.objects.exists())
+
+    def test_non_image_is_rejected(self):
+        self.submit('shot.jpg', b'#!/bin/sh\necho not an image\n' * 10)
+        self.assertFalse(TaskCompletion.objects.exists())
+
+    def test_truncated_upload_gets_an_error_message(self):
+        from django.contrib.messages import get_messages
+
+        response = self.submit('shot.jpg', b'\xff\xd8\xff\xe0')
+        self.assertFalse(TaskCompletion.objects.exists())
+        messages = [str(m) for m in get_messages(response.wsgi_request)]
+        self.assertEqual(messages, ['shot.jpg is not a valid image.'])
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(prefix='ken-media-'))
+class ProofBlobTests(TestCase):
+    def setUp(self):
+        self.influencer = User.objects.create_user(username='brand', password='pass12345')
+        self.tasks = [make_task(self.influencer, title=f'Task {i}', task_type='like') for i in range(3)]
+
+    def png(self, color):
+        buffer = BytesIO()
+        Image.new('RGB', (32, 32), color).save(buffer, 'PNG')
+        return SimpleUploadedFile('shot.png', buffer.getvalue(), content_type='image/png')
+
+    def test_identical_uploads_share_one_file_and_are_flagged(self):
+        first = complete_task(make_user('alice'), self.tasks[0], proof_screenshot=self.png('red'))
+        second = complete_task(make_user('bob'), self.tasks[1], proof_screenshot=self.png('red'))
+        other = complete_task(make_user('carol'), self.tasks[2], proof_screenshot=self.png('blue'))
+
+        first.refresh_from_db()
+        self.assertEqual(first.proof_screenshot.name, second.proof_screenshot.name)
+        self.assertIn(first.proof_sha256, first.proof_screenshot.name)
+        self.assertTrue(first.is_duplicate_proof and second.is_duplicate_proof)
+        self.assertFalse(other.is_duplicate_proof)
+        self.assertEqual(ProofBlob.objects.get(sha256=first.proof_sha256).ref_count, 2)
+        self.assertEqual(len(os.listdir(os.path.dirname(first.proof_screenshot.path))), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            reject_completion(first)
+        self.assertTrue(os.path.exists(second.proof_screenshot.path))
+        self.assertEqual(ProofBlob.objects.get(sha256=second.proof_sha256).ref_count, 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            reject_completion(second)
+        self.assertFalse(os.path.exists(second.proof_screenshot.path))
+        self.assertFalse(ProofBlob.objects.filter(sha256=second.proof_sha256).exists())
+
+    def test_one_file_per_digest_whatever_the_upload_name(self):
+        from .storage import proof_storage
+
+        storage = proof_storage()
+        data = self.png('red').read()
+        names = {
+            storage.save(f'proofs/{name}', SimpleUploadedFile(name, data))
+            for name in ('shot.png', 'shot.PNG', 'shot.jpeg', 'shot')
+        }
+        self.assertEqual(len(names), 1)
+        self.assertTrue(names.pop().endswith('.png'))
+        self.assertFalse(storage.save('proofs/notes.txt', SimpleUploadedFile('notes.txt', b'not an image')).endswith('.txt'))
+
+    def test_rebuild_adopts_legacy_proofs(self):
+        from django.core.files.storage import default_storage
+
+        legacy_name = default_storage.save('proofs/legacy.png', self.png('green'))
+        for i, username in enumerate(['dave', 'erin']):
+            complete_task(make_user(username), self.tasks[i], proof_screenshot=legacy_name)
+
+        call_command('rebuild_proof_blobs', stdout=StringIO())
+
+        completions = list(TaskCompletion.objects.all())
+        self.assertEqual({c.proof_sha256 for c in completions}, {ProofBlob.objects.get().sha256})
+        self.assertTrue(all(c.is_duplicate_proof for c in completions))
+        self.assertEqual(ProofBlob.objects.get().ref_count, 2)
+        self.assertFalse(default_storage.exists(legacy_name))
+        self.assertTrue(os.path.exists(completions[0].proof_screenshot.path))
+
+
+class HammingIndexTests(TestCase):
+    def test_search_matches_brute_force(self):
+        import random
+
+        from .phash import HASH_BITS, HammingIndex
+
+        rng = random.Random(7)
+        index = HammingIndex()
+        for key in range(3000):
+            index.add(key, rng.getrandbits(HASH_BITS))
+        for _ in range(200):
+            query = index.hashes[rng.randrange(3000)]
+            for bit in rng.sample(range(HASH_BITS), rng.randint(0, 7)):
+                query ^= 1 << bit
+            expected = sorted(
+                ((value ^ query).bit_count(), key) for key, value in index.hashes.items()
+                if (value ^ query).bit_count() <= 7
+            )[:5]
+            self.assertEqual(index.search(query, max_distance=7, limit=5), expected)
+
+        index.discard(0)
+        self.assertNotIn(0, [key for distance, key in index.search(index.hashes.get(1, 0), max_distance=64, limit=3000)])
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(prefix='ken-media-'))
+class NearDuplicateProofTests(TestCase):
+    def screenshot(self, seed, crop=0, image_format='PNG'):
+        from PIL import ImageDraw
+
+        import random
+        rng = random.Random(seed)
+        image = Image.new('RGB', (640, 360), 'white')
+        draw = ImageDraw.Draw(image)
+        for _ in range(12):
+            x, y = rng.randrange(600), rng.randrange(320)
+            draw.rectangle([x, y, x + rng.randrange(40, 200), y + rng.randrange(20, 120)], fill=rng.choice(['black', 'red', 'navy']))
+        image = image.crop((crop, crop, 640 - crop, 360 - crop))
+        buffer = BytesIO()
+        image.save(buffer, image_format, quality=60)
+        return SimpleUploadedFile(f'shot.{image_format.lower()}', buffer.getvalue())
+
+    def test_worker_links_cropped_recompressed_copies(self):
+        influencer = User.objects.create_user(username='brand', password='pass12345')
+        InfluencerProfile.objects.create(user=influencer, phone_number='0100', is_verified=True, status='approved')
+        tasks = [make_task(influencer, title=f'Task {i}', task_type='like') for i in range(3)]
+        original = complete_task(make_user('alice'), tasks[0], proof_screenshot=self.screenshot(1))
+        copy = complete_task(make_user('bob'), tasks[1], proof_screenshot=self.screenshot(1, crop=6, image_format='JPEG'))
+        unrelated = complete_task(make_user('carol'), tasks[2], proof_screenshot=self.screenshot(2))
+
+        call_command('process_proof_images', stdout=StringIO())
+
+        self.assertEqual([m.match_id for m in copy.near_matches.all()], [original.id])
+        self.assertFalse(unrelated.near_matches.exists())
+        self.assertFalse(TaskCompletion.objects.filter(proof_dhash__isnull=True).exists())
+
+        self.client.force_login(influencer)
+        response = self.client.get(reverse('influencer_proofs'))
+        self.assertContains(response, 'Looks like 1 earlier proof')
+        response = self.client.get(reverse('influencer_approve_proof', args=[copy.id]))
+        self.assertContains(response, 'Visually similar earlier proofs')
+
+
+class LedgerTests(TestCase):
+    def setUp(self):
+        self.user = make_user('worker')
+
+    def test_balance_reads_snapshot_plus_recent_entries(self):
+        from .ledger import TASK_PAYOUTS_ACCOUNT, journal, post_many, user_account, user_balance
+        from .models import LedgerSnapshot
+
+        account = user_account(self.user.id)
+        post_many([journal('earning', [(account, Decimal('0.50')), (TASK_PAYOUTS_ACCOUNT, Decimal('-0.50'))]) for _ in range(250)])
+        post_many([journal('earning', [(account, Decimal('0.25')), (TASK_PAYOUTS_ACCOUNT, Decimal('-0.25'))])])
+
+        self.assertEqual(LedgerSnapshot.objects.filter(account=account).count(), 1)
+        with self.assertNumQueries(2):
+            balance = user_balance(self.user.id)
+        self.assertEqual(balance.available, Decimal('125.25'))
+        self.assertEqual(balance.earned, Decimal('125.25'))
+        self.assertEqual(UserProfile.objects.get(user=self.user).available_balance_usd, Decimal('125.25'))
+
+    def test_posting_locks_the_accounts_before_inserting(self):
+        from .ledger import TASK_PAYOUTS_ACCOUNT, post, user_account
+        from .models import LedgerAccount
+
+        account = user_account(self.user.id)
+        with CaptureQueriesContext(connection) as ctx:
+            post('earning', [(account, Decimal('0.50')), (TASK_PAYOUTS_ACCOUNT, Decimal('-0.50'))])
+        sql = [q['sql'] for q in ctx.captured_queries]
+        lock = next(i for i, q in enumerate(sql) if q.startswith('SELECT') and 'core_ledgeraccount' in q)
+        insert = next(i for i, q in enumerate(sql) if q.startswith('INSERT INTO "core_ledgerentry"'))
+        self.assertLess(lock, insert)
+        if connection.features.has_select_for_update:
+            self.assertIn('FOR UPDATE', sql[lock])
+        self.assertEqual(
+            set(LedgerAccount.objects.values_list('name', flat=True)), {account, TASK_PAYOUTS_ACCOUNT}
+        )
+
+    def test_withdrawals_move_through_pending(self):
+        from .ledger import InsufficientFunds, PAID_WITHDRAWALS_ACCOUNT, balance_of, user_balance
+        from .services import credit_earning, request_withdrawal, settle_withdrawals
+
+        credit_earning(self.user.id, 100, Decimal('60.00'))
+        first = request_withdrawal(self.user, Transaction(amount_usd=Decimal('50.00'), phone_number='0100'))
+        with self.assertRaises(InsufficientFunds):
+            request_withdrawal(self.user, Transaction(amount_usd=Decimal('50.00'), phone_number='0100'))
+        self.assertEqual(user_balance(self.user.id), (Decimal('10.00'), Decimal('60.00')))
+
+        settle_withdrawals([first.id], 'rejected', None)
+        settle_withdrawals([first.id], 'rejected', None)
+        self.assertEqual(user_balance(self.user.id).available, Decimal('60.00'))
+
+        second = request_withdrawal(self.user, Transaction(amount_usd=Decimal('55.00'), phone_number='0100'))
+        settle_withdrawals([second.id], 'approved', None)
+        self.assertEqual(user_balance(self.user.id).available, Decimal('5.00'))
+        self.assertEqual(balance_of(PAID_WITHDRAWALS_ACCOUNT).available, Decimal('55.00'))
+
+    def test_reconcile_flags_a_tampered_snapshot(self):
+        from .ledger import TASK_PAYOUTS_ACCOUNT, journal, post_many, user_account
+        from .models import LedgerSnapshot
+
+        account = user_account(self.user.id)
+        post_many([journal('earning', [(account, Decimal('1.00')), (TASK_PAYOUTS_ACCOUNT, Decimal('-1.00'))]) for _ in range(120)])
+        call_command('reconcile_ledger', stdout=StringIO())
+
+        LedgerSnapshot.objects.filter(account=account).update(balance=Decimal('999.00'))
+        with self.assertRaises(CommandError):
+            call_command('reconcile_ledger', stdout=StringIO(), stderr=StringIO())
+
+
+class IdempotencyKeyTests(TestCase):
+    def setUp(self):
+        self.influencer = User.objects.create_user(username='brand', password='pass12345')
+        self.task = make_task(self.influencer)
+        self.user = make_user('worker')
+        self.client.force_login(self.user)
+        get_idempotency_cache().clear()
+
+    def post_twice(self, url, data):
+        first = self.client.post(url, data, follow=True)
+        with CaptureQueriesContext(connection) as ctx:
+            second = self.client.post(url, data)
+        return first, second, ' '.join(q['sql'] for q in ctx.captured_queries)
+
+    def test_repeated_completion_replays_first_response(self):
+        url = reverse('complete_task', args=[self.task.id])
+        first, second, sql = self.post_twice(url, {'idempotency_key': 'tap-1'})
+
+        self.assertContains(first, 'Task completed!')
+        self.assertEqual(second['Idempotent-Replay'], 'true')
+        self.assertRedirects(second, reverse('dashboard'), fetch_redirect_response=False)
+        for table in ('core_task', 'core_taskcompletion', 'core_ledgerentry', 'core_transaction'):
+            self.assertNotIn(f'"{table}"', sql)
+        self.assertEqual(TaskCompletion.objects.count(), 1)
+        self.assertContains(self.client.get(reverse('dashboard')), 'Task completed!')
+
+    def test_header_key_and_new_keys(self):
+        url = reverse('complete_task', args=[self.task.id])
+        self.client.post(url, HTTP_IDEMPOTENCY_KEY='retry-1')
+        replay = self.client.post(url, HTTP_IDEMPOTENCY_KEY='retry-1')
+        fresh = self.client.post(url, HTTP_IDEMPOTENCY_KEY='retry-2', follow=True)
+
+        self.assertEqual(replay['Idempotent-Replay'], 'true')
+        self.assertContains(fresh, 'already completed')
+
+    @override_settings(IDEMPOTENCY_WAIT_SECONDS=0)
+    def test_request_still_in_flight_is_refused(self):
+        from .idempotency import IN_FLIGHT
+
+        url = reverse('complete_task', args=[self.task.id])
+        get_idempotency_cache().add(f'idempotency:{self.user.pk}:{url}:slow', IN_FLIGHT, 60)
+        response = self.client.post(url, {'idempotency_key': 'slow'})
+        self.assertEqual(response.status_code, 409)
+        self.assertFalse(TaskCompletion.objects.exists())
+
+    def test_withdrawal_is_debited_once(self):
+        from .ledger import user_balance
+        from .services import credit_earning
+
+        profile = UserProfile.objects.get(user=self.user)
+        profile.withdrawal_pin = '1234'
+        profile.is_withdrawal_verified = True
+        profile.save()
+        credit_earning(self.user.id, 100, Decimal('80.00'))
+
+        data = {
+            'amount_usd': '50', 'phone_number': '0100', 'mobile_money_provider': 'MTN',
+            'pin': '1234', 'idempotency_key': 'withdraw-1',
+        }
+        for _ in range(3):
+            self.client.post(reverse('withdrawal') + '?step=withdraw', data)
+
+        self.assertEqual(Transaction.objects.filter(transaction_type='withdrawal').count(), 1)
+        self.assertEqual(user_balance(self.user.id).available, Decimal('30.00'))
+
+
+class PayoutBatchTests(TestCase):
+    def setUp(self):
+        from .services import credit_earning, request_withdrawal
+
+        self.admin = User.objects.create_superuser(username='admin', password='pass12345', email='admin@example.com')
+        for i in range(25):
+            user = make_user(f'payee{i}')
+            credit_earning(user.id, 100, Decimal('100.00'))
+            provider = 'MTN' if i < 15 else 'Wave'
+            request_withdrawal(user, Transaction(
+                amount_usd=Decimal('50.00') + i, phone_number=f'0100{i:04d}', mobile_money_provider=provider,
+            ))
+
+    def test_batches_group_by_provider_and_record_reference(self):
+        from .ledger import PAID_WITHDRAWALS_ACCOUNT, PENDING_WITHDRAWALS_ACCOUNT, balance_of
+        from .models import PayoutBatch
+        from .settlement import build_payout_batches
+
+        batches = build_payout_batches(processed_by=self.admin, batch_size=10)
+
+        self.assertEqual(
+            sorted((b.provider, b.withdrawal_count) for b in batches),
+            [('MTN', 5), ('MTN', 10), ('Wave', 10)],
+        )
+        withdrawals = Transaction.objects.filter(transaction_type='withdrawal')
+        self.assertFalse(withdrawals.exclude(status='approved').exists())
+        for batch in PayoutBatch.objects.all():
+            batched = withdrawals.filter(reference=batch.batch_id)
+            self.assertEqual(batched.count(), batch.withdrawal_count)
+            self.assertEqual(sum(w.amount_usd for w in batched), batch.total_usd)
+            self.assertEqual(set(batched.values_list('mobile_money_provider', flat=True)), {batch.provider})
+
+        total = sum(b.total_usd for b in batches)
+        self.assertEqual(balance_of(PENDING_WITHDRAWALS_ACCOUNT).available, 0)
+        self.assertEqual(balance_of(PAID_WITHDRAWALS_ACCOUNT).available, total)
+        self.assertEqual(build_payout_batches(batch_size=10), [])
+
+    def test_exports_stream_every_payout(self):
+        import csv
+        import json
+
+        call_command('build_payout_batches', '--provider', 'MTN', stdout=StringIO())
+        from .models import PayoutBatch
+        batch = PayoutBatch.objects.get()
+
+        self.client.force_login(self.admin)
+        url = reverse('admin:core_payoutbatch_changelist')
+        response = self.client.post(url, {'action': 'export_csv', '_selected_action': [batch.pk]})
+        self.assertTrue(response.streaming)
+        rows = list(csv.DictReader(StringIO(b''.join(response.streaming_content).decode())))
+        self.assertEqual(len(rows), 15)
+        self.assertEqual({r['batch_id'] for r in rows}, {batch.batch_id})
+
+        out = StringIO()
+        call_command('export_payout_batch', batch.batch_id, '--format', 'json', stdout=out)
+        document = json.loads(out.getvalue())
+        self.assertEqual(document['withdrawal_count'], 15)
+        self.assertEqual(sum(Decimal(p['amount_usd']) for p in document['payouts']), Decimal(document['total_usd']))
+        self.assertEqual(Transaction.objects.filter(status='pending').count(), 10)
+
+
+class TokenBucketTests(TestCase):
+    def test_burst_then_refill(self):
+        from .ratelimit import MemoryBucketStore
+
+        store = MemoryBucketStore()
+        waits = [store.consume('k', 3, 60, now=1000) for _ in range(4)]
+        self.assertEqual(waits[:3], [0, 0, 0])
+        self.assertEqual(waits[3], 60)
+        self.assertEqual(store.consume('k', 3, 60, now=1030), 30)
+        self.assertEqual(store.consume('k', 3, 60, now=1060), 0)
+
+    @override_settings(RATE_LIMITS={'otp_verify': (2, 60)})
+    def test_cache_store_is_shared_between_store_instances(self):
+        from .ratelimit import CacheBucketStore, rate_limit_wait
+
+        caches_before = CacheBucketStore('ratelimit')
+        caches_before.cache.clear()
+        self.assertEqual(rate_limit_wait('otp_verify', ['ip:10.0.0.1']), 0)
+        self.assertEqual(rate_limit_wait('otp_verify', ['ip:10.0.0.1']), 0)
+        self.assertGreater(rate_limit_wait('otp_verify', ['ip:10.0.0.1']), 0)
+        self.assertEqual(rate_limit_wait('otp_verify', ['ip:10.0.0.2']), 0)
+
+
+    def test_client_ip_reads_forwarded_for_through_trusted_proxies(self):
+        from django.test import RequestFactory
+
+        from .ratelimit import client_ip
+
+        factory = RequestFactory()
+        direct = factory.get('/', REMOTE_ADDR='10.0.0.9', HTTP_X_FORWARDED_FOR='6.6.6.6')
+        one_proxy = factory.get('/', REMOTE_ADDR='10.0.0.9', HTTP_X_FORWARDED_FOR='6.6.6.6, 203.0.113.7')
+        two_proxies = factory.get('/', REMOTE_ADDR='10.0.0.9', HTTP_X_FORWARDED_FOR='6.6.6.6,203.0.113.7, 10.0.0.5')
+
+        self.assertEqual(client_ip(direct), '10.0.0.9')
+        with override_settings(RATE_LIMIT_TRUSTED_PROXIES=1):
+            self.assertEqual(client_ip(one_proxy), '203.0.113.7')
+            self.assertEqual(client_ip(factory.get('/', REMOTE_ADDR='10.0.0.9')), '10.0.0.9')
+        with override_settings(RATE_LIMIT_TRUSTED_PROXIES=2):
+            self.assertEqual(client_ip(two_proxies), '203.0.113.7')
+            self.assertEqual(client_ip(direct), '10.0.0.9')
+
+    @override_settings(RATE_LIMIT_TRUSTED_PROXIES=1, RATE_LIMITS={'otp_verify': (1, 60)})
+    def test_clients_behind_one_proxy_get_their_own_bucket(self):
+        from django.core.cache import caches
+        from django.test import RequestFactory
+
+        from .ratelimit import throttle
+
+        caches['ratelimit'].clear()
+        factory = RequestFactory()
+
+        def request(client):
+            return factory.get('/', REMOTE_ADDR='10.0.0.9', HTTP_X_FORWARDED_FOR=client)
+
+        self.assertEqual(throttle(request('203.0.113.7'), 'otp_verify'), 0)
+        self.assertGreater(throttle(request('203.0.113.7'), 'otp_verify'), 0)
+        self.assertEqual(throttle(request('203.0.113.8'), 'otp_verify'), 0)
+        # Prepending a made-up address does not escape the bucket.
+        self.assertGreater(throttle(request('1.2.3.4, 203.0.113.7'), 'otp_verify'), 0)
+
+
+class OtpThrottleTests(TestCase):
+    def setUp(self):
+        from django.core.cache import caches
+
+        caches['ratelimit'].clear()
+        self.user = make_user('worker')
+        profile = UserProfile.objects.get(user=self.user)
+        profile.withdrawal_pin = '1234'
+        profile.save()
+        self.client.force_login(self.user)
+
+    def test_verify_attempts_are_throttled(self):
+        from .otp import issue_otp
+
+        code = issue_otp(self.user)
+        url = reverse('withdrawal') + '?step=verify'
+        for guess in range(5):
+            self.client.post(url, {'otp_code': f'{guess:06d}'})
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(url, {'otp_code': code}, follow=True)
+        self.assertContains(response, 'Too many attempts')
+        self.assertNotIn('core_emailverification', ' '.join(q['sql'] for q in ctx.captured_queries))
+        self.assertFalse(UserProfile.objects.get(user=self.user).is_withdrawal_verified)
+
+    def test_issue_retires_old_codes_and_verify_uses_the_live_index(self):
+        from .otp import issue_otp, verify_otp
+
+        first = issue_otp(self.user)
+        second = issue_otp(self.user)
+        self.assertEqual(EmailVerification.objects.filter(user=self.user, is_used=False).count(), 1)
+        if first != second:
+            self.assertFalse(verify_otp(self.user, first))
+
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertTrue(verify_otp(self.user, second))
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN QUERY PLAN {ctx.captured_queries[0]['sql']}")
+            plan = ' '.join(row[-1] for row in cursor.fetchall())
+        self.assertIn('emailverif_live_otp_idx', plan)
+        self.assertFalse(verify_otp(self.user, second))
+
+    def test_otp_issue_is_throttled(self):
+        url = reverse('withdrawal') + '?step=setup'
+        data = {'phone_number': '0100', 'mobile_money_provider': 'MTN', 'pin': '123456', 'confirm_pin': '123456'}
+        for _ in range(4):
+            self.client.post(url, data)
+        self.assertEqual(EmailVerification.objects.filter(user=self.user).count(), 3)
+        self.assertEqual(OutboundEmail.objects.count(), 3)
+
+
+class PurgeStaleDataTests(TestCase):
+    def setUp(self):
+        self.user = make_user('worker')
+        self.long_ago = timezone.now() - timedelta(days=400)
+
+    def make_otp(self, age, is_used=False, expires_in=timedelta(minutes=10)):
+        otp = EmailVerification.objects.create(
+            user=self.user, otp_code='123456', expires_at=timezone.now() - age + expires_in, is_used=is_used
+        )
+        EmailVerification.objects.filter(id=otp.id).update(created_at=timezone.now() - age)
+        return otp
+
+    def test_purge_deletes_only_dead_otps_past_retention(self):
+        from .purge import purge_otps
+
+        for _ in range(5):
+            self.make_otp(timedelta(days=3), is_used=True)
+            self.make_otp(timedelta(days=3))
+        recent_used = self.make_otp(timedelta(hours=1), is_used=True)
+        live = self.make_otp(timedelta(minutes=1))
+
+        stats = purge_otps(batch_size=3)
+        self.assertEqual(stats.rows, 10)
+        self.assertEqual(stats.batches, 4)
+        self.assertEqual(set(EmailVerification.objects.values_list('id', flat=True)), {recent_used.id, live.id})
+
+    def test_archive_moves_old_settled_transactions(self):
+        from .ledger import user_balance
+        from .models import LedgerEntry, TransactionArchive
+        from .services import credit_earning
+
+        for _ in range(3):
+            credit_earning(self.user.id, 10, Decimal('1.00'))
+        pending = Transaction.objects.create(
+            user=self.user, transaction_type='withdrawal', amount_usd=Decimal('1.00'), status='pending'
+        )
+        Transaction.objects.update(updated_at=self.long_ago, created_at=self.long_ago)
+        credit_earning(self.user.id, 10, Decimal('1.00'))
+        balance = user_balance(self.user.id)
+
+        out = StringIO()
+        call_command('purge_stale_data', '--batch-size', '2', '--pause', '0', stdout=out)
+        self.assertIn('Transactions archived: 3 row(s) in 2 batch(es)', out.getvalue())
+
+        archived = TransactionArchive.objects.filter(user=self.user)
+        self.assertEqual(archived.count(), 3)
+        self.assertEqual(archived.first().created_at, self.long_ago)
+        self.assertEqual(Transaction.objects.filter(user=self.user).count(), 2)
+        self.assertTrue(Transaction.objects.filter(id=pending.id).exists())
+        self.assertFalse(LedgerEntry.objects.filter(transaction__isnull=True, kind='earning').exists())
+        self.assertEqual(
+            set(LedgerEntry.objects.filter(transaction_id__in=archived.values('id')).values_list('transaction_id', flat=True)),
+            set(archived.values_list('id', flat=True)),
+        )
+        self.assertEqual(user_balance(self.user.id), balance)
+
+    def test_history_pages_include_archived_transactions(self):
+        from .models import TransactionArchive
+        from .pagination import merged_keyset_page
+        from .purge import archive_transactions
+        from .services import credit_earning
+
+        for _ in range(3):
+            credit_earning(self.user.id, 10, Decimal('1.00'))
+        Transaction.objects.update(updated_at=self.long_ago, created_at=self.long_ago)
+        for _ in range(2):
+            credit_earning(self.user.id, 10, Decimal('2.00'))
+        archive_transactions()
+        self.assertEqual(Transaction.objects.filter(user=self.user).count(), 2)
+
+        querysets = [Transaction.objects.filter(user=self.user), TransactionArchive.objects.filter(user=self.user)]
+        amounts, cursor = [], None
+        while True:
+            page = merged_keyset_page(querysets, 'created_at', cursor, per_page=2)
+            amounts += [row.amount_usd for row in page]
+            if not page.has_next:
+                break
+            cursor = page.next_cursor
+        self.assertEqual(amounts, [Decimal('2.00')] * 2 + [Decimal('1.00')] * 3)
+
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('transactions'))
+        self.assertContains(response, '+$1.00', count=3)
+        self.assertContains(response, '+$2.00', count=2)
+
+
+class ProfilingMiddlewareTests(TestCase):
+    def setUp(self):
+        self.user = make_user('worker')
+        self.client.force_login(self.user)
+        self.log_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.log_dir.cleanup)
+        self.log_path = os.path.join(self.log_dir.name, 'profiling.jsonl')
+
+    def test_disabled_by_default(self):
+        response = self.client.get(reverse('transactions'))
+        self.assertNotIn('Server-Timing', response)
+
+    def test_records_timings_and_summarizes(self):
+        import json
+
+        with override_settings(PROFILING_ENABLED=True, PROFILING_LOG_PATH=self.log_path):
+            for _ in range(3):
+                response = self.client.get(reverse('transactions'))
+            self.client.get(reverse('dashboard'))
+
+            self.assertRegex(response['Server-Timing'], r'^total;dur=[\d.]+, sql;dur=[\d.]+;desc="\d+ queries", tpl;dur=[\d.]+$')
+            with open(self.log_path) as log:
+                records = [json.loads(line) for line in log]
+            self.assertEqual(len(records), 4)
+            self.assertEqual(records[0]['url_name'], 'transactions')
+            self.assertGreater(records[0]['sql_count'], 0)
+            self.assertGreater(records[0]['template_ms'], 0)
+
+            out = StringIO()
+            call_command('profile_report', '--log', self.log_path, stdout=out)
+        self.assertRegex(out.getvalue(), r'transactions\s+3 ')
+        self.assertIn('4 request(s) across 2 URL name(s)', out.getvalue())
+
+    def test_repeated_queries_are_reported(self):
+        from .profiling import RequestProfile
+
+        profile = RequestProfile()
+        with connection.execute_wrapper(profile):
+            for user_id in (1, 2, 3):
+                list(UserProfile.objects.filter(user_id=user_id))
+        self.assertEqual(profile.sql_count, 3)
+        self.assertEqual(profile.duplicates()[0]['count'], 3)
+
+
+class FrontendAssetTests(TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.source = os.path.join(tmp.name, 'assets')
+        self.root = os.path.join(tmp.name, 'static', 'assets')
+        os.makedirs(os.path.join(self.source, 'vendor', 'fonts'))
+        with open(os.path.join(self.source, 'vendor', 'alpine.js'), 'w') as f:
+            f.write('window.Alpine = {};\n' * 50)
+        with open(os.path.join(self.source, 'vendor', 'fonts.css'), 'w') as f:
+            f.write("/* fonts */\n@font-face {\n  font-family: 'Sanchez';\n  src: url(fonts/0a1b2c-sanchez.woff2) format('woff2');\n}\n")
+        with open(os.path.join(self.source, 'vendor', 'fonts', '0a1b2c-sanchez.woff2'), 'wb') as f:
+            f.write(b'wOF2 font bytes')
+        settings_override = override_settings(ASSETS_SOURCE_DIR=self.source, ASSETS_ROOT=self.root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def build(self):
+        from .assets import build_assets
+
+        return build_assets(tailwind_css='.bg-primary{background-color:#32cd32}' * 20)
+
+    def test_pages_fall_back_to_cdn_until_built(self):
+        response = self.client.get(reverse('landing'))
+        self.assertContains(response, 'https://cdn.tailwindcss.com')
+
+        manifest = self.build()
+        response = self.client.get(reverse('landing'))
+        self.assertNotContains(response, 'cdn.tailwindcss.com')
+        self.assertContains(response, f'href="/assets/{manifest["app.css"]}"')
+
+    def test_each_page_keeps_its_boxicons_set(self):
+        basic = 'https://cdn.boxicons.com/fonts/basic/boxicons.min.css'
+        classic = 'https://cdn.boxicons.com/css/boxicons.min.css'
+        self.assertContains(self.client.get(reverse('landing')), basic)
+        self.assertContains(self.client.get(reverse('influencer_signup')), classic)
+
+        for name in ('boxicons.css', 'boxicons-basic.css'):
+            with open(os.path.join(self.source, 'vendor', name), 'w') as f:
+                f.write(f"/* {name} */\n@font-face {{ font-family: 'boxicons'; src: url(fonts/0a1b2c-sanchez.woff2); }}\n")
+        manifest = self.build()
+        with open(os.path.join(self.root, manifest['app.css'])) as f:
+            self.assertNotIn('boxicons', f.read())
+
+        response = self.client.get(reverse('landing'))
+        self.assertContains(response, f'href="/assets/{manifest["boxicons-basic.css"]}"')
+        self.assertNotContains(response, 'cdn.boxicons.com')
+        self.assertNotContains(response, manifest['boxicons.css'])
+        self.assertContains(self.client.get(reverse('influencer_signup')), f'href="/assets/{manifest["boxicons.css"]}"')
+        with open(os.path.join(self.root, manifest['boxicons-basic.css'])) as f:
+            self.assertIn(f"url({manifest['fonts/0a1b2c-sanchez.woff2']})", f.read())
+
+    def test_bundle_points_at_hashed_fonts(self):
+        manifest = self.build()
+        self.assertRegex(manifest['app.css'], r'^app\.[0-9a-f]{12}\.css$')
+        with open(os.path.join(self.root, manifest['app.css'])) as f:
+            css = f.read()
+        self.assertIn(f"url({manifest['fonts/0a1b2c-sanchez.woff2']})", css)
+        self.assertIn('.bg-primary{', css)
+        self.assertNotIn('/* fonts */', css)
+        self.assertTrue(os.path.exists(os.path.join(self.root, manifest['app.css'] + '.gz')))
+        self.assertFalse(os.path.exists(os.path.join(self.root, manifest['fonts/0a1b2c-sanchez.woff2'] + '.gz')))
+
+    def test_middleware_serves_precompressed_variant_with_long_cache(self):
+        import gzip
+
+        manifest = self.build()
+        url = f'/assets/{manifest["alpine.js"]}'
+        response = self.client.get(url, headers={'Accept-Encoding': 'gzip, deflate'})
+        body = b''.join(response.streaming_content)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Cache-Control'], 'public, max-age=31536000, immutable')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(gzip.decompress(body), b'window.Alpine = {};\n' * 50)
+
+        response = self.client.get(url, headers={'Accept-Encoding': 'gzip;q=0'})
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEqual(b''.join(response.streaming_content), b'window.Alpine = {};\n' * 50)
+
+        self.assertEqual(self.client.get('/assets/../assets/missing.js').status_code, 404)
+
+
+class VideoUrlTests(TestCase):
+    def test_parses_youtube_url_shapes(self):
+        from .video import parse_channel_url, parse_video_url
+
+        video = ('youtube', 'dQw4w9WgXcQ')
+        for url in [
+            'https://www.youtube.com/watch?v=dQw4w9WgXcQ',
+            'https://m.youtube.com/watch?feature=share&v=dQw4w9WgXcQ&t=42s',
+            'https://youtube.com/shorts/dQw4w9WgXcQ?si=abc',
+            'https://youtu.be/dQw4w9WgXcQ?t=1m5s',
+            'https://www.youtube.com/embed/dQw4w9WgXcQ?start=30',
+            'https://www.youtube-nocookie.com/embed/dQw4w9WgXcQ',
+            'https://www.youtube.com/live/dQw4w9WgXcQ',
+            'youtube.com/watch?v=dQw4w9WgXcQ#t=10',
+        ]:
+            self.assertEqual(parse_video_url(url), video, url)
+        for url in ['https://vimeo.com/123', 'https://www.youtube.com/@kenchannel', 'https://youtu.be/', '', None,
+                    'https://notyoutube.com/watch?v=dQw4w9WgXcQ', 'https://www.youtube.com/watch?v=short']:
+            self.assertEqual(parse_video_url(url), ('', ''), url)
+
+        self.assertEqual(parse_channel_url('https://www.youtube.com/@KenChannel/videos'), '@kenchannel')
+        self.assertEqual(parse_channel_url('https://m.youtube.com/channel/UCabcDEF123'), 'channel/UCabcDEF123')
+        self.assertEqual(parse_channel_url('https://youtube.com/c/KenTV'), 'c/kentv')
+        self.assertEqual(parse_channel_url('https://www.youtube.com/watch?v=dQw4w9WgXcQ'), '')
+
+    def test_save_stores_ids_and_finds_tasks_for_the_same_video(self):
+        creator = make_user('creator')
+        task = make_task(creator, video_url='https://youtu.be/dQw4w9WgXcQ', channel_url='https://youtube.com/@Ken')
+        self.assertEqual((task.platform, task.video_id, task.channel_key), ('youtube', 'dQw4w9WgXcQ', '@ken'))
+        self.assertEqual(task.get_embed_url(), 'https://www.youtube.com/embed/dQw4w9WgXcQ')
+
+        same = make_task(creator, video_url='https://m.youtube.com/watch?v=dQw4w9WgXcQ&t=5')
+        make_task(creator, video_url='https://www.youtube.com/watch?v=aaaaaaaaaaa')
+        subscribe = make_task(creator, task_type='subscribe', video_url='https://www.youtube.com/@ken')
+        self.assertEqual(list(task.same_video_tasks()), [same])
+        self.assertEqual(list(task.same_channel_tasks()), [subscribe])
+
+        same.video_url = 'https://youtu.be/aaaaaaaaaaa'
+        same.save(update_fields=['video_url'])
+        self.assertEqual(Task.objects.get(id=same.id).video_id, 'aaaaaaaaaaa')
+
+        with CaptureQueriesContext(connection) as ctx:
+            list(task.same_video_tasks())
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN QUERY PLAN {ctx.captured_queries[0]['sql']}")
+            plan = ' '.join(row[-1] for row in cursor.fetchall())
+        self.assertIn('task_video_idx', plan)
+
+    def test_migration_backfill_parser_matches_save(self):
+        from importlib import import_module
+
+        migration = import_module('core.migrations.0020_task_video_ids')
+        creator = make_user('creator')
+        task = make_task(creator, video_url='https://youtube.com/shorts/dQw4w9WgXcQ')
+        Task.objects.filter(id=task.id).update(platform='', video_id='', channel_key='')
+
+        from django.apps import apps
+        migration.backfill_video_ids(apps, None)
+        self.assertEqual(Task.objects.get(id=task.id).video_id, 'dQw4w9WgXcQ')
+
+
+class TaskSchedulerTests(TestCase):
+    def setUp(self):
+        self.creator = make_user('creator')
+        self.now = timezone.now()
+
+    def test_expired_tasks_close_in_bulk_and_extended_ones_stay_open(self):
+        from .scheduler import ExpiryScheduler
+
+        soon = [make_task(self.creator, expires_at=self.now + timedelta(minutes=i + 1)) for i in range(5)]
+        later = make_task(self.creator, expires_at=self.now + timedelta(days=1))
+        open_ended = make_task(self.creator)
+
+        scheduler = ExpiryScheduler(batch_size=2)
+        scheduler.load(self.now)
+        self.assertEqual(len(scheduler), 6)
+        self.assertEqual(scheduler.next_due(), soon[0].expires_at.timestamp())
+
+        soon[0].expires_at = self.now + timedelta(hours=2)
+        soon[0].save()
+        self.assertEqual(scheduler.refresh(self.now + timedelta(seconds=1)), 7)
+
+        with CaptureQueriesContext(connection) as ctx:
+            closed = scheduler.close_due(self.now + timedelta(minutes=10))
+        self.assertEqual(closed, 4)
+        self.assertEqual(sum(q['sql'].startswith('UPDATE') for q in ctx.captured_queries), 2)
+        self.assertEqual(
+            set(Task.objects.filter(status='active').values_list('id', flat=True)),
+            {soon[0].id, later.id, open_ended.id},
+        )
+        self.assertEqual(scheduler.next_due(), soon[0].expires_at.timestamp())
+
+    def test_scheduler_recovers_from_database(self):
+        for i in range(3):
+            make_task(self.creator, expires_at=self.now - timedelta(minutes=i))
+        make_task(self.creator, max_completions=1, current_completions=1)
+        alive = make_task(self.creator, expires_at=self.now + timedelta(days=1))
+
+        out = StringIO()
+        call_command('run_task_scheduler', '--once', stdout=out)
+        self.assertIn('closed 3 expired and 1 full task(s)', out.getvalue())
+        self.assertEqual(list(Task.objects.filter(status='active')), [alive])
+
+    def test_completion_that_fills_a_task_closes_it(self):
+        from .catalog import get_active_catalog
+
+        task = make_task(self.creator, max_completions=1)
+        self.assertIn(task, get_active_catalog())
+        complete_task(make_user('worker'), task)
+        task.refresh_from_db()
+        self.assertEqual(task.status, 'completed')
+        self.assertNotIn(task, get_active_catalog())
+
+    def test_expired_task_cannot_be_claimed_before_the_scheduler_runs(self):
+        task = make_task(self.creator, expires_at=self.now - timedelta(seconds=1))
+        with self.assertRaises(TaskUnavailable):
+            complete_task(make_user('worker'), task)
+
+
+class TaskFeedTests(TestCase):
+    def setUp(self):
+        self.creator = make_user('creator')
+        self.workers = [make_user(f'worker{i}') for i in range(3)]
+
+    def assertFeedMatchesFiltering(self, user):
+        from .ranking import RankedFeed
+
+        profile = UserProfile.objects.get(user=user)
+        feed = RankedFeed(profile)
+        expected = Task.objects.filter(status='active').exclude(completions__user=user)
+        self.assertEqual({task.id for task in feed[:len(feed)]}, set(expected.values_list('id', flat=True)))
+        self.assertEqual(
+            sorted(profile.completed_task_ids),
+            sorted(TaskCompletion.objects.filter(user=user).values_list('task_id', flat=True)),
+        )
+
+    def test_rebuild_command_restores_every_feed(self):
+        tasks = [make_task(self.creator, title=f'Task {i}', category=category)
+                 for i, category in enumerate(['video', 'game', 'opinion', 'video'])]
+        for worker, done in zip(self.workers, [tasks[:1], tasks[1:3], []]):
+            for task in done:
+                complete_task(worker, task)
+        UserProfile.objects.update(completed_task_ids=[tasks[3].id, 999999])
+
+        out = StringIO()
+        call_command('rebuild_task_feeds', '--user', 'worker0', stdout=out)
+        self.assertIn('1 user(s)', out.getvalue())
+        self.assertEqual(UserProfile.objects.get(user=self.workers[0]).completed_task_ids, [tasks[0].id])
+        self.assertEqual(UserProfile.objects.get(user=self.workers[1]).completed_task_ids, [tasks[3].id, 999999])
+
+        call_command('rebuild_task_feeds', stdout=StringIO())
+        for worker in self.workers:
+            self.assertFeedMatchesFiltering(worker)
+
+    def test_feed_follows_completion_expiry_and_deletion(self):
+        from .services import delete_task
+
+        worker = self.workers[0]
+        kept, expiring, deleted, untouched = [make_task(self.creator, title=f'Task {i}') for i in range(4)]
+        self.assertFeedMatchesFiltering(worker)
+
+        complete_task(worker, kept)
+        complete_task(worker, deleted)
+        self.assertFeedMatchesFiltering(worker)
+
+        Task.objects.filter(id=expiring.id).update(expires_at=timezone.now() - timedelta(minutes=1))
+        call_command('run_task_scheduler', '--once', stdout=StringIO())
+        self.assertFeedMatchesFiltering(worker)
+
+        delete_task(deleted)
+        delete_task(untouched)
+        self.assertNotIn(deleted.id, UserProfile.objects.get(user=worker).completed_task_ids)
+        for worker in self.workers:
+            self.assertFeedMatchesFiltering(worker)
+
+
+class TaskRankingTests(TestCase):
+    def setUp(self):
+        self.creator = make_user('creator')
+        self.user = make_user('worker')
+        self.profile = UserProfile.objects.get(user=self.user)
+
+    def test_feed_ranks_by_score_and_skips_completed_tasks(self):
+        from .ranking import RankedFeed
+
+        slow = make_task(self.creator, title='slow', duration_seconds=1200)
+        quick = make_task(self.creator, title='quick', duration_seconds=30)
+        rich = make_task(self.creator, title='rich', points=300, usd_value=Decimal('1.50'), duration_seconds=30)
+        done = make_task(self.creator, title='done', points=300, usd_value=Decimal('2.00'), duration_seconds=30)
+        complete_task(self.user, done)
+        self.profile.refresh_from_db()
+
+        feed = RankedFeed(self.profile)
+        self.assertEqual(len(feed), 3)
+        self.assertEqual(feed[:3], [rich, quick, slow])
+        self.assertEqual(feed[1], quick)
+        self.assertEqual(feed[1:], [quick, slow])
+
+    def test_category_affinity_and_urgency_lift_tasks(self):
+        from .ranking import RankedFeed
+
+        game = make_task(self.creator, title='game', category='game')
+        video = make_task(self.creator, title='video', category='video')
+        self.assertEqual(RankedFeed(self.profile)[:1], [video])
+
+        for i in range(3):
+            complete_task(self.user, make_task(self.creator, category='game', max_completions=1))
+        self.profile.refresh_from_db()
+        self.assertEqual(RankedFeed(self.profile)[:1], [game])
+
+        video.expires_at = timezone.now() + timedelta(minutes=30)
+        video.save()
+        self.assertEqual(RankedFeed(self.profile)[:1], [video])
+
+    def test_numpy_and_plain_python_rank_alike(self):
+        from . import ranking
+
+        if ranking.np is None:
+            self.skipTest('NumPy is not installed')
+        now = timezone.now()
+        for i in range(30):
+            # Every third task repeats an earlier one, so ties are broken too.
+            n = i - i % 3 if i % 3 == 2 else i
+            make_task(
+                self.creator, title=f'Task {i}', category=ranking.CATEGORIES[n % 3],
+                points=50 + 10 * (n % 7), usd_value=Decimal('0.10') * (1 + n % 5),
+                duration_seconds=30 * (1 + n % 4), max_completions=5 + n % 6,
+                expires_at=now + timedelta(hours=n) if n % 2 else None,
+            )
+        catalog = list(Task.objects.filter(status='active').order_by('-created_at'))
+        affinity = [0.5, 0.3, 0.2]
+        cases = [(len(catalog), set()), (7, {0, 3, 5}), (1, set()), (len(catalog), set(range(0, 30, 2)))]
+
+        def rank(numpy):
+            saved, ranking.np = ranking.np, numpy
+            try:
+                scores = ranking.score_tasks(ranking.TaskColumns(catalog), affinity, now)
+                return [float(score) for score in scores], [ranking.top_k(scores, k, excluded) for k, excluded in cases]
+            finally:
+                ranking.np = saved
+
+        numpy_scores, numpy_orders = rank(ranking.np)
+        plain_scores, plain_orders = rank(None)
+        for numpy_score, plain_score in zip(numpy_scores, plain_scores):
+            self.assertAlmostEqual(numpy_score, plain_score, places=9)
+        self.assertEqual(numpy_orders, plain_orders)
+        self.assertEqual(len(numpy_orders[0]), 30)
+        self.assertEqual(len(numpy_orders[1]), 7)
+
+    def test_task_list_paginates_the_ranked_feed(self):
+        for i in range(15):
+            make_task(self.creator, title=f'Task {i}', duration_seconds=60 * (i + 1))
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('task_list') + '?page=2')
+        self.assertEqual(response.context['page_obj'].paginator.count, 15)
+        self.assertEqual([task.title for task in response.context['page_obj']], ['Task 12', 'Task 13', 'Task 14'])
+
+
+class AsyncReadViewTests(TransactionTestCase):
+    # The async views read on their own connections, which would not see
+    # a TestCase's uncommitted rows.
+    def setUp(self):
+        self.creator = make_user('creator')
+        self.user = make_user('worker')
+
+    def request(self, path, user=None):
+        from django.contrib.messages.storage.fallback import FallbackStorage
+        from django.test import AsyncRequestFactory
+
+        user = user or self.user
+        request = AsyncRequestFactory().get(path)
+        request.user = user
+        request.session = {}
+        request._messages = FallbackStorage(request)
+
+        async def auser():
+            return user
+        request.auser = auser
+        return request
+
+    async def test_dashboard_and_task_detail(self):
+        from asgiref.sync import sync_to_async
+        from . import views_async
+
+        done, fresh = await sync_to_async(lambda: (
+            make_task(self.creator, title='Done already'), make_task(self.creator, title='Fresh task'),
+        ))()
+        await sync_to_async(complete_task)(self.user, done)
+
+        response = await views_async.dashboard_view(self.request('/dashboard/'))
+        self.assertEqual(response.status_code, 200)
+        content = response.content.decode()
+        self.assertIn('Fresh task', content)
+        self.assertIn('Done already', content)  # under recent completions
+        self.assertIn('0.50', content)
+
+        response = await views_async.task_detail_view(self.request(f'/tasks/{fresh.id}/'), task_id=fresh.id)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Fresh task', response.content.decode())
+
+        from django.http import Http404
+        with self.assertRaises(Http404):
+            await views_async.task_detail_view(self.request('/tasks/0/'), task_id=0)
+
+    async def test_task_list_and_transactions(self):
+        from asgiref.sync import sync_to_async
+        from . import views_async
+
+        tasks = await sync_to_async(lambda: [
+            make_task(self.creator, title=f'Task {i}', duration_seconds=60 * (i + 1)) for i in range(3)
+        ])()
+        await sync_to_async(complete_task)(self.user, tasks[0])
+
+        response = await views_async.task_list_view(self.request('/tasks/'))
+        content = response.content.decode()
+        self.assertIn('Task 1', content)
+        self.assertNotIn('Task 0', content)
+
+        response = await views_async.transactions_view(self.request('/transactions/'))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Task 0', response.content.decode())
+
+    async def test_influencer_dashboard(self):
+        from asgiref.sync import sync_to_async
+        from . import views_async
+
+        response = await views_async.influencer_dashboard_view(self.request('/influencer/dashboard/'))
+        self.assertEqual(response.status_code, 302)
+
+        await sync_to_async(lambda: (
+            InfluencerProfile.objects.create(user=self.creator, phone_number='1', status='approved', is_verified=True),
+            make_task(self.creator, title='Brand video'),
+        ))()
+        response = await views_async.influencer_dashboard_view(self.request('/influencer/dashboard/', self.creator))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Brand video', response.content.decode())
+
+    def test_gather_reads_overlaps_database_time(self):
+        from asgiref.sync import async_to_sync
+        from .views_async import gather_reads
+
+        def slow_read():
+            with connection.execute_wrapper(lambda execute, *args: (time.sleep(0.2), execute(*args))[1]):
+                return Task.objects.count()
+
+        started = time.perf_counter()
+        self.assertEqual(async_to_sync(gather_reads)(slow_read, slow_read, slow_read), [0, 0, 0])
+        self.assertLess(time.perf_counter() - started, 0.5)
@@ -0,0 +1,377 @@
+"""
+Streaming upload handler for proof screenshots and profile pictures.
+
+Uploads are written to a temporary file chunk by chunk, so a worker never
+holds a whole image in memory. Oversized bodies are refused before they are
+read, files that are not images are skipped from their first bytes, EXIF
+and XMP metadata of JPEG, PNG and WebP files is dropped while streaming
+(except the Orientation tag, so photos still display upright), and
+dimensions are checked from the image header without decoding the pixels.
+"""
+import os
+import struct
+import zlib
+
+from django.conf import settings
+from django.core.files.uploadhandler import SkipFile, StopUpload, TemporaryFileUploadHandler
+from PIL import Image
+
+
+IMAGE_SIGNATURES = (
+    (b'\xff\xd8\xff', 'JPEG'),
+    (b'\x89PNG\r\n\x1a\n', 'PNG'),
+    (b'GIF87a', 'GIF'),
+    (b'GIF89a', 'GIF'),
+    (b'RIFF', 'WEBP'),
+)
+
+FORMAT_EXTENSIONS = {
+    'JPEG': '.jpg',
+    'PNG': '.png',
+    'GIF': '.gif',
+    'WEBP': '.webp',
+}
+
+# Room for the other form fields and multipart boundaries of the request.
+REQUEST_OVERHEAD_BYTES = 64 * 1024
+
+
+def sniff_image_format(header):
+    for signature, image_format in IMAGE_SIGNATURES:
+        if header.startswith(signature):
+            if image_format == 'WEBP' and header[8:12] != b'WEBP':
+                return None
+            return image_format
+    return None
+
+
+ORIENTATION_TAG = 0x0112
+# Metadata flags in a WebP VP8X header.
+VP8X_EXIF = 0x08
+VP8X_XMP = 0x04
+
+
+def exif_orientation(exif):
+    """The Orientation value (1-8) of a TIFF/EXIF block, or None."""
+    if exif.startswith(b'Exif\x00\x00'):
+        exif = exif[6:]
+    order = {b'II': 'little', b'MM': 'big'}.get(exif[:2])
+    if order is None or len(exif) < 8:
+        return None
+    offset = int.from_bytes(exif[4:8], order)
+    if offset + 2 > len(exif):
+        return None
+    for i in range(int.from_bytes(exif[offset:offset + 2], order)):
+        entry = exif[offset + 2 + 12 * i:offset + 14 + 12 * i]
+        if len(entry) < 12:
+            break
+        if int.from_bytes(entry[:2], order) == ORIENTATION_TAG and int.from_bytes(entry[2:4], order) == 3:
+            value = int.from_bytes(entry[8:10], order)
+            return value if 1 <= value <= 8 else None
+    return None
+
+
+def orientation_exif(orientation):
+    """A TIFF block holding nothing but the Orientation tag."""
+    return (
+        b'MM\x00\x2a' + (8).to_bytes(4, 'big')
+        + (1).to_bytes(2, 'big')
+        + struct.pack('>HHIHH', ORIENTATION_TAG, 3, 1, orientation, 0)
+        + (0).to_bytes(4, 'big')
+    )
+
+
+def kept_orientation(exif):
+    """The Orientation worth keeping from exif, or None when it is upright."""
+    orientation = exif_orientation(exif)
+    return orientation if orientation and orientation != 1 else None
+
+
+class JpegExifStripper:
+    """
+    Drop APP1 (EXIF/XMP) segments from a JPEG byte stream, chunk by chunk,
+    keeping only the EXIF Orientation tag so rotated photos still display
+    upright. At most one header segment (64 KB) is buffered at a time;
+    everything from the start of scan marker on is passed through untouched.
+    """
+
+    def __init__(self):
+        self.buffer = b''
+        self.in_scan = False
+        self.seen_soi = False
+        self.wrote_orientation = False
+
+    def feed(self, data):
+        if self.in_scan:
+            return data
+
+        self.buffer += data
+        out = bytearray()
+        while True:
+            if not self.seen_soi:
+                if len(self.buffer) < 2:
+                    break
+                out += self.buffer[:2]
+                self.buffer = self.buffer[2:]
+                self.seen_soi = True
+                continue
+
+            if len(self.buffer) < 2:
+                break
+            if self.buffer[0] != 0xFF:
+                self._pass_through(out)
+                break
+
+            marker = self.buffer[1]
+            if marker == 0xFF:
+                self.buffer = self.buffer[1:]
+                continue
+            if marker == 0xDA:
+                self._pass_through(out)
+                break
+            if marker == 0x01 or 0xD0 <= marker <= 0xD8:
+                out += self.buffer[:2]
+                self.buffer = self.buffer[2:]
+                continue
+
+            if len(self.buffer) < 4:
+                break
+            length = int.from_bytes(self.buffer[2:4], 'big')
+            if len(self.buffer) < 2 + length:
+                break
+            segment = self.buffer[:2 + length]
+            self.buffer = self.buffer[2 + length:]
+            if marker == 0xE1:
+                out += self._orientation_segment(segment[4:])
+            else:
+                out += segment
+
+        return bytes(out)
+
+    def flush(self):
+        remaining, self.buffer = self.buffer, b''
+        return remaining
+
+    def finish(self, file):
+        pass
+
+    def _orientation_segment(self, payload):
+        orientation = kept_orientation(payload) if payload.startswith(b'Exif\x00\x00') else None
+        if orientation is None or self.wrote_orientation:
+            return b''
+        self.wrote_orientation = True
+        exif = b'Exif\x00\x00' + orientation_exif(orientation)
+        return b'\xff\xe1' + (2 + len(exif)).to_bytes(2, 'big') + exif
+
+    def _pass_through(self, out):
+        out += self.buffer
+        self.buffer = b''
+        self.in_scan = True
+
+
+class ChunkMetadataStripper:
+    """
+    Drop metadata chunks from a chunked image container (PNG, WebP) while
+    streaming. Image data chunks pass through without being buffered; only
+    an EXIF chunk is held in memory, to keep its Orientation tag.
+    """
+    lead = 0
+    header_size = 8
+    exif_chunk = b''
+    dropped = frozenset()
+
+    def __init__(self):
+        self.buffer = b''
+        self.lead_left = self.lead
+        self.passing = 0
+        self.skipping = 0
+        self.wrote_orientation = False
+
+    def feed(self, data):
+        self.buffer += data
+        out = bytearray()
+        while self.buffer:
+            if self.lead_left or self.passing:
+                count = min(self.lead_left or self.passing, len(self.buffer))
+                out += self.buffer[:count]
+                self.buffer = self.buffer[count:]
+                if self.lead_left:
+                    self.lead_left -= count
+                else:
+                    self.passing -= count
+                continue
+            if self.skipping:
+                count = min(self.skipping, len(self.buffer))
+                self.buffer = self.buffer[count:]
+                self.skipping -= count
+                continue
+
+            if len(self.buffer) < self.header_size:
+                break
+            kind, total = self.parse_header(self.buffer[:self.header_size])
+            if kind == self.exif_chunk:
+                if len(self.buffer) < total:
+                    break
+                chunk, self.buffer = self.buffer[:total], self.buffer[total:]
+                out += self._orientation_chunk(self.chunk_data(chunk))
+            elif kind in self.dropped:
+                self.skipping = total
+            else:
+                self.passing = total
+
+        return bytes(out)
+
+    def flush(self):
+        remaining, self.buffer = self.buffer, b''
+        return remaining
+
+    def finish(self, file):
+        pass
+
+    def _orientation_chunk(self, exif):
+        orientation = kept_orientation(exif)
+        if orientation is None or self.wrote_orientation:
+            return b''
+        self.wrote_orientation = True
+        return self.build_chunk(self.exif_chunk, orientation_exif(orientation))
+
+
+class PngMetadataStripper(ChunkMetadataStripper):
+    """Drops eXIf and the text chunks (which carry XMP) of a PNG."""
+    lead = 8
+    exif_chunk = b'eXIf'
+    dropped = frozenset({b'tEXt', b'zTXt', b'iTXt'})
+
+    def parse_header(self, header):
+        length = int.from_bytes(header[:4], 'big')
+        return header[4:8], 12 + length
+
+    def chunk_data(self, chunk):
+        return chunk[8:-4]
+
+    def build_chunk(self, kind, data):
+        return len(data).to_bytes(4, 'big') + kind + data + zlib.crc32(kind + data).to_bytes(4, 'big')
+
+
+class WebpMetadataStripper(ChunkMetadataStripper):
+    """
+    Drops the EXIF and XMP chunks of a WebP. The RIFF size and the VP8X
+    metadata flags are corrected once the whole file is written.
+    """
+    lead = 12
+    exif_chunk = b'EXIF'
+    dropped = frozenset({b'XMP '})
+
+    def parse_header(self, header):
+        size = int.from_bytes(header[4:8], 'little')
+        return header[:4], 8 + size + (size & 1)
+
+    def chunk_data(self, chunk):
+        size = int.from_bytes(chunk[4:8], 'little')
+        return chunk[8:8 + size]
+
+    def build_chunk(self, kind, data):
+        return kind + len(data).to_bytes(4, 'little') + data + b'\x00' * (len(data) & 1)
+
+    def finish(self, file):
+        end = file.tell()
+        file.seek(4)
+        file.write((end - 8).to_bytes(4, 'little'))
+        file.seek(12)
+        if file.read(4) == b'VP8X':
+            file.seek(20)
+            flags = file.read(1)[0] & ~(VP8X_EXIF | VP8X_XMP)
+            if self.wrote_orientation:
+                flags |= VP8X_EXIF
+            file.seek(20)
+            file.write(bytes([flags]))
+        file.seek(end)
+
+METADATA_STRIPPERS = {
+    'JPEG': JpegExifStripper,
+    'PNG': PngMetadataStripper,
+    'WEBP': WebpMetadataStripper,
+}
+
+
+class SizeCappedImageUploadHandler(TemporaryFileUploadHandler):
+    """
+    Rejected uploads are reported on request.upload_errors.
+    """
+
+    def new_file(self, field_name, file_name, content_type, content_length, charset=None, content_type_extra=None):
+        self.max_bytes = settings.IMAGE_UPLOAD_MAX_BYTES
+        if self.request is not None and not hasattr(self.request, 'upload_errors'):
+            self.request.upload_errors = []
+
+        if self.content_length and self.content_length > self.max_bytes + REQUEST_OVERHEAD_BYTES:
+            self._reject(f'{file_name} is larger than {self.max_bytes // (1024 * 1024)} MB.')
+            raise StopUpload(connection_reset=True)
+
+        super().new_file(field_name, file_name, content_type, content_length, charset, content_type_extra)
+        self.received = 0
+        self.header = b''
+        self.image_format = None
+        self.stripper = None
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > self.max_bytes:
+            self._reject(f'{self.file_name} is larger than {self.max_bytes // (1024 * 1024)} MB.')
+            self.upload_interrupted()
+            raise StopUpload(connection_reset=True)
+
+        if self.image_format is None:
+            self.header += raw_data
+            if len(self.header) < 12:
+                return None
+            self.image_format = sniff_image_format(self.header)
+            if self.image_format is None:
+                self._reject(f'{self.file_name} is not a supported image.')
+                self.upload_interrupted()
+                raise SkipFile()
+            if self.image_format in METADATA_STRIPPERS:
+                self.stripper = METADATA_STRIPPERS[self.image_format]()
+            raw_data, self.header = self.header, b''
+
+        if self.stripper:
+            raw_data = self.stripper.feed(raw_data)
+        self.file.write(raw_data)
+        return None
+
+    def file_complete(self, file_size):
+        if self.image_format is None:
+            # Ended before a full signature arrived; too short to be an image.
+            self._reject(f'{self.file_name} is not a valid image.')
+            self.upload_interrupted()
+            return None
+        if self.stripper:
+            self.file.write(self.stripper.flush())
+            self.stripper.finish(self.file)
+
+        self.file.size = self.file.tell()
+        self.file.seek(0)
+        try:
+            with Image.open(self.file.temporary_file_path()) as image:
+                width, height = image.size
+                image_format = image.format
+        except (OSError, Image.DecompressionBombError):
+            image_format = None
+
+        if image_format not in FORMAT_EXTENSIONS:
+            self._reject(f'{self.file_name} is not a valid image.')
+            self.upload_interrupted()
+            return None
+        if width * height > settings.IMAGE_UPLOAD_MAX_PIXELS:
+            self._reject(f'{self.file_name} has too many pixels ({width}x{height}).')
+            self.upload_interrupted()
+            return None
+
+        stem = os.path.splitext(self.file_name)[0]
+        self.file.name = stem + FORMAT_EXTENSIONS[image_format]
+        self.file.content_type = Image.MIME[image_format]
+        return self.file
+
+    def _reject(self, reason):
+        if self.request is not None:
+            self.request.upload_errors.append(reason)
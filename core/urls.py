@@ -1,20 +1,24 @@
+from django.conf import settings
 from django.urls import path, include
-from . import views
+from . import views, views_async
 from .views_upgrade import upgrade_to_influencer_view
 
+read_views = views_async if settings.ASYNC_READ_VIEWS else views
+
 urlpatterns = [
     path('', views.landing_view, name='landing'),
-    path('dashboard/', views.dashboard_view, name='dashboard'),
+    path('dashboard/', read_views.dashboard_view, name='dashboard'),
     path('signup/', views.signup_view, name='signup'),
     path('login/', views.login_view, name='login'),
     path('logout/', views.logout_view, name='logout'),
     path('profile/', views.profile_view, name='profile'),
     path('profile/edit/', views.profile_edit_view, name='profile_edit'),
-    path('tasks/', views.task_list_view, name='task_list'),
-    path('tasks/<int:task_id>/', views.task_detail_view, name='task_detail'),
+    path('tasks/', read_views.task_list_view, name='task_list'),
+    path('tasks/<int:task_id>/', read_views.task_detail_view, name='task_detail'),
     path('tasks/<int:task_id>/complete/', views.complete_task_view, name='complete_task'),
     path('withdrawal/', views.withdrawal_view, name='withdrawal'),
-    path('transactions/', views.transactions_view, name='transactions'),
+    path('transactions/', read_views.transactions_view, name='transactions'),
+    path('transactions/feed/', views.transactions_feed_view, name='transactions_feed'),
     
     path('influencer/', include('core.urls_influencer')),
     path('upgrade-to-influencer/', upgrade_to_influencer_view, name='upgrade_to_influencer'),
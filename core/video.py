@@ -0,0 +1,83 @@
+"""
+Parsing of task video and channel URLs.
+
+Task.save runs these once and stores the results (platform, video_id,
+channel_key) in indexed columns, so rendering an embed needs no parsing and
+tasks for the same video or channel are found with an index lookup.
+"""
+import re
+from urllib.parse import parse_qs, urlsplit
+
+
+YOUTUBE = 'youtube'
+YOUTUBE_HOSTS = {
+    'youtube.com', 'www.youtube.com', 'm.youtube.com', 'music.youtube.com',
+    'youtube-nocookie.com', 'www.youtube-nocookie.com',
+}
+SHORT_HOSTS = {'youtu.be', 'www.youtu.be'}
+# Path prefixes followed by the video id: /shorts/ID, /embed/ID, ...
+VIDEO_PATHS = {'shorts', 'embed', 'live', 'v', 'e'}
+CHANNEL_PATHS = {'channel', 'c', 'user'}
+VIDEO_ID = re.compile(r'^[A-Za-z0-9_-]{11}$')
+
+
+def _split(url):
+    url = (url or '').strip()
+    if not url:
+        return None
+    if '://' not in url:
+        url = f'https://{url}'
+    parts = urlsplit(url)
+    return parts, (parts.hostname or '').lower(), [segment for segment in parts.path.split('/') if segment]
+
+
+def parse_video_url(url):
+    """
+    (platform, video_id) for a video URL: watch, shorts, embed, live and
+    youtu.be links on any YouTube host, with or without timestamps and
+    other parameters. ('', '') when the URL is not a recognisable video.
+    """
+    split = _split(url)
+    if split is None:
+        return '', ''
+    parts, host, segments = split
+
+    candidate = ''
+    if host in SHORT_HOSTS:
+        candidate = segments[0] if segments else ''
+    elif host in YOUTUBE_HOSTS:
+        if segments[:1] == ['watch']:
+            candidate = parse_qs(parts.query).get('v', [''])[0]
+        elif len(segments) >= 2 and segments[0] in VIDEO_PATHS:
+            candidate = segments[1]
+
+    if VIDEO_ID.match(candidate):
+        return YOUTUBE, candidate
+    return '', ''
+
+
+def parse_channel_url(url):
+    """
+    Normalised channel key for a channel URL: '@handle' (lowercased),
+    'channel/UC...', 'c/name' or 'user/name'. '' when the URL is not a
+    channel.
+    """
+    split = _split(url)
+    if split is None:
+        return ''
+    parts, host, segments = split
+    if host not in YOUTUBE_HOSTS or not segments:
+        return ''
+    if segments[0].startswith('@') and len(segments[0]) > 1:
+        return segments[0].lower()
+    if len(segments) >= 2 and segments[0] in CHANNEL_PATHS:
+        if segments[0] == 'channel':
+            return f'channel/{segments[1]}'
+        return f'{segments[0]}/{segments[1].lower()}'
+    return ''
+
+
+def embed_url(platform, video_id):
+    if platform == YOUTUBE and video_id:
+        return f'https://www.youtube.com/embed/{video_id}'
+    return ''
@@ -6,6 +6,9 @@ from django.utils import timezone
 from django.db.models import Sum
 from .models import Task, UserProfile, TaskCompletion, Transaction
 from .forms import SignUpForm, LoginForm, TaskForm, WithdrawalForm
+from .feed import get_feed_profile
+from .ranking import RankedFeed
+from .idempotency import idempotent
 
 
 def landing_view(request):
@@ -29,6 +32,13 @@ def signup_view(request):
     if request.method == 'POST':
         form = SignUpForm(request.POST)
         if form.is_valid():
+            if form.cleaned_data.get('user_type') == 'influencer':
+                from .ratelimit import retry_message, throttle
+                wait = throttle(request, 'otp_issue')
+                if wait:
+                    messages.error(request, retry_message(wait))
+                    return redirect('signup')
+            
             user = form.save()
             user.email = form.cleaned_data.get('email')
             user.save()
@@ -47,32 +57,8 @@ def signup_view(request):
                     status='pending'
                 )
                 
-                import random
-                from datetime import timedelta
-                from .models import EmailVerification
-                
-                otp_code = str(random.randint(100000, 999999))
-                EmailVerification.objects.create(
-                    user=user,
-                    otp_code=otp_code,
-                    expires_at=timezone.now() + timedelta(minutes=10)
-                )
-                
-                from django.core.mail import send_mail
-                from django.conf import settings
-                from .email_templates import get_otp_email_html, get_otp_email_text
-                
-                try:
-                    send_mail(
-                        'Ken - Email Verification Code',
-                        get_otp_email_text(user.username, otp_code),
-                        settings.DEFAULT_FROM_EMAIL,
-                        [user.email],
-                        fail_silently=False,
-                        html_message=get_otp_email_html(user.username, otp_code)
-                    )
-                except:
-                    pass
+                from .otp import issue_otp
+                issue_otp(user)
                 
                 login(request, user)
                 messages.success(request, 'Account created! Please verify your email.')
@@ -122,13 +108,11 @@ def logout_view(request):
 @login_required
 def dashboard_view(request):
     profile, created = UserProfile.objects.get_or_create(user=request.user)
-    available_tasks = Task.objects.filter(status='active').exclude(
-        completions__user=request.user
-    )[:10]
+    available_tasks = RankedFeed(profile)[:10]
     
     recent_completions = TaskCompletion.objects.filter(
         user=request.user
-    ).order_by('-completed_at')[:5]
+    ).select_related('task').order_by('-completed_at')[:5]
     
     context = {
         'profile': profile,
@@ -144,12 +128,10 @@ def task_list_view(request):
     
     category = request.GET.get('category', 'all')
     
-    available_tasks = Task.objects.filter(status='active').exclude(
-        completions__user=request.user
-    )
-    
-    if category != 'all':
-        available_tasks = available_tasks.filter(category=category)
+    if category == 'all' or category in dict(Task.CATEGORY_CHOICES):
+        available_tasks = RankedFeed(get_feed_profile(request.user), category)
+    else:
+        available_tasks = []
     
     paginator = Paginator(available_tasks, 12)
     page_number = request.GET.get('page')
@@ -175,6 +157,7 @@ def task_detail_view(request, task_id):
 
 
 @login_required
+@idempotent
 def complete_task_view(request, task_id):
     from .forms import TaskCompletionForm
     
@@ -185,41 +168,28 @@ def complete_task_view(request, task_id):
         return redirect('task_detail', task_id=task_id)
     
     if request.method == 'POST':
-        needs_proof = task.task_type in ['like', 'subscribe', 'question']
+        from .services import complete_task, task_needs_proof, AlreadyCompleted, TaskUnavailable
+        
+        needs_proof = task_needs_proof(task)
         
         if needs_proof:
             form = TaskCompletionForm(request.POST, request.FILES)
+            upload_errors = getattr(request, 'upload_errors', [])
+            if upload_errors:
+                messages.error(request, upload_errors[0])
+                return redirect('task_detail', task_id=task_id)
             if not form.is_valid() or not request.FILES.get('proof_screenshot'):
                 messages.error(request, 'Please upload a screenshot as proof!')
                 return redirect('task_detail', task_id=task_id)
         
-        profile = request.user.profile
-        
-        completion = TaskCompletion.objects.create(
-            user=request.user,
-            task=task,
-            points_earned=task.points,
-            usd_earned=task.usd_value,
-            is_verified=False if needs_proof else True,
-            proof_screenshot=request.FILES.get('proof_screenshot') if needs_proof else None
-        )
-        
-        if not needs_proof:
-            profile.total_points += task.points
-            profile.total_earned_usd += task.usd_value
-            profile.available_balance_usd += task.usd_value
-            profile.save()
-            
-            Transaction.objects.create(
-                user=request.user,
-                transaction_type='earning',
-                amount_usd=task.usd_value,
-                points=task.points,
-                status='completed'
-            )
-        
-        task.current_completions += 1
-        task.save()
+        try:
+            complete_task(request.user, task, request.FILES.get('proof_screenshot'))
+        except AlreadyCompleted:
+            messages.error(request, 'You have already completed this task!')
+            return redirect('task_detail', task_id=task_id)
+        except TaskUnavailable:
+            messages.error(request, 'This task is no longer available!')
+            return redirect('task_detail', task_id=task_id)
         
         if needs_proof:
             messages.success(request, 'Task submitted! Waiting for admin verification.')
@@ -232,11 +202,11 @@ def complete_task_view(request, task_id):
 
 
 @login_required
+@idempotent
 def withdrawal_view(request):
     from .forms import WithdrawalSetupForm, VerifyOTPForm, WithdrawalForm
-    from .models import EmailVerification
-    import random
-    from datetime import timedelta
+    from .otp import issue_otp, verify_otp
+    from .ratelimit import retry_message, throttle
     
     profile = request.user.profile
     
@@ -258,29 +228,13 @@ def withdrawal_view(request):
                 profile.withdrawal_pin = form.cleaned_data['pin']
                 profile.save()
                 
-                otp_code = str(random.randint(100000, 999999))
-                EmailVerification.objects.create(
-                    user=request.user,
-                    otp_code=otp_code,
-                    expires_at=timezone.now() + timedelta(minutes=10)
-                )
-                
-                from django.core.mail import send_mail
-                from django.conf import settings
-                from .email_templates import get_otp_email_html, get_otp_email_text
+                wait = throttle(request, 'otp_issue')
+                if wait:
+                    messages.error(request, retry_message(wait))
+                    return redirect('/withdrawal/?step=setup')
                 
-                try:
-                    send_mail(
-                        'Ken - Email Verification Code',
-                        get_otp_email_text(request.user.username, otp_code),
-                        settings.DEFAULT_FROM_EMAIL,
-                        [request.user.email],
-                        fail_silently=False,
-                        html_message=get_otp_email_html(request.user.username, otp_code)
-                    )
-                    messages.success(request, f'OTP sent to {request.user.email}')
-                except Exception as e:
-                    messages.warning(request, f'Email not sent. Your OTP code is: {otp_code}')
+                issue_otp(request.user)
+                messages.success(request, f'OTP sent to {request.user.email}')
                 return redirect('/withdrawal/?step=verify')
         else:
             form = WithdrawalSetupForm(instance=profile)
@@ -291,16 +245,12 @@ def withdrawal_view(request):
     elif step == 'verify':
         if request.method == 'POST':
             form = VerifyOTPForm(request.POST)
+            wait = throttle(request, 'otp_verify')
+            if wait:
+                messages.error(request, retry_message(wait))
+                return redirect('/withdrawal/?step=verify')
             if form.is_valid():
-                otp = EmailVerification.objects.filter(
-                    user=request.user, 
-                    otp_code=form.cleaned_data['otp_code'],
-                    is_used=False
-                ).first()
-                
-                if otp and otp.is_valid():
-                    otp.is_used = True
-                    otp.save()
+                if verify_otp(request.user, form.cleaned_data['otp_code']):
                     profile.is_email_verified = True
                     profile.is_withdrawal_verified = True
                     profile.save()
@@ -330,19 +280,14 @@ def withdrawal_view(request):
                     messages.error(request, 'Minimum withdrawal is $50!')
                     return redirect('/withdrawal/?step=withdraw')
                 
-                if amount > profile.available_balance_usd:
+                from .ledger import InsufficientFunds
+                from .services import request_withdrawal
+                try:
+                    request_withdrawal(request.user, form.save(commit=False))
+                except InsufficientFunds:
                     messages.error(request, 'Insufficient balance!')
                     return redirect('/withdrawal/?step=withdraw')
                 
-                withdrawal = form.save(commit=False)
-                withdrawal.user = request.user
-                withdrawal.transaction_type = 'withdrawal'
-                withdrawal.status = 'pending'
-                withdrawal.save()
-                
-                profile.available_balance_usd -= amount
-                profile.save()
-                
                 messages.success(request, 'Withdrawal submitted! Awaiting approval.')
                 return redirect('transactions')
         else:
@@ -352,18 +297,63 @@ def withdrawal_view(request):
         return render(request, 'core/withdrawal.html', context)
 
 
+HISTORY_ROW_TEMPLATES = {
+    'earnings': 'core/transaction_earning_rows.html',
+    'withdrawals': 'core/transaction_withdrawal_rows.html',
+    'tasks': 'core/transaction_task_rows.html',
+}
+
+
+def _history_page(user, kind, cursor=None):
+    from .models import TransactionArchive
+    from .pagination import keyset_page, merged_keyset_page
+    
+    if kind == 'tasks':
+        completions = TaskCompletion.objects.filter(user=user).select_related('task')
+        return keyset_page(completions, 'completed_at', cursor)
+    
+    if kind == 'withdrawals':
+        types = {'transaction_type': 'withdrawal'}
+    else:
+        types = {'transaction_type__in': ['earning', 'bonus']}
+    # Settled transactions past retention live in TransactionArchive
+    # (core.purge), under their original ids.
+    return merged_keyset_page([
+        Transaction.objects.filter(user=user, **types),
+        TransactionArchive.objects.filter(user=user, **types),
+    ], 'created_at', cursor)
+
+
 @login_required
 def transactions_view(request):
-    transactions = Transaction.objects.filter(user=request.user).order_by('-created_at')
-    task_history = TaskCompletion.objects.filter(user=request.user).order_by('-completed_at')
-    
     context = {
-        'transactions': transactions,
-        'task_history': task_history,
+        'earnings': _history_page(request.user, 'earnings'),
+        'withdrawals': _history_page(request.user, 'withdrawals'),
+        'task_history': _history_page(request.user, 'tasks'),
     }
     return render(request, 'core/transactions.html', context)
 
 
+@login_required
+def transactions_feed_view(request):
+    from django.http import JsonResponse
+    from django.template.loader import render_to_string
+    
+    kind = request.GET.get('kind', 'earnings')
+    if kind not in HISTORY_ROW_TEMPLATES:
+        return JsonResponse({'error': 'Unknown history kind'}, status=400)
+    
+    page = _history_page(request.user, kind, request.GET.get('cursor'))
+    context_name = 'task_history' if kind == 'tasks' else kind
+    html = render_to_string(HISTORY_ROW_TEMPLATES[kind], {context_name: page}, request=request)
+    
+    return JsonResponse({
+        'html': html,
+        'count': len(page),
+        'next_cursor': page.next_cursor,
+    })
+
+
 @login_required
 def profile_view(request):
     profile, created = UserProfile.objects.get_or_create(user=request.user)
@@ -382,6 +372,8 @@ def profile_edit_view(request):
     
     if request.method == 'POST':
         form = ProfileEditForm(request.POST, request.FILES, instance=profile, user=request.user)
+        for error in getattr(request, 'upload_errors', []):
+            form.add_error('profile_picture', error)
         if form.is_valid():
             profile = form.save()
             request.user.email = form.cleaned_data['email']
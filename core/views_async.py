@@ -0,0 +1,177 @@
+"""
+Async variants of the read-heavy views, routed in place of the sync ones
+when ASYNC_READ_VIEWS is set (ken_project.asgi sets it).
+
+Django's async ORM runs every query of a request on that request's one sync
+thread, so awaiting several querysets with asyncio.gather still runs them
+one after the other. Reads that do not depend on each other go through
+gather_reads instead: each runs on its own worker thread and database
+connection, closed when it finishes, so their database time overlaps.
+Single lookups use the async ORM directly. Templates are rendered with
+sync_to_async, since they may still follow lazy relations.
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.decorators import login_required
+from django.core.paginator import Paginator
+from django.db import connections
+from django.shortcuts import get_object_or_404, redirect, render
+
+from .ledger import user_balance
+from .models import InfluencerProfile, Task, TaskCompletion, UserProfile
+from .ranking import RankedFeed, category_affinity, get_task_columns
+from .views import _history_page
+
+
+# Separate from the loop's default executor, which is sized by CPU count
+# rather than by how many reads can be waiting on the database at once.
+_read_executor = ThreadPoolExecutor(max_workers=settings.ASYNC_READ_THREADS, thread_name_prefix='async-read')
+
+
+def _closing_connections(func):
+    def run():
+        try:
+            return func()
+        finally:
+            connections.close_all()
+    return run
+
+
+async def gather_reads(*funcs):
+    """
+    Call each of the zero-argument funcs on its own thread and connection,
+    concurrently. Results come back in the order given; the first exception
+    is raised. Only for reads: each call runs in autocommit, outside any
+    transaction of the request.
+    """
+    return await asyncio.gather(*[
+        sync_to_async(_closing_connections(func), thread_sensitive=False, executor=_read_executor)()
+        for func in funcs
+    ])
+
+
+async def _render(request, template_name, context):
+    return await sync_to_async(render)(request, template_name, context)
+
+
+@login_required
+async def dashboard_view(request):
+    user = await request.auser()
+    profile, created = await UserProfile.objects.aget_or_create(user=user)
+
+    columns, affinity, recent_completions, balance = await gather_reads(
+        get_task_columns,
+        lambda: category_affinity(user.id),
+        lambda: list(
+            TaskCompletion.objects.filter(user=user).select_related('task').order_by('-completed_at')[:5]
+        ),
+        lambda: user_balance(user.id),
+    )
+    profile.balance = balance
+
+    context = {
+        'profile': profile,
+        'available_tasks': RankedFeed(profile, columns=columns, affinity=affinity)[:10],
+        'recent_completions': recent_completions,
+    }
+    return await _render(request, 'core/dashboard.html', context)
+
+
+@login_required
+async def task_list_view(request):
+    category = request.GET.get('category', 'all')
+
+    if category == 'all' or category in dict(Task.CATEGORY_CHOICES):
+        user = await request.auser()
+        profile, created = await UserProfile.objects.aget_or_create(user=user)
+        columns, affinity = await gather_reads(
+            lambda: get_task_columns(category),
+            lambda: category_affinity(user.id),
+        )
+        available_tasks = RankedFeed(profile, category, columns=columns, affinity=affinity)
+    else:
+        available_tasks = []
+
+    paginator = Paginator(available_tasks, 12)
+    page_obj = paginator.get_page(request.GET.get('page'))
+
+    context = {
+        'page_obj': page_obj,
+        'current_category': category,
+    }
+    return await _render(request, 'core/task_list.html', context)
+
+
+@login_required
+async def task_detail_view(request, task_id):
+    user = await request.auser()
+    task, already_completed = await gather_reads(
+        lambda: get_object_or_404(Task, id=task_id),
+        lambda: TaskCompletion.objects.filter(user=user, task_id=task_id).exists(),
+    )
+
+    context = {
+        'task': task,
+        'already_completed': already_completed,
+    }
+    return await _render(request, 'core/task_detail.html', context)
+
+
+@login_required
+async def transactions_view(request):
+    user = await request.auser()
+    earnings, withdrawals, task_history = await gather_reads(
+        lambda: _history_page(user, 'earnings'),
+        lambda: _history_page(user, 'withdrawals'),
+        lambda: _history_page(user, 'tasks'),
+    )
+
+    context = {
+        'earnings': earnings,
+        'withdrawals': withdrawals,
+        'task_history': task_history,
+    }
+    return await _render(request, 'core/transactions.html', context)
+
+
+@login_required
+async def influencer_dashboard_view(request):
+    user = await request.auser()
+    influencer_profile = await InfluencerProfile.objects.filter(user=user).afirst()
+    if influencer_profile is None:
+        return redirect('influencer_signup')
+
+    # If influencer is not approved, show limited dashboard
+    if influencer_profile.status != 'approved':
+        context = {
+            'influencer_profile': influencer_profile,
+            'total_tasks': 0,
+            'total_completions': 0,
+            'pending_proofs': 0,
+            'total_budget': 0,
+            'recent_tasks': [],
+            'recent_completions': [],
+        }
+        return await _render(request, 'influencer/influencer_dashboard.html', context)
+
+    recent_tasks, recent_completions = await gather_reads(
+        lambda: list(Task.objects.filter(created_by=user).order_by('-created_at')[:5]),
+        lambda: list(
+            TaskCompletion.objects.filter(task__created_by=user)
+            .select_related('user', 'task').order_by('-completed_at')[:10]
+        ),
+    )
+
+    context = {
+        'influencer_profile': influencer_profile,
+        'total_tasks': influencer_profile.total_tasks_created,
+        'total_completions': influencer_profile.total_completions,
+        'pending_proofs': influencer_profile.pending_proofs,
+        'total_budget': influencer_profile.total_task_value,
+        'recent_tasks': recent_tasks,
+        'recent_completions': recent_completions,
+    }
+    return await _render(request, 'influencer/influencer_dashboard.html', context)
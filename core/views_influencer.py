@@ -2,17 +2,14 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth import login
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.utils import timezone
-from django.db.models import Sum, Count, Q
-from django.core.mail import send_mail
-from django.conf import settings
-from datetime import timedelta
-import random
+from django.db.models import Sum, Count, Q, Prefetch
 
 from .models import (
     InfluencerProfile, Task, TaskCompletion, 
-    EmailVerification, User
+    ProofMatch, User
 )
+from .otp import issue_otp, verify_otp
+from .ratelimit import retry_message, throttle
 from .forms_influencer import InfluencerSignUpForm, InfluencerTaskForm
 
 
@@ -37,6 +34,11 @@ def influencer_signup_view(request):
     if request.method == 'POST':
         form = InfluencerSignUpForm(request.POST)
         if form.is_valid():
+            wait = throttle(request, 'otp_issue')
+            if wait:
+                messages.error(request, retry_message(wait))
+                return redirect('influencer_signup')
+            
             user = form.save()
             
             InfluencerProfile.objects.create(
@@ -49,27 +51,8 @@ def influencer_signup_view(request):
                 status='pending'
             )
             
-            otp_code = str(random.randint(100000, 999999))
-            EmailVerification.objects.create(
-                user=user,
-                otp_code=otp_code,
-                expires_at=timezone.now() + timedelta(minutes=10)
-            )
-            
-            from .email_templates import get_otp_email_html, get_otp_email_text
-            
-            try:
-                send_mail(
-                    'Ken Influencer - Email Verification Code',
-                    get_otp_email_text(user.username, otp_code),
-                    settings.DEFAULT_FROM_EMAIL,
-                    [user.email],
-                    fail_silently=False,
-                    html_message=get_otp_email_html(user.username, otp_code)
-                )
-                messages.success(request, f'OTP sent to {user.email}')
-            except Exception as e:
-                messages.warning(request, f'Email not sent. Your OTP code is: {otp_code}')
+            issue_otp(user, 'Ken Influencer - Email Verification Code')
+            messages.success(request, f'OTP sent to {user.email}')
             
             login(request, user)
             return redirect('influencer_verify_email')
@@ -88,18 +71,12 @@ def influencer_verify_email_view(request):
         return redirect('influencer_dashboard')
     
     if request.method == 'POST':
-        otp_code = request.POST.get('otp_code')
-        
-        otp = EmailVerification.objects.filter(
-            user=request.user,
-            otp_code=otp_code,
-            is_used=False
-        ).first()
+        wait = throttle(request, 'otp_verify')
+        if wait:
+            messages.error(request, retry_message(wait))
+            return redirect('influencer_verify_email')
         
-        if otp and otp.is_valid():
-            otp.is_used = True
-            otp.save()
-            
+        if verify_otp(request.user, request.POST.get('otp_code')):
             influencer_profile = request.user.influencer_profile
             influencer_profile.is_verified = True
             influencer_profile.save()
@@ -132,28 +109,17 @@ def influencer_dashboard_view(request):
         }
         return render(request, 'influencer/influencer_dashboard.html', context)
     
-    total_tasks = Task.objects.filter(created_by=request.user).count()
-    total_completions = TaskCompletion.objects.filter(task__created_by=request.user).count()
-    pending_proofs = TaskCompletion.objects.filter(
-        task__created_by=request.user,
-        is_verified=False,
-        proof_screenshot__isnull=False
-    ).count()
-    total_budget = Task.objects.filter(created_by=request.user).aggregate(
-        total=Sum('usd_value')
-    )['total'] or 0
-    
     recent_tasks = Task.objects.filter(created_by=request.user).order_by('-created_at')[:5]
     recent_completions = TaskCompletion.objects.filter(
         task__created_by=request.user
-    ).order_by('-completed_at')[:10]
+    ).select_related('user', 'task').order_by('-completed_at')[:10]
     
     context = {
         'influencer_profile': influencer_profile,
-        'total_tasks': total_tasks,
-        'total_completions': total_completions,
-        'pending_proofs': pending_proofs,
-        'total_budget': total_budget,
+        'total_tasks': influencer_profile.total_tasks_created,
+        'total_completions': influencer_profile.total_completions,
+        'pending_proofs': influencer_profile.pending_proofs,
+        'total_budget': influencer_profile.total_task_value,
         'recent_tasks': recent_tasks,
         'recent_completions': recent_completions,
     }
@@ -189,9 +155,12 @@ def influencer_task_create_view(request):
             task.status = 'active'
             task.save()
             
-            influencer_profile.total_tasks_created += 1
-            influencer_profile.total_budget_spent += total_cost
-            influencer_profile.save()
+            from django.db.models import F
+            InfluencerProfile.objects.filter(id=influencer_profile.id).update(
+                total_tasks_created=F('total_tasks_created') + 1,
+                total_task_value=F('total_task_value') + task.usd_value,
+                total_budget_spent=F('total_budget_spent') + total_cost,
+            )
             
             messages.success(request, 'Task created successfully!')
             return redirect('influencer_task_detail', task_id=task.id)
@@ -230,10 +199,6 @@ def influencer_task_list_view(request):
 def influencer_task_detail_view(request, task_id):
     task = get_object_or_404(Task, id=task_id, created_by=request.user)
     
-    completions = TaskCompletion.objects.filter(task=task).order_by('-completed_at')
-    verified_count = completions.filter(is_verified=True).count()
-    pending_count = completions.filter(is_verified=False, proof_screenshot__isnull=False).count()
-    
     if request.method == 'POST':
         action = request.POST.get('action')
         if action == 'pause':
@@ -246,11 +211,26 @@ def influencer_task_detail_view(request, task_id):
             messages.success(request, 'Task activated successfully!')
         return redirect('influencer_task_detail', task_id=task_id)
     
+    from .pagination import keyset_page
+    from .stats import get_task_stats, recent_task_buckets
+    
+    stats = get_task_stats(task)
+    completions = keyset_page(
+        TaskCompletion.objects.filter(task=task).select_related('user'),
+        'completed_at',
+        request.GET.get('cursor'),
+        per_page=25
+    )
+    
     context = {
         'task': task,
+        'stats': stats,
+        'hourly_buckets': recent_task_buckets(task),
         'completions': completions,
-        'verified_count': verified_count,
-        'pending_count': pending_count,
+        'verified_count': stats.verified_count,
+        'pending_count': stats.pending_count,
+        'same_video_tasks': task.same_video_tasks().filter(created_by=request.user).order_by('-created_at')[:10],
+        'same_channel_tasks': task.same_channel_tasks().filter(created_by=request.user).order_by('-created_at')[:10],
     }
     
     return render(request, 'influencer/influencer_task_detail.html', context)
@@ -271,11 +251,17 @@ def influencer_proofs_view(request):
     elif status_filter == 'verified':
         proofs = proofs.filter(is_verified=True)
     
-    proofs = proofs.order_by('-completed_at')
+    near_matches = ProofMatch.objects.select_related('match__user', 'match__task').order_by('distance', 'match_id')
+    proofs = (
+        proofs.select_related('user', 'task', 'verified_by')
+        .prefetch_related(Prefetch('near_matches', queryset=near_matches))
+        .order_by('-completed_at')
+    )
     
     context = {
         'proofs': proofs,
         'current_status': status_filter,
+        'has_pending': status_filter != 'verified',
     }
     
     return render(request, 'influencer/influencer_proofs.html', context)
@@ -294,36 +280,59 @@ def influencer_approve_proof_view(request, proof_id):
         action = request.POST.get('action')
         
         if action == 'approve':
-            proof.is_verified = True
-            proof.verified_at = timezone.now()
-            proof.verified_by = request.user
-            proof.save()
-            
-            user_profile = proof.user.profile
-            user_profile.total_points += proof.points_earned
-            user_profile.total_earned_usd += proof.usd_earned
-            user_profile.available_balance_usd += proof.usd_earned
-            user_profile.save()
-            
-            from .models import Transaction
-            Transaction.objects.create(
-                user=proof.user,
-                transaction_type='earning',
-                amount_usd=proof.usd_earned,
-                points=proof.points_earned,
-                status='completed'
-            )
-            
-            messages.success(request, 'Proof approved successfully!')
+            from .services import approve_completion
+            if approve_completion(proof, request.user):
+                messages.success(request, 'Proof approved successfully!')
+            else:
+                messages.info(request, 'This proof was already approved.')
         
         elif action == 'reject':
-            proof.delete()
+            from .services import reject_completion
+            reject_completion(proof)
             messages.success(request, 'Proof rejected and deleted!')
         
         return redirect('influencer_proofs')
     
+    from .blobs import duplicate_proofs_of
+    
     context = {
         'proof': proof,
+        'duplicates': duplicate_proofs_of(proof) if proof.is_duplicate_proof else [],
+        'near_matches': proof.near_matches.select_related('match__user', 'match__task').order_by('distance', 'match_id'),
     }
     
     return render(request, 'influencer/influencer_approve_proof.html', context)
+
+
+BULK_REVIEW_BATCH_SIZE = 500
+
+
+@login_required
+@influencer_required
+def influencer_bulk_review_view(request):
+    if request.method != 'POST':
+        return redirect('influencer_proofs')
+    
+    from django.db import transaction
+    from .services import bulk_approve_completions, bulk_reject_completions
+    
+    action = request.POST.get('action')
+    proof_ids = [int(i) for i in request.POST.getlist('proof_ids') if i.isdigit()]
+    
+    if action not in ('approve', 'reject') or not proof_ids:
+        messages.error(request, 'Select at least one proof and an action.')
+        return redirect('influencer_proofs')
+    
+    review = bulk_approve_completions if action == 'approve' else bulk_reject_completions
+    count = 0
+    # Batches keep each statement's parameter list short; all of them
+    # commit together or not at all.
+    with transaction.atomic():
+        for start in range(0, len(proof_ids), BULK_REVIEW_BATCH_SIZE):
+            count += review(proof_ids[start:start + BULK_REVIEW_BATCH_SIZE], request.user)
+    
+    if action == 'approve':
+        messages.success(request, f'{count} proof(s) approved successfully!')
+    else:
+        messages.success(request, f'{count} proof(s) rejected and deleted!')
+    return redirect('influencer_proofs')
@@ -3,6 +3,17 @@ ASGI config for ken_project project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Served this way, the dashboards, task list/detail and transaction history
+use their async variants (core.views_async, see ASYNC_READ_VIEWS), e.g.:
+
+    pip install uvicorn
+    uvicorn ken_project.asgi:application --workers 4
+
+Everything else still runs as sync views, in a thread per request. The
+benchmark_read_path command compares this path with the WSGI one under
+concurrent requests. PROFILING_ENABLED adds a sync-only middleware, and its
+query counts miss the reads that core.views_async runs on worker threads.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.1/howto/deployment/asgi/
 """
@@ -12,5 +23,6 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ken_project.settings')
+os.environ.setdefault('ASYNC_READ_VIEWS', '1')
 
 application = get_asgi_application()
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -42,7 +43,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.profiling.ProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'core.assets.PrecompressedAssetsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.locale.LocaleMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -80,10 +83,92 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            # Take the write lock at BEGIN so concurrent completions queue
+            # on the busy timeout instead of failing with "database is locked".
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+        },
+        'TEST': {
+            # A file database lets the concurrency tests use one connection per thread.
+            'NAME': BASE_DIR / 'test_db.sqlite3',
+        },
     }
 }
 
 
+# Caches
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+#
+# The active task catalog (core.catalog) is stored under its own alias. Swap
+# its backend for a shared one when running several workers, e.g.
+#   'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+#   'LOCATION': BASE_DIR / 'cache' / 'task_catalog',
+# or
+#   'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+#   'LOCATION': 'redis://127.0.0.1:6379/1',
+# The same goes for the idempotency keys (core.idempotency) and rate limit
+# buckets (core.ratelimit): retries of one POST and a brute-force run spread
+# over several workers must all see the same state.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'ken-default',
+    },
+    'task_catalog': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'ken-task-catalog',
+    },
+    'idempotency': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'ken-idempotency',
+    },
+    'ratelimit': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'ken-ratelimit',
+    },
+}
+
+TASK_CATALOG_CACHE_ALIAS = 'task_catalog'
+TASK_CATALOG_CACHE_TIMEOUT = 300
+
+IDEMPOTENCY_CACHE_ALIAS = 'idempotency'
+IDEMPOTENCY_KEY_TTL = 300
+IDEMPOTENCY_WAIT_SECONDS = 5
+
+# Token buckets: (burst capacity, seconds to earn back one attempt).
+# RATE_LIMIT_STORE is 'cache' (shared through RATE_LIMIT_CACHE_ALIAS) or
+# 'memory' (per process).
+RATE_LIMIT_STORE = 'cache'
+RATE_LIMIT_CACHE_ALIAS = 'ratelimit'
+RATE_LIMITS = {
+    'otp_issue': (3, 300),
+    'otp_verify': (5, 60),
+}
+# Behind N reverse proxies that each append to X-Forwarded-For, the client
+# address is the Nth entry from the right. Leave at 0 when requests reach
+# Django directly; any higher lets clients pick their own bucket.
+RATE_LIMIT_CLIENT_IP_HEADER = 'HTTP_X_FORWARDED_FOR'
+RATE_LIMIT_TRUSTED_PROXIES = int(os.environ.get('RATE_LIMIT_TRUSTED_PROXIES', '0'))
+
+# Request profiling (core.profiling): Server-Timing headers and a JSON-lines
+# log per request, summarised by the profile_report command. Give each worker
+# process its own log path, since rotation is not coordinated between them.
+PROFILING_ENABLED = False
+PROFILING_LOG_PATH = BASE_DIR / 'profiling.jsonl'
+PROFILING_LOG_MAX_BYTES = 20 * 1024 * 1024
+PROFILING_LOG_BACKUPS = 3
+
+# Route the dashboards, task list/detail and transaction history to their
+# async variants (core.views_async). ken_project.asgi turns this on through
+# the environment; under WSGI the sync views avoid an event loop per request.
+ASYNC_READ_VIEWS = os.environ.get('ASYNC_READ_VIEWS', '') == '1'
+# Worker threads (each with its own database connection while in use) for
+# the reads those views run concurrently.
+ASYNC_READ_THREADS = 32
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
@@ -131,9 +216,23 @@ STATIC_URL = 'static/'
 STATICFILES_DIRS = [BASE_DIR / 'static']
 STATIC_ROOT = BASE_DIR / 'staticfiles'
 
+# Self-hosted CSS/JS/fonts built by `manage.py build_assets` (core.assets).
+# Run it after collectstatic, which would otherwise clear them. Served with
+# their .br/.gz variants by PrecompressedAssetsMiddleware; a front-end server
+# can map ASSETS_URL to ASSETS_ROOT directly instead.
+ASSETS_SOURCE_DIR = BASE_DIR / 'assets'
+ASSETS_ROOT = STATIC_ROOT / 'assets'
+ASSETS_URL = '/assets/'
+TAILWIND_CLI = 'tailwindcss'
+
 MEDIA_URL = 'media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Uploads are streamed to disk and capped by core.uploadhandlers.
+FILE_UPLOAD_HANDLERS = ['core.uploadhandlers.SizeCappedImageUploadHandler']
+IMAGE_UPLOAD_MAX_BYTES = 8 * 1024 * 1024
+IMAGE_UPLOAD_MAX_PIXELS = 40_000_000
+
 LOGIN_URL = 'login'
 LOGIN_REDIRECT_URL = 'dashboard'
 LOGOUT_REDIRECT_URL = 'login'